@@ -64,7 +64,7 @@ stdenv.mkDerivation {
         $EXTRA_FLAGS \
         --prefix PATH : ${
           lib.makeBinPath [
-            python3
+            (python3.withPackages (ps: [ ps.pygobject3 ]))
             bash
             coreutils
             gnugrep
@@ -93,6 +93,12 @@ stdenv.mkDerivation {
             gst-plugins-bad
             gst-plugins-ugly
           ]
+        }" \
+        --prefix GI_TYPELIB_PATH : "${
+          lib.makeSearchPathOutput "lib" "lib/girepository-1.0" [
+            gstreamer
+            gst-plugins-base
+          ]
         }"
     done
   '';
@@ -1,10 +1,19 @@
 import Gio from 'gi://Gio';
+import GLib from 'gi://GLib';
 import GObject from 'gi://GObject';
 import * as Main from 'resource:///org/gnome/shell/ui/main.js';
 import * as QuickSettings from 'resource:///org/gnome/shell/ui/quickSettings.js';
 import * as PopupMenu from 'resource:///org/gnome/shell/ui/popupMenu.js';
 import {Extension, gettext as _} from 'resource:///org/gnome/shell/extensions/extension.js';
 
+Gio._promisify(Gio.SocketClient.prototype, 'connect_async');
+Gio._promisify(Gio.OutputStream.prototype, 'write_all_async');
+Gio._promisify(Gio.DataInputStream.prototype, 'read_line_async');
+
+// zb-daemon's control socket: JSON lines (get / set / status / subscribe)
+const CONTROL_SOCKET = GLib.build_filenamev([GLib.get_user_runtime_dir(), 'zbridge', 'control.sock']);
+const RESUBSCRIBE_SECONDS = 5;
+
 function communicate(proc, input) {
     return new Promise((resolve, reject) => {
         proc.communicate_utf8_async(input, null, (proc, res) => {
@@ -37,6 +46,49 @@ const runCommand = async (args) => {
     }
 };
 
+class ControlConnection {
+    static async open(cancellable = null) {
+        const client = new Gio.SocketClient();
+        const conn = await client.connect_async(Gio.UnixSocketAddress.new(CONTROL_SOCKET), cancellable);
+        return new ControlConnection(conn, cancellable);
+    }
+
+    constructor(conn, cancellable) {
+        this._conn = conn;
+        this._cancellable = cancellable;
+        this._input = new Gio.DataInputStream({ base_stream: conn.get_input_stream() });
+    }
+
+    async send(request) {
+        const bytes = new TextEncoder().encode(JSON.stringify(request) + '\n');
+        await this._conn.get_output_stream().write_all_async(bytes, GLib.PRIORITY_DEFAULT, this._cancellable);
+    }
+
+    async receive() {
+        const [line] = await this._input.read_line_async(GLib.PRIORITY_DEFAULT, this._cancellable);
+        if (line === null) throw new Error('Control socket closed');
+        return JSON.parse(new TextDecoder().decode(line));
+    }
+
+    close() {
+        this._conn.close(null);
+    }
+}
+
+// One request/reply round-trip; null if the daemon is not reachable
+const controlRequest = async (request) => {
+    let connection = null;
+    try {
+        connection = await ControlConnection.open();
+        await connection.send(request);
+        return await connection.receive();
+    } catch (e) {
+        return null;
+    } finally {
+        connection?.close();
+    }
+};
+
 const ZBridgeToggle = GObject.registerClass(
 class ZBridgeToggle extends QuickSettings.QuickMenuToggle {
     _init(extensionObject, indicator) {
@@ -50,12 +102,54 @@ class ZBridgeToggle extends QuickSettings.QuickMenuToggle {
         this._extension = extensionObject;
         this._indicator = indicator;
         this._isSyncing = false;
+        this._status = null;          // Last status pushed by the daemon, null while unsubscribed
+        this._cancellable = new Gio.Cancellable();
+        this._resubscribeId = 0;
         
         this._buildMenu();
         this._syncState(); 
+        this._subscribe();
         this.connect('clicked', () => this._onMainToggle());
     }
 
+    destroy() {
+        this._cancellable.cancel();
+        if (this._resubscribeId) GLib.source_remove(this._resubscribeId);
+        this._resubscribeId = 0;
+        super.destroy();
+    }
+
+    // Live updates pushed by the daemon; while it is down, retry now and then
+    async _subscribe() {
+        let connection = null;
+        try {
+            connection = await ControlConnection.open(this._cancellable);
+            await connection.send({ cmd: 'subscribe' });
+            while (true) {
+                const message = await connection.receive();
+                if (message.event === 'status') {
+                    this._status = message.status;
+                    this._applyStatus(message.status);
+                }
+            }
+        } catch (e) {
+            // Daemon stopped (or never started), or the extension is being disabled
+        } finally {
+            connection?.close();
+        }
+        if (this._cancellable.is_cancelled()) return;
+
+        if (this._status) {
+            this._status = null;
+            this._syncState();
+        }
+        this._resubscribeId = GLib.timeout_add_seconds(GLib.PRIORITY_DEFAULT, RESUBSCRIBE_SECONDS, () => {
+            this._resubscribeId = 0;
+            this._subscribe();
+            return GLib.SOURCE_REMOVE;
+        });
+    }
+
     _buildMenu() {
         this._turnOnItem = new PopupMenu.PopupMenuItem(_('Turn ZBridge On'));
         this._turnOnItem.connect('activate', () => this._onMainToggle());
@@ -63,6 +157,12 @@ class ZBridgeToggle extends QuickSettings.QuickMenuToggle {
 
         this._advancedItems = [];
 
+        // === Live Link Stats (from the daemon metrics) ===
+        this._statsItem = new PopupMenu.PopupMenuItem('', { reactive: false, can_focus: false });
+        this._statsItem.add_style_class_name('popup-subtitle-menu-item');
+        this.menu.addMenuItem(this._statsItem);
+        this._advancedItems.push(this._statsItem);
+
         // === Saved Phones Switcher (Backend Driven) ===
         this._phoneMenu = new PopupMenu.PopupSubMenuMenuItem(_('Switch Phone'), true);
         this._phoneMenu.icon.icon_name = 'phone-symbolic';
@@ -78,7 +178,7 @@ class ZBridgeToggle extends QuickSettings.QuickMenuToggle {
             let label = type.charAt(0).toUpperCase() + type.slice(1);
             if (type === 'none') label = _('No Video (Audio Only)');
             let item = new PopupMenu.PopupMenuItem(label);
-            item.connect('activate', () => this._runConfig(['-c', type]));
+            item.connect('activate', () => this._runConfig(['-c', type], { CAM_FACING: type, CAM_ORIENT: '' }));
             this._sourceMenu.menu.addMenuItem(item);
             this._sourceItems[type] = item;
         });
@@ -121,14 +221,14 @@ class ZBridgeToggle extends QuickSettings.QuickMenuToggle {
         
         this._monitorSwitch = new PopupMenu.PopupSwitchMenuItem(_('Use Phone as Mic'), false);
         this._monitorSwitch.connect('toggled', (item) => { 
-            if(!this._isSyncing) this._runConfig(['-m', item.state ? 'on' : 'off']); 
+            if(!this._isSyncing) this._runConfig(['-m', item.state ? 'on' : 'off'], { MONITOR: item.state ? 'on' : 'off' }); 
         });
         this.menu.addMenuItem(this._monitorSwitch);
         this._advancedItems.push(this._monitorSwitch);
 
         this._desktopSwitch = new PopupMenu.PopupSwitchMenuItem(_('Stream PC Audio to Phone'), false);
         this._desktopSwitch.connect('toggled', (item) => { 
-            if(!this._isSyncing) this._runConfig(['-d', item.state ? 'on' : 'off']); 
+            if(!this._isSyncing) this._runConfig(['-d', item.state ? 'on' : 'off'], { DESKTOP: item.state ? 'on' : 'off' }); 
         });
         this.menu.addMenuItem(this._desktopSwitch);
         this._advancedItems.push(this._desktopSwitch);
@@ -165,7 +265,7 @@ class ZBridgeToggle extends QuickSettings.QuickMenuToggle {
                     item.setOrnament(PopupMenu.Ornament.DOT);
                 }
                 item.connect('activate', () => {
-                    this._runConfig(['-i', ip]);
+                    this._runConfig(['-i', ip], { PHONE_IP: ip });
                 });
                 this._phoneMenu.menu.addMenuItem(item);
             });
@@ -183,17 +283,53 @@ class ZBridgeToggle extends QuickSettings.QuickMenuToggle {
         this._isFlipped = flipped;
         let cmd = angle;
         if (flipped) cmd = 'flip' + angle;
-        await this._runConfig(['-o', cmd]);
+        await this._runConfig(['-o', cmd], { CAM_ORIENT: cmd });
     }
 
-    async _runConfig(args) {
+    // values: the same change for the control socket. The subscription shows
+    // the result; without the daemon, zb-config takes the slow path.
+    async _runConfig(args, values = null) {
         this._isSyncing = true;
-        await runCommand(args);
-        await this._syncState();
+        const reply = values && this._status ? await controlRequest({ cmd: 'set', values }) : null;
+        if (!reply?.ok) {
+            await runCommand(args);
+            await this._syncState();
+        }
         this._isSyncing = false;
     }
 
+    _applyStatus(status) {
+        const config = status.config;
+        const device = status.devices.find(d => d.ip === config.PHONE_IP);
+        let stats = '';
+        if (device?.state === 'CONNECTED') {
+            const latency = device.latency_ms;
+            stats = `RTT ${(device.rtt_ms ?? 0).toFixed(0)} ms | Loss ${((device.loss ?? 0) * 100).toFixed(1)}% | ` +
+                    `Jitter ${(device.jitter_ms ?? 0).toFixed(1)} ms | Buffer ${(device.jitter_buffer_ms ?? 0).toFixed(0)} ms\n` +
+                    `Mic ~${(latency.phone_to_pc ?? 0).toFixed(0)} ms | Desktop ~${(latency.pc_to_phone ?? 0).toFixed(0)} ms`;
+        }
+        const cam = config.CAM_FACING;
+        const ipChanged = config.PHONE_IP !== this._currentIp;
+        this._updateUi({
+            ip: config.PHONE_IP,
+            cam,
+            orient: config.CAM_ORIENT || (cam === 'front' ? config.DEF_ORIENT_FRONT : config.DEF_ORIENT_BACK),
+            monitor: config.MONITOR === 'on' || status.monitor_active,
+            desktop: config.DESKTOP === 'on' || status.desktop_active,
+            isRunning: true,
+            stats,
+        });
+        if (ipChanged) this._updatePhoneList();
+    }
+
     async _syncState() {
+        // Saved phones live in a file, not in the daemon
+        if (this._status) {
+            this._currentIp = this._status.config.PHONE_IP;
+            await this._updatePhoneList();
+            return;
+        }
+
         this._isSyncing = true;
         
         // 1. Get State
@@ -210,11 +346,26 @@ class ZBridgeToggle extends QuickSettings.QuickMenuToggle {
         // 2. Update List (now that we know current IP)
         await this._updatePhoneList();
 
-        const cam = getVal('Cam'); 
         const monitor = getVal('Monitor'); 
         const desktop = getVal('Desktop');
-        const status = getVal('Daemon');
-        const isRunning = (status === 'active');
+        const link = getVal('Link');
+        this._updateUi({
+            ip,
+            cam: getVal('Cam'),
+            orient: getVal('Camera orientation').split(' ')[0],
+            monitor: monitor.includes('[ACTIVE]') || monitor.includes('[on]'),
+            desktop: desktop.includes('[ACTIVE]') || desktop.includes('[on]'),
+            isRunning: getVal('Daemon') === 'active',
+            stats: link ? `${link}\n${getVal('Latency')}` : '',
+        });
+
+        this._isSyncing = false;
+    }
+
+    _updateUi({ ip, cam, orient, monitor, desktop, isRunning, stats }) {
+        const wasSyncing = this._isSyncing;
+        this._isSyncing = true;
+        this._currentIp = ip;
 
         this.set({ checked: isRunning, subtitle: isRunning ? (ip || _('Streaming')) : _('Ready') });
         if (this._indicator) this._indicator.visible = isRunning;
@@ -223,14 +374,15 @@ class ZBridgeToggle extends QuickSettings.QuickMenuToggle {
         this._advancedItems.forEach(item => { item.visible = isRunning; });
         this._orientMenu.visible = (cam !== 'none');
 
+        this._statsItem.label.text = stats || _('Waiting for phone…');
+
         if (isRunning) {
             ['back', 'front', 'none'].forEach(k => {
                  this._sourceItems[k].setOrnament(cam === k ? PopupMenu.Ornament.DOT : PopupMenu.Ornament.NONE);
             });
 
-            let orientRaw = getVal('Camera orientation').split(' ')[0];
-            let isFlipped = orientRaw.startsWith('flip');
-            let angle = orientRaw.replace('flip', '');
+            let isFlipped = orient.startsWith('flip');
+            let angle = orient.replace('flip', '');
             if (!['0','90','180','270'].includes(angle)) angle = '0';
 
             this._currentAngle = angle;
@@ -241,11 +393,11 @@ class ZBridgeToggle extends QuickSettings.QuickMenuToggle {
             });
             this._flipSwitch.setToggleState(isFlipped);
 
-            this._monitorSwitch.setToggleState(monitor.includes('[ACTIVE]') || monitor.includes('[on]'));
-            this._desktopSwitch.setToggleState(desktop.includes('[ACTIVE]') || desktop.includes('[on]'));
+            this._monitorSwitch.setToggleState(monitor);
+            this._desktopSwitch.setToggleState(desktop);
         }
 
-        this._isSyncing = false;
+        this._isSyncing = wasSyncing;
     }
 });
 
@@ -0,0 +1,928 @@
+#!/usr/bin/env python3
+"""
+zb-bench: replays scripted scenarios against zb-daemon without hardware.
+
+PipeWire, adb, scrcpy and GStreamer are replaced by local stand-ins:
+  - a fake graph server behind fake pw-dump/pw-cli/pw-link/pw-loopback,
+  - a fake adb server speaking the adb socket protocol,
+  - fake scrcpy/gst-launch processes that report when they are streaming,
+  - simulated phones on 127.0.0.x that answer the control protocol and can
+    lose, delay or stop sending packets.
+  - stand-in Gst bindings, for driving the daemon's in-process pipeline
+    code directly (scenarios that don't need a whole daemon).
+
+Each scenario starts a fresh daemon and reports reconnect latency,
+time-to-stream, subprocess forks per minute and daemon CPU per event loop
+tick. Use --json to save a run and --baseline to fail on regressions.
+
+Usage: zb-bench.py [-s SCENARIO ...] [--json FILE] [--baseline FILE] [--seed N]
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import re
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DAEMON = os.path.join(SCRIPT_DIR, "zb-daemon.py")
+PHONE_PORT = 5002
+PC_PORT = 5001
+HEARTBEAT_INTERVAL = 0.25
+FAKE_TOOLS = ["pw-dump", "pw-cli", "pw-link", "pw-loopback", "pactl", "scrcpy",
+              "gst-launch-1.0", "adb", "pkill", "notify-send"]
+
+PW_NODE = "PipeWire:Interface:Node"
+PW_PORT = "PipeWire:Interface:Port"
+PW_LINK = "PipeWire:Interface:Link"
+
+def log(msg):
+    print(f":: [Bench] {msg}", file=sys.stderr, flush=True)
+
+# --- Fake Tools ---
+
+# One script behind every fake binary, dispatching on its name. Each run
+# reports itself to the graph server first, so every fork is counted.
+FAKE_TOOL = r'''#!/usr/bin/env python3
+import json, os, signal, socket, sys, time
+
+sock = socket.socket(socket.AF_UNIX)
+sock.connect(os.environ["ZB_BENCH_SOCKET"])
+stream = sock.makefile("rw")
+
+def call(op, **kwargs):
+    stream.write(json.dumps(dict(kwargs, op=op, pid=os.getpid())) + "\n")
+    stream.flush()
+    return json.loads(stream.readline())
+
+def option(name, default=None):
+    for i, arg in enumerate(argv):
+        if arg == name and i + 1 < len(argv):
+            return argv[i + 1]
+        if arg.startswith(name + "="):
+            return arg.split("=", 1)[1]
+    return default
+
+def hold():
+    # Objects we created live as long as this connection
+    while True:
+        signal.pause()
+
+tool, argv = os.path.basename(sys.argv[0]), sys.argv[1:]
+call("exec", tool=tool, argv=argv)
+
+if tool == "pw-dump":
+    if "--monitor" in argv:
+        call("monitor")
+        for line in stream:
+            sys.stdout.write(line)
+            sys.stdout.flush()
+    else:
+        print(json.dumps(call("dump")["objects"]))
+
+elif tool == "pw-cli":
+    if argv[:1] == ["create-node"]:
+        props = dict(a.split("=", 1) for a in argv[2:] if "=" in a)
+        call("create", props=props, linger=True)
+    elif argv[:1] == ["destroy"]:
+        call("destroy", id=int(argv[1]))
+
+elif tool == "pw-link":
+    if argv[:1] == ["-d"]:
+        sys.exit(0 if call("unlink", out=argv[1], inp=argv[2])["ok"] else 1)
+    sys.exit(0 if call("link", out=argv[0], inp=argv[1])["ok"] else 1)
+
+elif tool == "pw-loopback":
+    name = option("--name", "loopback")
+    capture = json.loads(option("--capture-props", "{}") or "{}")
+    capture.setdefault("node.name", f"input.{name}")
+    call("create", props=capture, role="capture")
+    call("create", props={"node.name": f"output.{name}"}, role="playback")
+    hold()
+
+elif tool == "scrcpy":
+    if os.path.exists(os.path.join(os.environ["ZB_BENCH_DIR"], "scrcpy.crash")):
+        time.sleep(0.1)
+        print("ERROR: fake crash", file=sys.stderr)
+        sys.exit(1)
+    time.sleep(float(os.environ.get("ZB_BENCH_SCRCPY_DELAY", "0.3")))
+    if option("--audio-source") == "mic":
+        call("create", props={"node.name": "scrcpy", "application.process.id": os.getpid()}, role="playback")
+    print(f"INFO: Device: fake ({option('--serial')})", flush=True)
+    if option("--v4l2-sink"):
+        print(f"INFO: v4l2 sink started to device: {option('--v4l2-sink')}", flush=True)
+    call("ready")
+    hold()
+
+elif tool == "gst-launch-1.0":
+    call("ready")
+    hold()
+'''
+
+# --- Fake Graph Server ---
+
+class FakeGraph:
+    """
+    Minimal PipeWire stand-in: nodes, ports and links in pw-dump format,
+    pushed to `pw-dump --monitor` clients as they change. Also the process
+    table of every fake tool run (start, ready, exit).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.objects = {}
+        self.owner = {}       # object id -> owning connection (None: lingers)
+        self.monitors = []
+        self.procs = {}       # pid -> {tool, argv, start, ready, end}
+        self.execs = []       # (time, tool, argv)
+        self.next_id = 30
+        self.lock = threading.RLock()
+        self.server = socket.socket(socket.AF_UNIX)
+        self.server.bind(path)
+        self.server.listen(64)
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            conn, _ = self.server.accept()
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        pid = None
+        with conn, conn.makefile("rw") as stream:
+            try:
+                for line in stream:
+                    req = json.loads(line)
+                    pid = req["pid"]
+                    with self.lock:
+                        reply = getattr(self, "op_" + req["op"])(req, conn)
+                        stream.write(json.dumps(reply) + "\n")
+                        stream.flush()
+                        if req["op"] == "monitor":
+                            conn.sendall((json.dumps(list(self.objects.values())) + "\n").encode())
+                            self.monitors.append(conn)
+            except OSError:
+                pass  # Killed mid-request
+        with self.lock:
+            if conn in self.monitors:
+                self.monitors.remove(conn)
+            owned = [oid for oid, owner in self.owner.items() if owner is conn]
+            self._remove(owned)
+            if pid in self.procs:
+                self.procs[pid]["end"] = time.monotonic()
+
+    def _push(self, batch):
+        if not batch:
+            return
+        data = (json.dumps(batch) + "\n").encode()
+        for conn in list(self.monitors):
+            try:
+                conn.sendall(data)
+            except OSError:
+                self.monitors.remove(conn)
+
+    def _add(self, obj, owner):
+        obj["id"] = self.next_id
+        self.next_id += 1
+        self.objects[obj["id"]] = obj
+        self.owner[obj["id"]] = owner
+        return obj
+
+    def _remove(self, ids):
+        ids = set(ids)
+        # Ports go with their node, links with their ports
+        ids |= {oid for oid, o in self.objects.items()
+                if o["type"] == PW_PORT and o["info"]["props"]["node.id"] in ids}
+        ids |= {oid for oid, o in self.objects.items()
+                if o["type"] == PW_LINK and ({o["info"]["output-port-id"], o["info"]["input-port-id"]} & ids)}
+        for oid in ids:
+            self.objects.pop(oid, None)
+            self.owner.pop(oid, None)
+        self._push([{"id": oid, "info": None} for oid in sorted(ids)])
+
+    def _port(self, spec):
+        if str(spec).isdigit():
+            return int(spec) if int(spec) in self.objects else None
+        node_name, _, port_name = str(spec).rpartition(":")
+        nodes = {o["id"] for o in self.objects.values()
+                 if o["type"] == PW_NODE and o["info"]["props"].get("node.name") == node_name}
+        for o in self.objects.values():
+            props = o["info"].get("props", {})
+            if o["type"] == PW_PORT and props["node.id"] in nodes and props["port.name"] == port_name:
+                return o["id"]
+        return None
+
+    # --- Requests from fake tools ---
+
+    def op_exec(self, req, conn):
+        now = time.monotonic()
+        self.execs.append((now, req["tool"], req["argv"]))
+        self.procs[req["pid"]] = {"tool": req["tool"], "argv": req["argv"], "start": now, "ready": None, "end": None}
+        return {"ok": True}
+
+    def op_ready(self, req, conn):
+        self.procs[req["pid"]]["ready"] = time.monotonic()
+        return {"ok": True}
+
+    def op_monitor(self, req, conn):
+        return {"ok": True}
+
+    def op_dump(self, req, conn):
+        return {"ok": True, "objects": list(self.objects.values())}
+
+    def op_create(self, req, conn):
+        props = req["props"]
+        media_class = props.get("media.class", "")
+        if req.get("role") == "playback":
+            ports = [("output", "output")]
+        elif media_class == "Audio/Sink":
+            ports = [("input", "playback"), ("output", "monitor")]
+        elif media_class.startswith("Audio/Source"):
+            ports = [("input", "input"), ("output", "capture")]
+        else:
+            ports = [("input", "input")]
+        owner = None if req.get("linger") else conn
+        node = self._add({"type": PW_NODE, "info": {"props": props}}, owner)
+        batch = [node]
+        for direction, prefix in ports:
+            for ch in ["FL", "FR"]:
+                batch.append(self._add({"type": PW_PORT, "info": {"direction": direction, "props": {
+                    "port.name": f"{prefix}_{ch}", "node.id": node["id"]}}}, owner))
+        self._push(batch)
+        return {"ok": True, "id": node["id"]}
+
+    def op_destroy(self, req, conn):
+        found = req["id"] in self.objects
+        self._remove([req["id"]])
+        return {"ok": found}
+
+    def op_link(self, req, conn):
+        out_id, in_id = self._port(req["out"]), self._port(req["inp"])
+        if out_id is None or in_id is None:
+            return {"ok": False}
+        if any(o["type"] == PW_LINK and o["info"]["output-port-id"] == out_id and o["info"]["input-port-id"] == in_id
+               for o in self.objects.values()):
+            return {"ok": False}  # pw-link: "failed to link ports: File exists"
+        self._push([self._add({"type": PW_LINK, "info": {"output-port-id": out_id, "input-port-id": in_id}}, None)])
+        return {"ok": True}
+
+    def op_unlink(self, req, conn):
+        out_id, in_id = self._port(req["out"]), self._port(req["inp"])
+        links = [oid for oid, o in self.objects.items() if o["type"] == PW_LINK
+                 and o["info"]["output-port-id"] == out_id and o["info"]["input-port-id"] == in_id]
+        self._remove(links)
+        return {"ok": bool(links)}
+
+    # --- Queries from scenarios ---
+
+    def live(self, tool, match="", ready=True):
+        with self.lock:
+            return [pid for pid, p in self.procs.items()
+                    if p["tool"] == tool and p["end"] is None and (p["ready"] or not ready)
+                    and any(match in arg for arg in p["argv"])]
+
+    def execs_since(self, since, tool=None, match=""):
+        with self.lock:
+            return [e for e in self.execs if e[0] >= since and (tool is None or e[1] == tool)
+                    and any(match in arg for arg in e[2] or [""])]
+
+    def kill_all(self):
+        with self.lock:
+            pids = [pid for pid, p in self.procs.items() if p["end"] is None]
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+# --- Fake adb Server ---
+
+class FakeAdb:
+    """Answers host:track-devices and host:connect like the adb server on 5037."""
+
+    def __init__(self):
+        self.table = {}
+        self.trackers = []
+        self.reachable = set()
+        self.lock = threading.Lock()
+        self.server = socket.socket()
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen(16)
+        self.port = self.server.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _table(self):
+        body = "".join(f"{serial}\t{state}\n" for serial, state in self.table.items()).encode()
+        return b"%04x" % len(body) + body
+
+    def set(self, serial, state):
+        with self.lock:
+            if state is None:
+                self.table.pop(serial, None)
+            else:
+                self.table[serial] = state
+            for conn in list(self.trackers):
+                try:
+                    conn.sendall(self._table())
+                except OSError:
+                    self.trackers.remove(conn)
+
+    def _accept(self):
+        while True:
+            conn, _ = self.server.accept()
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        try:
+            service = conn.recv(int(conn.recv(4), 16)).decode()
+        except (OSError, ValueError):
+            conn.close()
+            return
+        if service == "host:track-devices":
+            with self.lock:
+                conn.sendall(b"OKAY" + self._table())
+                self.trackers.append(conn)
+            return
+        if service.startswith("host:connect:"):
+            serial = service[len("host:connect:"):]
+            if serial.split(":")[0] in self.reachable:
+                self.set(serial, "device")
+                reply = f"already connected to {serial}" if self.table.get(serial) == "device" else f"connected to {serial}"
+            else:
+                reply = f"failed to connect to {serial}"
+            conn.sendall(b"OKAY" + b"%04x" % len(reply) + reply.encode())
+        else:
+            reply = b"unknown host service"
+            conn.sendall(b"FAIL" + b"%04x" % len(reply) + reply)
+        conn.close()
+
+# --- Simulated Phone ---
+
+class Phone:
+    """
+    The Termux receiver's control side: answers SYNC with READY and sends a
+    READY heartbeat every 250 ms. Packets in both directions go through a
+    seeded loss/delay model; `silent` drops everything (Wi-Fi gone).
+    """
+
+    def __init__(self, proto, ip, adb, rng):
+        self.proto = proto
+        self.ip = ip
+        self.adb = adb
+        self.rng = rng
+        self.loss = 0.0
+        self.delay = 0.0
+        self.jitter = 0.0
+        self.silent = False
+        self.session = 0
+        self.resyncs = 0    # Session changes, each one a GStreamer restart on a real phone
+        self.seq = 0
+        self.running = True
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((ip, PHONE_PORT))
+        self.sock.settimeout(HEARTBEAT_INTERVAL)
+        self.set_online(True)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def set_online(self, online):
+        self.silent = not online
+        if online:
+            self.adb.reachable.add(self.ip)
+        else:
+            self.adb.reachable.discard(self.ip)
+            self.adb.set(f"{self.ip}:5555", None)
+
+    def close(self):
+        self.running = False
+        self.set_online(False)
+        # The port stays bound until the receive in flight returns
+        self.thread.join()
+        self.sock.close()
+
+    def _lost(self):
+        return self.silent or self.rng.random() < self.loss
+
+    def _send(self):
+        self.seq += 1
+        if self._lost():
+            return
+        data = self.proto.pack_message(self.proto.MSG_READY, self.seq, self.session, flags=self.proto.CAP_TIMESTAMPS)
+        delay = self.delay + self.jitter * self.rng.random()
+        if delay:
+            threading.Timer(delay, self._sendto, (data,)).start()
+        else:
+            self._sendto(data)
+
+    def _sendto(self, data):
+        try:
+            self.sock.sendto(data, ("127.0.0.1", PC_PORT))
+        except OSError:
+            pass
+
+    def _run(self):
+        next_beat = 0
+        while self.running:
+            now = time.monotonic()
+            if now >= next_beat:
+                self._send()
+                next_beat = now + HEARTBEAT_INTERVAL
+            try:
+                data, _ = self.sock.recvfrom(1024)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            msg = self.proto.unpack_message(data)
+            if msg is None or self._lost():
+                continue
+            msg_type, _, _, session, _, _ = msg
+            if msg_type == self.proto.MSG_SYNC:
+                self.resyncs += bool(self.session) and session != self.session
+                self.session = session
+                self._send()
+
+class FakeGst:
+    """
+    Stand-in for the Gst bindings, for exercising the daemon's in-process
+    pipeline code without PyGObject. Tracks which pipelines are playing.
+    """
+
+    class State:
+        NULL, PAUSED, PLAYING = "null", "paused", "playing"
+
+    class StateChangeReturn:
+        SUCCESS, FAILURE = "success", "failure"
+
+    class MessageType:
+        ERROR, EOS, APPLICATION = 1, 2, 4
+
+    CLOCK_TIME_NONE = None
+
+    class Message:
+        @staticmethod
+        def new_application(src, structure):
+            return threading.Event()
+
+    class Structure:
+        @staticmethod
+        def new_empty(name):
+            return name
+
+    class Pipeline:
+        def __init__(self, playing):
+            self.playing = playing
+            self.stopped = threading.Event()
+
+        def set_state(self, state):
+            (self.playing.add if state == FakeGst.State.PLAYING else self.playing.discard)(self)
+            return FakeGst.StateChangeReturn.SUCCESS
+
+        def get_bus(self):
+            return self
+
+        def timed_pop_filtered(self, timeout, mask):
+            self.stopped.wait()
+            return None  # Like the daemon's own stop message: nothing to report
+
+        def post(self, message):
+            self.stopped.set()
+
+    def __init__(self):
+        self.playing = set()
+
+    def parse_launch(self, description):
+        return FakeGst.Pipeline(self.playing)
+
+# --- Daemon Under Test ---
+
+class Bench:
+    """One scenario run: workspace, stand-ins, phones and a fresh daemon."""
+
+    def __init__(self, opts, proto, seed):
+        self.opts = opts
+        self.proto = proto
+        self.rng = random.Random(seed)
+        self.dir = tempfile.mkdtemp(prefix="zb-bench-")
+        self.bin = os.path.join(self.dir, "bin")
+        os.makedirs(self.bin)
+        os.makedirs(os.path.join(self.dir, "home", ".config", "zbridge"))
+        os.makedirs(os.path.join(self.dir, "run"))
+        tool = os.path.join(self.bin, "fake-tool")
+        with open(tool, "w") as f:
+            f.write(FAKE_TOOL.replace("#!/usr/bin/env python3", f"#!{sys.executable}", 1))
+        os.chmod(tool, 0o755)
+        for name in FAKE_TOOLS:
+            os.symlink(tool, os.path.join(self.bin, name))
+
+        self.graph = FakeGraph(os.path.join(self.dir, "graph.sock"))
+        self.adb = FakeAdb()
+        self.phones = {}
+        self.config = {"PHONE_IP": "", "DESKTOP": "on", "MONITOR": "on", "CAM_FACING": "back"}
+        self.daemon = None
+        self.log_file = open(os.path.join(self.dir, "daemon.log"), "w")
+        self.env = dict(os.environ,
+                        PATH=self.bin + os.pathsep + os.environ.get("PATH", ""),
+                        HOME=os.path.join(self.dir, "home"),
+                        XDG_RUNTIME_DIR=os.path.join(self.dir, "run"),
+                        ANDROID_ADB_SERVER_PORT=str(self.adb.port),
+                        ZB_BENCH_SOCKET=self.graph.path,
+                        ZB_BENCH_DIR=self.dir,
+                        PYTHONUNBUFFERED="1")
+
+    # --- Setup ---
+
+    def phone(self, ip):
+        if ip not in self.phones:
+            self.phones[ip] = Phone(self.proto, ip, self.adb, self.rng)
+        return self.phones[ip]
+
+    def write_config(self, **values):
+        self.config.update(values)
+        path = os.path.join(self.env["HOME"], ".config", "zbridge", "state.conf")
+        with open(path + ".tmp", "w") as f:
+            f.writelines(f'{key}="{value}"\n' for key, value in self.config.items())
+        os.replace(path + ".tmp", path)  # Like zb-config's sed -i
+
+    def start(self):
+        self.t_start = time.monotonic()
+        self.daemon = subprocess.Popen([sys.executable, self.opts.daemon] + self.opts.daemon_args,
+                                       env=self.env, stdout=self.log_file, stderr=subprocess.STDOUT)
+
+    def stop(self):
+        """Stops the daemon (SIGTERM, like systemctl stop), leaving the stand-ins running."""
+        self.daemon.send_signal(signal.SIGTERM)
+        self.daemon.wait(5)
+
+    def close(self):
+        if self.daemon and self.daemon.poll() is None:
+            self.daemon.send_signal(signal.SIGTERM)
+            try:
+                self.daemon.wait(5)
+            except subprocess.TimeoutExpired:
+                self.daemon.kill()
+                self.daemon.wait()
+        self.graph.kill_all()
+        for phone in self.phones.values():
+            phone.close()
+        self.log_file.close()
+        if self.opts.keep:
+            log(f"Workspace kept in {self.dir}")
+        else:
+            shutil.rmtree(self.dir, ignore_errors=True)
+
+    # --- Observation ---
+
+    def metrics(self):
+        """Scrapes the daemon's metrics socket into {(name, device): value}."""
+        path = os.path.join(self.env["XDG_RUNTIME_DIR"], "zbridge", "metrics.sock")
+        values = {}
+        try:
+            with socket.socket(socket.AF_UNIX) as sock:
+                sock.settimeout(1)
+                sock.connect(path)
+                data = b""
+                while chunk := sock.recv(65536):
+                    data += chunk
+        except OSError:
+            return values
+        for line in data.decode().splitlines():
+            m = re.match(r'(\w+)(?:\{(.*)\})? (\S+)$', line)
+            if m:
+                device = re.search(r'device="([^"]*)"', m.group(2) or "")
+                key = (m.group(1), device.group(1) if device else None)
+                values[key] = values.get(key, 0) + float(m.group(3))
+        return values
+
+    def cpu_seconds(self):
+        with open(f"/proc/{self.daemon.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+    def ticks(self, metrics=None):
+        metrics = metrics or self.metrics()
+        return sum(v for (name, _), v in metrics.items()
+                   if name in ("zbridge_loop_wakeups_total", "zbridge_device_loop_wakeups_total"))
+
+    def connected(self, ip):
+        m = self.metrics()
+        return m.get(("zbridge_connected", ip)) == 1 and not m.get(("zbridge_suspected", ip))
+
+    def log_offset(self):
+        return os.path.getsize(self.log_file.name)
+
+    def logged(self, text, offset):
+        """
+        Occurrences of text in the daemon log written since offset. Inside a
+        measured window, state changes are read from here: each metrics scrape
+        costs the daemon CPU that would count against it.
+        """
+        with open(self.log_file.name, errors="replace") as f:
+            f.seek(offset)
+            return f.read().count(text)
+
+    def reconnected(self, ip, offset):
+        return self.logged(f"[{ip}] Phone back", offset) or self.logged(f"[{ip}] Handshake received", offset)
+
+    def streaming(self, ip, gain=None):
+        """scrcpy is up for the phone and (with DESKTOP on) the PC->phone sender too."""
+        if not self.graph.live("scrcpy", f"{ip}:5555"):
+            return False
+        if self.config["DESKTOP"] == "on":
+            match = f"volume={gain}" if gain is not None else f"host={ip}"
+            senders = set(self.graph.live("gst-launch-1.0", f"host={ip}"))
+            return bool(senders & set(self.graph.live("gst-launch-1.0", match)))
+        return True
+
+    def wait_for(self, predicate, since, timeout=30.0):
+        """Milliseconds from `since` until predicate() holds, None on timeout."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if predicate():
+                return round((time.monotonic() - since) * 1000)
+            time.sleep(0.02)
+        return None
+
+    def settle(self, quiet=1.0, timeout=10.0):
+        """Waits until nothing has been forked for `quiet` seconds (startup tail done)."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            last = self.graph.execs[-1][0] if self.graph.execs else 0
+            if time.monotonic() - last >= quiet:
+                return
+            time.sleep(0.1)
+
+    def mark(self):
+        return {"t": time.monotonic(), "cpu": self.cpu_seconds(), "ticks": self.ticks(), "log": self.log_offset()}
+
+    def window(self, mark):
+        """Forks per minute and CPU per event loop tick since mark (scraping metrics only at both ends)."""
+        now = self.mark()
+        minutes = (now["t"] - mark["t"]) / 60
+        ticks = now["ticks"] - mark["ticks"]
+        cpu = now["cpu"] - mark["cpu"]
+        forks = len(self.graph.execs_since(mark["t"]))
+        return {"forks_per_min": round(forks / minutes, 1) if minutes else None,
+                "cpu_ms_per_tick": round(cpu * 1000 / ticks, 3) if ticks else None,
+                "cpu_percent": round(cpu * 100 / (now["t"] - mark["t"]), 2)}
+
+    def up(self, ip):
+        """Starts the daemon with one phone and waits until it streams."""
+        self.phone(ip)
+        self.write_config(PHONE_IP=ip)
+        self.start()
+        connect = self.wait_for(lambda: self.connected(ip), self.t_start)
+        stream = self.wait_for(lambda: self.streaming(ip), self.t_start)
+        if stream is None:
+            raise RuntimeError(f"daemon never started streaming to {ip} (see {self.log_file.name})")
+        self.settle()
+        return connect, stream
+
+# --- Scenarios ---
+
+PHONE_A = "127.0.0.2"
+PHONE_B = "127.0.0.3"
+
+def scenario_cold_start(b):
+    """Daemon start to streaming, then 10s of steady state."""
+    connect, stream = b.up(PHONE_A)
+    mark = b.mark()
+    time.sleep(10)
+    return dict(reconnect_ms=connect, time_to_stream_ms=stream, **b.window(mark))
+
+def scenario_ip_change(b):
+    """PHONE_IP switched to another phone (zb-config -i)."""
+    b.up(PHONE_A)
+    b.phone(PHONE_B)
+    mark = b.mark()
+    b.phones[PHONE_A].set_online(False)
+    b.write_config(PHONE_IP=PHONE_B)
+    connect = b.wait_for(lambda: b.reconnected(PHONE_B, mark["log"]), mark["t"])
+    stream = b.wait_for(lambda: b.streaming(PHONE_B), mark["t"])
+    time.sleep(5)
+    return dict(reconnect_ms=connect, time_to_stream_ms=stream, **b.window(mark))
+
+def scenario_heartbeat_blip(b):
+    """Phone silent for 2s (Wi-Fi power save): suspected, then resumed."""
+    b.up(PHONE_A)
+    phone = b.phones[PHONE_A]
+    mark = b.mark()
+    phone.set_online(False)
+    detect = b.wait_for(lambda: b.logged(f"[{PHONE_A}] Heartbeat overdue", mark["log"]), mark["t"], 5)
+    time.sleep(max(0, 2.0 - (time.monotonic() - mark["t"])))
+    resumed, offset = time.monotonic(), b.log_offset()
+    phone.set_online(True)
+    connect = b.wait_for(lambda: b.reconnected(PHONE_A, offset), resumed)
+    stream = b.wait_for(lambda: b.streaming(PHONE_A), resumed)
+    time.sleep(3)
+    return dict(detect_ms=detect, reconnect_ms=connect, time_to_stream_ms=stream, **b.window(mark))
+
+def scenario_heartbeat_drop(b):
+    """Phone gone past the heartbeat timeout: streams torn down and rebuilt."""
+    b.up(PHONE_A)
+    phone = b.phones[PHONE_A]
+    mark = b.mark()
+    phone.set_online(False)
+    down = b.wait_for(lambda: b.logged(f"[{PHONE_A}] Heartbeat timed out", mark["log"]), mark["t"])
+    resumed, offset = time.monotonic(), b.log_offset()
+    phone.set_online(True)
+    connect = b.wait_for(lambda: b.reconnected(PHONE_A, offset), resumed)
+    stream = b.wait_for(lambda: b.streaming(PHONE_A), resumed)
+    time.sleep(3)
+    return dict(detect_ms=down, reconnect_ms=connect, time_to_stream_ms=stream, **b.window(mark))
+
+def scenario_scrcpy_crash_loop(b):
+    """scrcpy exits right after launch for 10s, then recovers."""
+    b.up(PHONE_A)
+    crash_flag = os.path.join(b.dir, "scrcpy.crash")
+    open(crash_flag, "w").close()
+    mark = b.mark()
+    for pid in b.graph.live("scrcpy"):
+        os.kill(pid, signal.SIGKILL)
+    time.sleep(10)
+    crashes = len(b.graph.execs_since(mark["t"], "scrcpy"))
+    window = b.window(mark)
+    fixed = time.monotonic()
+    os.unlink(crash_flag)
+    stream = b.wait_for(lambda: b.streaming(PHONE_A), fixed)
+    return dict(time_to_stream_ms=stream, scrcpy_launches=crashes, **window)
+
+def scenario_loopback_crash(b):
+    """The monitor pw-loopback is killed: it must come back once its backoff expires."""
+    b.up(PHONE_A)
+    mark = b.mark()
+    for pid in b.graph.live("pw-loopback", "ZBridge_Monitor", ready=False):
+        os.kill(pid, signal.SIGKILL)
+    respawn = b.wait_for(lambda: b.graph.execs_since(mark["t"], "pw-loopback", "ZBridge_Monitor"), mark["t"], 15)
+    time.sleep(3)
+    return dict(loopback_respawn_ms=respawn, **b.window(mark))
+
+def scenario_placeholder_fallback(b):
+    """
+    In-process placeholder on a device that rejects the v4l2 ioctls (a plain
+    file): it must fall back to one GStreamer pipeline, not one per loop pass.
+    """
+    daemon = b.proto
+    gst = FakeGst()
+    saved = daemon.Gst, daemon.GLib
+    daemon.Gst, daemon.GLib = gst, FakeGst
+    device = os.path.join(b.dir, "video9")
+    open(device, "w").close()
+    placeholder = daemon.PlaceholderStream("bench_placeholder", device, inprocess=True)
+    try:
+        for _ in range(10):  # DeviceSession.run's placeholder step, once per pass
+            if not placeholder.alive() and placeholder.can_start():
+                placeholder.start()
+            time.sleep(0.1)
+        pipelines = len(gst.playing)
+        native = placeholder.native
+        placeholder.stop()
+        return dict(placeholder_pipelines=pipelines, placeholder_native=int(native),
+                    placeholder_left_playing=len(gst.playing))
+    finally:
+        placeholder.stop()
+        daemon.Gst, daemon.GLib = saved
+
+def scenario_gain_change(b):
+    """MIC_GAIN then AUDIO_GAIN changed from zb-config."""
+    b.up(PHONE_A)
+    mark = b.mark()
+    b.write_config(MIC_GAIN="1.5")
+    mic = b.wait_for(lambda: b.graph.execs_since(mark["t"], "pactl", "150%"), mark["t"], 10)
+    changed = time.monotonic()
+    b.write_config(AUDIO_GAIN="0.5")
+    stream = b.wait_for(lambda: b.streaming(PHONE_A, gain="0.5"), changed)
+    time.sleep(3)
+    return dict(mic_gain_apply_ms=mic, time_to_stream_ms=stream, **b.window(mark))
+
+def scenario_lossy_link(b):
+    """20s at 20% loss each way with 50-90ms delay: nothing should flap."""
+    b.up(PHONE_A)
+    phone = b.phones[PHONE_A]
+    phone.loss, phone.delay, phone.jitter = 0.2, 0.05, 0.04
+    mark = b.mark()
+    time.sleep(20)
+    window = b.window(mark)
+    # Every flap starts with a suspicion (beyond 5 per 10s the log rate limit caps the count)
+    flaps = b.logged(f"[{PHONE_A}] Heartbeat overdue", mark["log"])
+    lost = b.metrics().get(("zbridge_heartbeats_lost_total", PHONE_A))
+    return dict(flaps=flaps, heartbeats_lost=lost, **window)
+
+def scenario_daemon_restart(b):
+    """Daemon restarted with the phone up: it should resume the phone's session."""
+    b.up(PHONE_A)
+    b.stop()
+    offset = b.log_offset()
+    b.start()
+    mark = b.mark()
+    connect = b.wait_for(lambda: b.reconnected(PHONE_A, offset), b.t_start)
+    stream = b.wait_for(lambda: b.streaming(PHONE_A), b.t_start)
+    time.sleep(3)
+    return dict(reconnect_ms=connect, time_to_stream_ms=stream, resyncs=b.phones[PHONE_A].resyncs, **b.window(mark))
+
+SCENARIOS = {
+    "cold_start": scenario_cold_start,
+    "ip_change": scenario_ip_change,
+    "heartbeat_blip": scenario_heartbeat_blip,
+    "heartbeat_drop": scenario_heartbeat_drop,
+    "scrcpy_crash_loop": scenario_scrcpy_crash_loop,
+    "loopback_crash": scenario_loopback_crash,
+    "placeholder_fallback": scenario_placeholder_fallback,
+    "gain_change": scenario_gain_change,
+    "daemon_restart": scenario_daemon_restart,
+    "lossy_link": scenario_lossy_link,
+}
+
+# --- Report ---
+
+# Allowed slack over the baseline before a result counts as a regression
+TOLERANCE = 0.25
+SLACK = {"_ms": 150, "forks_per_min": 2, "cpu_ms_per_tick": 0.5, "cpu_percent": 1, "flaps": 0,
+         "scrcpy_launches": 1, "heartbeats_lost": 10, "resyncs": 0,
+         "placeholder_pipelines": 0, "placeholder_left_playing": 0}
+
+def regressions(results, baseline):
+    found = []
+    for name, metrics in results.items():
+        for key, value in metrics.items():
+            base = baseline.get(name, {}).get(key)
+            if not isinstance(value, (int, float)) or not isinstance(base, (int, float)):
+                if base is not None and value is None:
+                    found.append(f"{name}.{key}: timed out (baseline {base})")
+                continue
+            slack = next((s for suffix, s in SLACK.items() if key.endswith(suffix)), 0)
+            if value > base * (1 + TOLERANCE) + slack:
+                found.append(f"{name}.{key}: {value} (baseline {base})")
+    return found
+
+def print_table(results):
+    columns = ["reconnect_ms", "time_to_stream_ms", "forks_per_min", "cpu_ms_per_tick", "cpu_percent"]
+    print(f"{'scenario':<20}" + "".join(f"{c:>19}" for c in columns) + "  other")
+    for name, metrics in results.items():
+        row = "".join(f"{'-' if metrics.get(c) is None else metrics[c]!s:>19}" for c in columns)
+        other = ", ".join(f"{k}={v}" for k, v in metrics.items() if k not in columns)
+        print(f"{name:<20}{row}  {other}")
+
+def load_protocol(path):
+    """The daemon's own control protocol code, so the phone can't drift from it."""
+    spec = importlib.util.spec_from_file_location("zb_daemon", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def preflight():
+    for addr in [("127.0.0.1", PC_PORT), (PHONE_A, PHONE_PORT), (PHONE_B, PHONE_PORT)]:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            try:
+                sock.bind(addr)
+            except OSError as e:
+                sys.exit(f"Cannot bind {addr[0]}:{addr[1]} ({e}). Stop zbridge before benchmarking.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay scripted scenarios against zb-daemon with fake PipeWire, adb and phones.")
+    parser.add_argument("-s", "--scenario", action="append", choices=list(SCENARIOS), help="Run only these scenarios (repeatable)")
+    parser.add_argument("--json", metavar="FILE", help="Write results as JSON")
+    parser.add_argument("--baseline", metavar="FILE", help="Exit 1 if results regress against this JSON")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for simulated packet loss and delay")
+    parser.add_argument("--daemon", default=DAEMON, help="zb-daemon.py to benchmark")
+    parser.add_argument("--daemon-arg", dest="daemon_args", action="append", default=[], help="Extra zb-daemon flag (repeatable)")
+    parser.add_argument("--keep", action="store_true", help="Keep each scenario's workspace and daemon log")
+    opts = parser.parse_args()
+
+    preflight()
+    proto = load_protocol(opts.daemon)
+    results = {}
+    for name in opts.scenario or SCENARIOS:
+        log(f"Running {name}...")
+        bench = Bench(opts, proto, opts.seed)
+        try:
+            results[name] = SCENARIOS[name](bench)
+        except Exception as e:
+            log(f"{name} failed: {e}")
+            results[name] = {"error": str(e)}
+        finally:
+            bench.close()
+
+    print_table(results)
+    if opts.json:
+        with open(opts.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if opts.baseline:
+        with open(opts.baseline) as f:
+            found = regressions(results, json.load(f))
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
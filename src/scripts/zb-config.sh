@@ -8,6 +8,8 @@ CONFIG_DIR="$HOME/.config/zbridge"
 CONFIG_FILE="$CONFIG_DIR/state.conf"
 IPS_FILE="$CONFIG_DIR/saved_ips"
 CONFIG_PID_FILE="/tmp/zbridge_config_pid"
+METRICS_SOCK="${XDG_RUNTIME_DIR:-/tmp}/zbridge/metrics.sock"
+CONTROL_SOCK="${XDG_RUNTIME_DIR:-/tmp}/zbridge/control.sock"
 SERVICE_NAME="zbridge"
 
 mkdir -p "$CONFIG_DIR"
@@ -62,6 +64,63 @@ set_config() {
     fi
 }
 
+read_metrics() {
+    [[ -S "$METRICS_SOCK" ]] || return 1
+    python3 - "$METRICS_SOCK" << 'PY' 2>/dev/null
+import socket, sys
+s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+s.settimeout(1)
+s.connect(sys.argv[1])
+data = b""
+while chunk := s.recv(65536):
+    data += chunk
+sys.stdout.write(data.decode())
+PY
+}
+
+get_metric() {
+    # $1 = metric name (with labels), reads the cached $METRICS
+    awk -v k="$1" '$1 == k { print $2 }' <<< "$METRICS"
+}
+
+control_request() {
+    # $1 = JSON request, prints the daemon's JSON reply
+    [[ -S "$CONTROL_SOCK" ]] || return 1
+    python3 - "$CONTROL_SOCK" "$1" << 'PY' 2>/dev/null
+import socket, sys
+s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+s.settimeout(6)
+s.connect(sys.argv[1])
+s.sendall(sys.argv[2].encode() + b"\n")
+reply = s.makefile().readline()
+if not reply:
+    sys.exit(1)
+sys.stdout.write(reply)
+PY
+}
+
+apply_config() {
+    # $@ = KEY VALUE pairs. One round-trip over the control socket; falls
+    # back to editing state.conf and signalling the daemon.
+    local request reply
+    request=$(jq -cn --args '{cmd: "set", values: ([$ARGS.positional | _nwise(2) | {(.[0]): .[1]}] | add)}' "$@")
+    if reply=$(control_request "$request"); then
+        echo -n "[*] Updating Daemon... "
+        if [[ "$(jq -r .ok <<< "$reply")" != "true" ]]; then
+            echo -e "\n[!] Rejected: $(jq -r .error <<< "$reply")"
+            return 1
+        fi
+        [[ "$(jq -r .applied <<< "$reply")" == "true" ]] && echo "Done." || echo -e "\n[!] Timed out waiting for Daemon response."
+        return
+    fi
+
+    while (( $# >= 2 )); do
+        set_config "$1" "$2"
+        shift 2
+    done
+    send_signal_and_wait
+}
+
 send_signal_and_wait() {
     if ! systemctl --user is-active --quiet "$SERVICE_NAME"; then
         echo "[!] Daemon is NOT running. Start it with -t or systemctl."
@@ -103,8 +162,7 @@ toggle_setting() {
         echo "[*] $key is already $target."
     else
         echo "[*] Setting $key to $target"
-        set_config "$key" "$target"
-        send_signal_and_wait
+        apply_config "$key" "$target"
     fi
 }
 
@@ -136,6 +194,27 @@ remove_saved() {
     fi
 }
 
+# Extra phones served alongside PHONE_IP (EXTRA_IPS="ip1,ip2")
+activate_extra() {
+    local ip="$1"
+    if ! is_valid_ip "$ip"; then
+        echo "[!] Error: Invalid IP."; exit 1
+    fi
+    local extras=$(get_config EXTRA_IPS)
+    if [[ ",$extras," == *",$ip,"* ]]; then
+        echo "[*] $ip is already active."
+        return
+    fi
+    apply_config "EXTRA_IPS" "${extras:+$extras,}$ip"
+}
+
+deactivate_extra() {
+    local ip="$1"
+    local extras=$(get_config EXTRA_IPS)
+    local kept=$(tr ',' '\n' <<< "$extras" | grep -Fxv "$ip" | paste -sd, -)
+    apply_config "EXTRA_IPS" "$kept"
+}
+
 show_status() {
     echo ":: ZeroBridge State ::"
     echo "   IP: $(get_config PHONE_IP)"
@@ -155,66 +234,104 @@ show_status() {
         echo "   Camera orientation: $orient"
     fi
     
+    # The daemon knows whether its loopbacks run; ask PipeWire only without it
+    local status mon_act dsk_act
+    if status=$(control_request '{"cmd": "status"}'); then
+        mon_act=$(jq -r '.status.monitor_active' <<< "$status")
+        dsk_act=$(jq -r '.status.desktop_active' <<< "$status")
+    else
+        local nodes=$(pw-dump Node)
+        mon_act=$(jq -r 'any(.[]; .info.props["node.name"] | strings | contains("ZBridge_Monitor"))' <<< "$nodes")
+        dsk_act=$(jq -r 'any(.[]; .info.props["node.name"] | strings | contains("ZBridge_Desktop"))' <<< "$nodes")
+    fi
+
     local mon_conf=$(get_config MONITOR)
-    local mon_act=$(pw-dump Node | jq -r '.[] | select(.info.props["node.name"] | strings | contains("ZBridge_Monitor")) | .id' | head -n 1)
     echo -n "   Monitor: [${mon_conf:-off}] "
-    [[ -n "$mon_act" && "$mon_act" != "null" ]] && echo -e "\033[32m[ACTIVE]\033[0m" || echo -e "\033[31m[INACTIVE]\033[0m"
+    [[ "$mon_act" == "true" ]] && echo -e "\033[32m[ACTIVE]\033[0m" || echo -e "\033[31m[INACTIVE]\033[0m"
 
     local dsk_conf=$(get_config DESKTOP)
-    local dsk_act=$(pw-dump Node | jq -r '.[] | select(.info.props["node.name"] | strings | contains("ZBridge_Desktop")) | .id' | head -n 1)
     echo -n "   Desktop: [${dsk_conf:-off}] "
-    [[ -n "$dsk_act" && "$dsk_act" != "null" ]] && echo -e "\033[32m[ACTIVE]\033[0m" || echo -e "\033[31m[INACTIVE]\033[0m"
+    [[ "$dsk_act" == "true" ]] && echo -e "\033[32m[ACTIVE]\033[0m" || echo -e "\033[31m[INACTIVE]\033[0m"
 
     local mic_gain=$(get_config MIC_GAIN)
     local aud_gain=$(get_config AUDIO_GAIN)
     echo "   Mic Gain: ${mic_gain:-1.0}"
     echo "   Audio Out Gain: ${aud_gain:-1.0}"
+    local mic_mode=$(get_config MIC_MODE)
+    echo "   Mic Path: ${mic_mode:-loopback}"
 
     local active=$(systemctl --user is-active "$SERVICE_NAME")
     echo "   Daemon: $active"
+
+    METRICS=$(read_metrics)
+    local dev="device=\"$(get_config PHONE_IP | cut -d: -f1)\""
+    if [[ -n "$METRICS" && "$(get_metric "zbridge_connected{$dev}")" == "1" ]]; then
+        local rtt=$(get_metric "zbridge_rtt_ms{$dev}")
+        local loss=$(get_metric "zbridge_packet_loss_ratio{$dev}")
+        local jitter=$(get_metric "zbridge_jitter_ms{$dev}")
+        local jb=$(get_metric "zbridge_jitter_buffer_ms{$dev}")
+        local lat_mic=$(get_metric "zbridge_audio_latency_estimate_ms{$dev,direction=\"phone_to_pc\"}")
+        local lat_dsk=$(get_metric "zbridge_audio_latency_estimate_ms{$dev,direction=\"pc_to_phone\"}")
+        printf "   Link: RTT %.0f ms | Loss %.1f%% | Jitter %.1f ms | Buffer %.0f ms\n" \
+            "${rtt:-0}" "$(awk -v l="${loss:-0}" 'BEGIN { print l * 100 }')" "${jitter:-0}" "${jb:-0}"
+        printf "   Latency: Mic ~%.0f ms | Desktop ~%.0f ms\n" "${lat_mic:-0}" "${lat_dsk:-0}"
+    fi
+
+    local extra
+    for extra in $(get_config EXTRA_IPS | tr ',' ' '); do
+        echo -n "   Extra: $extra "
+        [[ "$(get_metric "zbridge_connected{device=\"${extra%%:*}\"}")" == "1" ]] && echo -e "\033[32m[CONNECTED]\033[0m" || echo -e "\033[31m[WAITING]\033[0m"
+    done
 }
 
 # --- Main ---
 
 if [[ $# -eq 0 ]]; then show_status; exit 0; fi
 
-while getopts "i:c:m:d:o:g:G:F:B:A:R:Ltk" opt; do
+while getopts "i:c:m:d:o:g:G:F:B:A:R:La:x:M:tk" opt; do
     case $opt in
         i) 
             if is_valid_ip "$OPTARG"; then
-                set_config "PHONE_IP" "$OPTARG"; send_signal_and_wait
+                apply_config "PHONE_IP" "$OPTARG"
             else
                 echo "[!] Error: Invalid IP."; exit 1
             fi
             ;;
         g)
             if is_valid_number "$OPTARG"; then
-                set_config "MIC_GAIN" "$OPTARG"; send_signal_and_wait
+                apply_config "MIC_GAIN" "$OPTARG"
             else
                 echo "[!] Error: Gain must be a number (e.g., 1.0, 0.5, 2.5)."
             fi
             ;;
         G)
             if is_valid_number "$OPTARG"; then
-                set_config "AUDIO_GAIN" "$OPTARG"; send_signal_and_wait
+                apply_config "AUDIO_GAIN" "$OPTARG"
             else
                 echo "[!] Error: Gain must be a number (e.g., 1.0, 0.5, 2.5)."
             fi
             ;;
+        M)
+            if [[ "$OPTARG" =~ ^(loopback|direct)$ ]]; then
+                apply_config "MIC_MODE" "$OPTARG"
+            else
+                echo "[!] Mic mode must be loopback or direct."
+            fi
+            ;;
         A) add_saved "$OPTARG" ;;
         R) remove_saved "$OPTARG" ;;
         L) list_saved ;;
+        a) activate_extra "$OPTARG" ;;
+        x) deactivate_extra "$OPTARG" ;;
         c) 
-            set_config "CAM_FACING" "$OPTARG"
-            set_config "CAM_ORIENT" ""
-            send_signal_and_wait 
+            apply_config "CAM_FACING" "$OPTARG" "CAM_ORIENT" ""
             ;;
         o) 
             if grep -qi "CAM_FACING=\"none\"" "$CONFIG_FILE"; then
                 echo "[!] Camera is disabled."
             else
                 if [[ "$OPTARG" =~ ^(0|flip0|90|flip90|180|flip180|270|flip270)$ ]]; then 
-                    set_config "CAM_ORIENT" "$OPTARG"; send_signal_and_wait
+                    apply_config "CAM_ORIENT" "$OPTARG"
                 else 
                     echo "[!] Invalid orientation."
                 fi
@@ -222,14 +339,12 @@ while getopts "i:c:m:d:o:g:G:F:B:A:R:Ltk" opt; do
         ;;
         F) 
             if [[ "$OPTARG" =~ ^(0|flip0|90|flip90|180|flip180|270|flip270)$ ]]; then 
-                set_config "DEF_ORIENT_FRONT" "$OPTARG"
-                send_signal_and_wait
+                apply_config "DEF_ORIENT_FRONT" "$OPTARG"
             fi
             ;;
         B) 
             if [[ "$OPTARG" =~ ^(0|flip0|90|flip90|180|flip180|270|flip270)$ ]]; then 
-                set_config "DEF_ORIENT_BACK" "$OPTARG"
-                send_signal_and_wait
+                apply_config "DEF_ORIENT_BACK" "$OPTARG"
             fi
             ;;
         m) toggle_setting "MONITOR" "$OPTARG" ;;
@@ -15,6 +15,21 @@ import json
 import threading
 import logging
 import argparse
+import codecs
+import collections
+import contextlib
+import select
+import queue
+import re
+import struct
+import ctypes
+import errno
+import fcntl
+import mmap
+import itertools
+import math
+from statistics import NormalDist
+from dataclasses import dataclass, fields
 from logging.handlers import SysLogHandler
 
 # --- Configuration ---
@@ -27,51 +42,176 @@ LOG_TAG = "zbridge-daemon"
 UDP_PORT_LISTEN = 5001
 UDP_PORT_SEND = 5002
 
+HEARTBEAT_TIMEOUT = 10    # Suspected for this long: give up and tear down
+SYNC_INTERVAL = 1.0
+RESYNC_BURST_INTERVAL = 0.1  # SYNC rate while the phone is suspected
+SCRCPY_CRASH_BACKOFF = 3.0
+
 # Globals
 running = True
-current_state = "DISCONNECTED"
-phone_ip = ""
-last_heartbeat = 0
-gst_process = None
-scrcpy_process = None
-placeholder_process = None
-current_scrcpy_cmd = [] 
-session_id = str(int(time.time())) 
-lock = threading.Lock()
-scrcpy_last_crash = 0
-
-# Gain State
-current_mic_gain = "1.0"
-current_audio_gain = "1.0"
-
-# Track loopback processes to prevent infinite spawning
-virtual_sinks = {} 
+session_id = int(time.time()) & 0xFFFFFFFF  # Device n uses session_id + n
 
 # Args
 args = None
 
-# Setup Logging
+# --- Logging ---
+#
+# log()/error() take a %-style message plus its arguments, formatted only
+# when the record is emitted, and optional key=value fields. Records with
+# the same message and first argument (usually the child or phone) are
+# rate limited; the next one let through carries suppressed=N.
+
+LOG_WINDOW = 10.0
+LOG_BURST = 5
+
+class RateLimit(logging.Filter):
+    """At most LOG_BURST records per message (and first argument) every LOG_WINDOW seconds."""
+
+    def __init__(self):
+        super().__init__()
+        self.windows = {}  # key -> [window start, records seen]
+        # Reentrant: signal handlers run on the main thread and log, possibly mid-filter()
+        self.lock = threading.RLock()
+        self.suppressed = 0
+
+    def filter(self, record):
+        if getattr(record, "unlimited", False):
+            return True
+        args = record.args if isinstance(record.args, tuple) else ()
+        key = (record.levelno, record.msg, args[0] if args else None)
+        now = time.monotonic()
+        with self.lock:
+            window = self.windows.get(key)
+            if window is None or now - window[0] >= LOG_WINDOW:
+                if window and window[1] > LOG_BURST:
+                    record.fields = dict(getattr(record, "fields", {}), suppressed=window[1] - LOG_BURST)
+                if len(self.windows) > 1024:
+                    self.windows = {k: w for k, w in self.windows.items() if now - w[0] < LOG_WINDOW}
+                self.windows[key] = window = [now, 0]
+            window[1] += 1
+            if window[1] > LOG_BURST:
+                self.suppressed += 1
+                return False
+            return True
+
+def format_field(value):
+    if isinstance(value, float):
+        value = round(value, 3)
+    value = str(value)
+    return f'"{value}"' if not value or " " in value or '"' in value else value
+
+class KeyValueFormatter(logging.Formatter):
+    """tag: [LEVEL] message key=value ..."""
+
+    def format(self, record):
+        text = f"{record.name}: [{record.levelname}] {record.getMessage()}"
+        fields = getattr(record, "fields", None)
+        if fields:
+            text += " " + " ".join(f"{k}={format_field(v)}" for k, v in fields.items())
+        return text
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, for journald/Loki style pipelines."""
+
+    def format(self, record):
+        entry = {"ts": round(record.created, 3), "level": record.levelname.lower(), "msg": record.getMessage()}
+        for key, value in (getattr(record, "fields", None) or {}).items():
+            entry[key] = round(value, 3) if isinstance(value, float) else value
+        return json.dumps(entry, default=str)
+
+class SyslogHandler(SysLogHandler):
+    def handleError(self, record):
+        pass  # No syslog socket: the console handler still has the record
+
 logger = logging.getLogger(LOG_TAG)
 logger.setLevel(logging.INFO)
-try:
-    syslog = SysLogHandler(address='/dev/log')
-    formatter = logging.Formatter('%(name)s: [%(levelname)s] %(message)s')
-    syslog.setFormatter(formatter)
-    logger.addHandler(syslog)
-except: pass 
+rate_limit = RateLimit()
+logger.addFilter(rate_limit)
 console = logging.StreamHandler()
-formatter = logging.Formatter('%(name)s: [%(levelname)s] %(message)s')
-console.setFormatter(formatter)
+console.setFormatter(KeyValueFormatter())
 logger.addHandler(console)
+# Under systemd stdout already lands in the journal; syslog would duplicate every line
+if "JOURNAL_STREAM" not in os.environ and os.path.exists('/dev/log'):
+    try:
+        syslog = SyslogHandler(address='/dev/log')
+        syslog.setFormatter(KeyValueFormatter())
+        logger.addHandler(syslog)
+    except OSError:
+        pass
 
-def log(msg):
-    logger.info(msg)
+def set_log_format(name):
+    formatter = JsonFormatter() if name == "json" else KeyValueFormatter()
+    for handler in logger.handlers:
+        handler.setFormatter(formatter)
 
-def error(msg):
-    logger.error(msg)
+def log(msg, *args, unlimited=False, **fields):
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(msg, *args, extra={"fields": fields, "unlimited": unlimited})
+
+def error(msg, *args, unlimited=False, **fields):
+    logger.error(msg, *args, extra={"fields": fields, "unlimited": unlimited})
+
+# --- Tracing ---
+#
+# With --trace, each loop iteration records how long its phases took and
+# logs them as one record (also summed into zbridge_phase_seconds_total).
+# Without it, span() hands back a shared no-op context manager.
+
+trace_local = threading.local()
+phase_seconds = collections.Counter()  # (loop, phase) -> seconds
+trace_enabled = False
+NO_SPAN = contextlib.nullcontext()
+
+class Span:
+    __slots__ = ("trace", "phase", "started")
+
+    def __init__(self, trace, phase):
+        self.trace = trace
+        self.phase = phase
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.trace.spans[self.phase] = self.trace.spans.get(self.phase, 0) + time.perf_counter() - self.started
+
+class Trace:
+    def __init__(self, loop, fields):
+        self.loop = loop
+        self.fields = fields
+        self.spans = {}
+        self.started = time.perf_counter()
+
+    def finish(self):
+        total = time.perf_counter() - self.started
+        for phase, seconds in self.spans.items():
+            phase_seconds[(self.loop, phase)] += seconds
+        log("trace %s", self.loop, unlimited=True, **self.fields, total_ms=total * 1000,
+            **{f"{phase}_ms": seconds * 1000 for phase, seconds in self.spans.items()})
+
+def trace_begin(loop, **fields):
+    """Starts tracing this thread's loop iteration (ended by trace_end)."""
+    trace_local.trace = Trace(loop, fields) if trace_enabled else None
+
+def trace_end():
+    trace = getattr(trace_local, "trace", None)
+    if trace:
+        trace.finish()
+        trace_local.trace = None
+
+def span(phase):
+    """Times a phase of the current iteration: `with span("config"): ...`"""
+    trace = getattr(trace_local, "trace", None)
+    return Span(trace, phase) if trace else NO_SPAN
 
 # --- Helpers ---
 
+# Every subprocess the daemon forks, by binary (exported as a metric)
+fork_counts = collections.Counter()
+
+def count_fork(cmd):
+    fork_counts[os.path.basename(cmd)] += 1
+
 def get_local_ip_for_target(target_ip):
     try:
         s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -92,8 +232,147 @@ def read_config():
                     config[key] = val.strip('"')
     return config
 
+# --- Typed Config ---
+
+ORIENTATIONS = ["0", "flip0", "90", "flip90", "180", "flip180", "270", "flip270"]
+IP_RE = re.compile(r"^\d{1,3}(\.\d{1,3}){3}(:\d{1,5})?$")
+MAX_DEVICES = 8
+
+@dataclass(frozen=True)
+class Config:
+    phone_ip: str = ""
+    monitor: str = "off"
+    desktop: str = "off"
+    cam_facing: str = "back"
+    cam_orient: str = ""
+    def_orient_front: str = "flip90"
+    def_orient_back: str = "flip270"
+    mic_gain: float = 1.0
+    audio_gain: float = 1.0
+    suspect_phi: float = 8.0
+    extra_ips: tuple = ()
+    mic_mode: str = "loopback"
+
+# state.conf key -> (field, validator)
+CONFIG_KEYS = {
+    "PHONE_IP": ("phone_ip", lambda v: v if not v or IP_RE.match(v) else None),
+    "MONITOR": ("monitor", lambda v: v if v in ["on", "off"] else None),
+    "DESKTOP": ("desktop", lambda v: v if v in ["on", "off"] else None),
+    "CAM_FACING": ("cam_facing", lambda v: v if v in ["back", "front", "none"] else None),
+    "CAM_ORIENT": ("cam_orient", lambda v: v if not v or v in ORIENTATIONS else None),
+    "DEF_ORIENT_FRONT": ("def_orient_front", lambda v: v if v in ORIENTATIONS else None),
+    "DEF_ORIENT_BACK": ("def_orient_back", lambda v: v if v in ORIENTATIONS else None),
+    "MIC_GAIN": ("mic_gain", lambda v: parse_gain(v)),
+    "AUDIO_GAIN": ("audio_gain", lambda v: parse_gain(v)),
+    "SUSPECT_PHI": ("suspect_phi", lambda v: parse_phi(v)),
+    "EXTRA_IPS": ("extra_ips", lambda v: parse_ip_list(v)),
+    "MIC_MODE": ("mic_mode", lambda v: v if v in ["loopback", "direct"] else None),
+}
+
+def parse_gain(value):
+    try:
+        gain = float(value)
+    except ValueError:
+        return None
+    return gain if 0.0 <= gain <= 10.0 else None
+
+def parse_phi(value):
+    try:
+        phi = float(value)
+    except ValueError:
+        return None
+    return phi if 1.0 <= phi <= 12.0 else None
+
+def parse_ip_list(value):
+    """EXTRA_IPS="ip1,ip2" -> ("ip1", "ip2"). Rejected as a whole if any entry is invalid."""
+    ips = tuple(dict.fromkeys(ip for ip in re.split(r"[,\s]+", value) if ip))
+    if len(ips) >= MAX_DEVICES or not all(IP_RE.match(ip) for ip in ips):
+        return None
+    return ips
+
+def parse_config(raw):
+    """
+    Builds a validated Config from raw state.conf values.
+    Invalid entries are logged and fall back to their defaults.
+    """
+    values = {}
+    for key, (field, validate) in CONFIG_KEYS.items():
+        if key not in raw or (raw[key] == "" and field not in ["phone_ip", "cam_orient"]):
+            continue
+        parsed = validate(raw[key])
+        if parsed is None:
+            error(":: [Config] Ignoring invalid %s=%r", key, raw[key])
+            continue
+        values[field] = parsed
+    return Config(**values)
+
+def config_diff(old, new):
+    """Returns the names of the fields that differ between two Configs."""
+    return {f.name for f in fields(Config) if getattr(old, f.name) != getattr(new, f.name)}
+
+_config_cache = {"stamp": None, "config": Config()}
+
+def load_config():
+    """
+    Returns the cached Config, re-parsing state.conf only if it changed on disk.
+    """
+    try:
+        st = os.stat(CONFIG_FILE)
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+    except OSError:
+        stamp = None
+    if stamp != _config_cache["stamp"]:
+        _config_cache["stamp"] = stamp
+        _config_cache["config"] = parse_config(read_config())
+    return _config_cache["config"]
+
+# --- Inotify ---
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct("iIII")
+
+def config_watcher():
+    """
+    Watches CONFIG_DIR with inotify and posts a config event whenever
+    state.conf is written or replaced (sed -i renames over it).
+    """
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+        if libc.inotify_add_watch(fd, CONFIG_DIR.encode(), mask) < 0:
+            raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+    except Exception as e:
+        error(":: [Config] Inotify unavailable (%s). Relying on SIGUSR1 only.", e, reason=e)
+        return
+
+    target = os.path.basename(CONFIG_FILE)
+    while running:
+        data = os.read(fd, 4096)
+        offset = 0
+        hit = False
+        while offset + INOTIFY_EVENT.size <= len(data):
+            _, _, _, name_len = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = data[offset:offset + name_len].rstrip(b"\0").decode(errors="replace")
+            offset += name_len
+            if name == target:
+                hit = True
+        if hit:
+            post_event("config")
+
 def get_node_id(node_name):
+    # Fast path: answer from the live graph mirror without forking
+    if graph.synced:
+        return graph.node_id(node_name)
     try:
+        count_fork("pw-dump")
         output = subprocess.check_output(["pw-dump", "Node"], stderr=subprocess.DEVNULL)
         nodes = json.loads(output)
         for node in nodes:
@@ -104,6 +383,7 @@ def get_node_id(node_name):
     return None
 
 def run_command(cmd_list, bg=False):
+    count_fork(cmd_list[0])
     try:
         if bg:
             return subprocess.Popen(cmd_list, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
@@ -111,7 +391,7 @@ def run_command(cmd_list, bg=False):
             subprocess.run(cmd_list, check=False, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
             return None
     except Exception as e:
-        error(f"Command failed: {cmd_list} -> {e}")
+        error("Command failed: %s -> %s", cmd_list, e, reason=e)
         return None
 
 def set_pactl_volume(node_name, gain_str):
@@ -122,6 +402,7 @@ def set_pactl_volume(node_name, gain_str):
     try:
         gain_float = float(gain_str)
         pct = int(gain_float * 100)
+        count_fork("pactl")
         # Use set-sink-volume because zbin_void is a Null Sink
         subprocess.run(["pactl", "set-sink-volume", node_name, f"{pct}%"], 
                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
@@ -130,10 +411,11 @@ def set_pactl_volume(node_name, gain_str):
         pass
 
 def send_notification(title, message):
+    count_fork("notify-send")
     try:
         subprocess.Popen(["notify-send", "-a", "zerobridge", "-u", "critical", "-i", "phone", title, message])
     except Exception as e:
-        error(f"Failed to send notification: {e}")
+        error("Failed to send notification: %s", e, reason=e)
 
 def get_camera_icon_path():
     search_paths = [
@@ -153,41 +435,601 @@ def get_camera_icon_path():
                     return full_path
     return None
 
-def ensure_adb_connection(target_ip):
+# --- ADB Transport ---
+
+ADB_SERVER = ("127.0.0.1", int(os.environ.get("ANDROID_ADB_SERVER_PORT", 5037)))
+ADB_DEFAULT_PORT = 5555
+ADB_CONNECT_TIMEOUT = 5
+ADB_BACKOFF_MIN = 1.0
+ADB_BACKOFF_MAX = 30.0
+
+class AdbError(Exception):
+    pass
+
+def adb_serial(ip):
+    """adb names TCP/IP transports host:port."""
+    return ip if ':' in ip else f"{ip}:{ADB_DEFAULT_PORT}"
+
+def recv_exact(sock, size):
+    buf = b""
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise AdbError("adb server closed the connection")
+        buf += chunk
+    return buf
+
+def read_adb_string(sock):
+    return recv_exact(sock, int(recv_exact(sock, 4), 16)).decode(errors="replace")
+
+def adb_request(service, timeout=ADB_CONNECT_TIMEOUT):
+    """
+    Sends one host service request to the adb server (4 hex digit length
+    prefix + name) and returns the socket once the server answered OKAY.
+    """
+    sock = socket.create_connection(ADB_SERVER, timeout=timeout)
     try:
-        output = subprocess.check_output(["adb", "devices"], text=True)
-        if target_ip in output:
-            return True
-        log(f":: [Daemon] ADB not connected to {target_ip}. Connecting...")
-        res = subprocess.run(["adb", "connect", target_ip], timeout=5, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        if "connected to" in res.stdout:
-            log(f":: [Daemon] ADB Connected: {res.stdout.strip()}")
-            return True
+        request = service.encode()
+        sock.sendall(b"%04x" % len(request) + request)
+        status = recv_exact(sock, 4)
+        if status == b"FAIL":
+            raise AdbError(read_adb_string(sock))
+        if status != b"OKAY":
+            raise AdbError(f"unexpected reply {status!r}")
+    except Exception:
+        sock.close()
+        raise
+    return sock
+
+class AdbTransport:
+    """
+    Always-current mirror of the adb server's device table, fed by one
+    long-lived host:track-devices stream on the server socket. Phones we
+    want are (re)connected by a background thread with backoff, so starting
+    scrcpy is a dict lookup and never waits on an adb subprocess.
+    """
+
+    def __init__(self):
+        self.devices = {}   # serial -> state ("device", "offline", "unauthorized", ...)
+        self.wanted = {}    # serial -> [next connect attempt, backoff]
+        self.connects = 0
+        self.synced = False
+        self.cond = threading.Condition()
+        self.listeners = []
+
+    def start(self):
+        threading.Thread(target=self._track, daemon=True).start()
+        threading.Thread(target=self._connector, daemon=True).start()
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def online(self, serial):
+        return self.devices.get(serial) == "device"
+
+    def want(self, serial):
+        with self.cond:
+            self.wanted.setdefault(serial, [0, ADB_BACKOFF_MIN])
+            self.cond.notify_all()
+
+    def unwant(self, serial):
+        with self.cond:
+            self.wanted.pop(serial, None)
+
+    def kick(self, serial):
+        """The phone just answered on the network: skip the rest of its backoff."""
+        with self.cond:
+            if serial in self.wanted and not self.online(serial):
+                self.wanted[serial] = [0, ADB_BACKOFF_MIN]
+                self.cond.notify_all()
+
+    def _track(self):
+        backoff = ADB_BACKOFF_MIN
+        while running:
+            try:
+                sock = adb_request("host:track-devices", timeout=None)
+            except ConnectionRefusedError:
+                # The only adb fork left: bring the server up, then talk to its socket
+                log(":: [ADB] Server not running. Starting it...")
+                run_command(["adb", "start-server"])
+                time.sleep(backoff)
+                backoff = min(backoff * 2, ADB_BACKOFF_MAX)
+                continue
+            except (OSError, AdbError) as e:
+                error(":: [ADB] Failed to track devices: %s", e, reason=e)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, ADB_BACKOFF_MAX)
+                continue
+
+            backoff = ADB_BACKOFF_MIN
+            log(":: [ADB] Tracking devices...")
+            try:
+                with sock:
+                    # One length-prefixed "serial\tstate" table per change
+                    while running:
+                        self._update(read_adb_string(sock))
+            except (OSError, AdbError) as e:
+                if running:
+                    error(":: [ADB] Device tracking lost: %s. Reconnecting...", e, reason=e)
+            # Without the server nothing is known to be online
+            self._update("", synced=False)
+            time.sleep(ADB_BACKOFF_MIN)
+
+    def _update(self, table, synced=True):
+        devices = {}
+        for line in table.splitlines():
+            serial, _, state = line.partition("\t")
+            if serial:
+                devices[serial] = state.strip()
+
+        with self.cond:
+            changed = sorted(s for s in set(devices) | set(self.devices)
+                             if devices.get(s) != self.devices.get(s))
+            for serial in changed:
+                # A transport that just dropped is retried right away
+                if serial in self.wanted and self.online(serial):
+                    self.wanted[serial] = [0, ADB_BACKOFF_MIN]
+            self.devices = devices
+            self.synced = synced
+            self.cond.notify_all()
+
+        for serial in changed:
+            log(":: [ADB] %s: %s", serial, devices.get(serial, 'gone'), serial=serial)
+        if changed:
+            for callback in self.listeners:
+                callback()
+
+    def _connector(self):
+        while running:
+            with self.cond:
+                now = time.time()
+                pending = {s: at for s, (at, _) in self.wanted.items() if not self.online(s)}
+                due = [s for s, at in pending.items() if at <= now]
+                if not due:
+                    self.cond.wait(min(pending.values(), default=now + 60) - now)
+                    continue
+            for serial in due:
+                self._connect(serial)
+
+    def _connect(self, serial):
+        self.connects += 1
+        try:
+            with adb_request(f"host:connect:{serial}") as sock:
+                reply = read_adb_string(sock).strip()
+        except (OSError, AdbError) as e:
+            reply = str(e)
+        # Also matches "already connected to"; failures say "failed to connect to"
+        ok = "connected to" in reply
+
+        with self.cond:
+            entry = self.wanted.get(serial)
+            if entry is None:
+                return
+            now = time.time()
+            if ok:
+                log(":: [ADB] %s", reply)
+                # Give track-devices a moment to report the transport before retrying
+                entry[:] = [now + ADB_BACKOFF_MIN, ADB_BACKOFF_MIN]
+            else:
+                error(":: [ADB] Connect to %s failed: %s. Retrying in %.0fs.", serial, reply, entry[1], serial=serial, reason=reply)
+                entry[:] = [now + entry[1], min(entry[1] * 2, ADB_BACKOFF_MAX)]
+
+adb = AdbTransport()
+
+# --- PipeWire Graph Cache ---
+
+PW_NODE = "PipeWire:Interface:Node"
+PW_PORT = "PipeWire:Interface:Port"
+PW_LINK = "PipeWire:Interface:Link"
+PW_METADATA = "PipeWire:Interface:Metadata"
+
+class GraphState:
+    """
+    In-memory mirror of the PipeWire graph.
+    Fed by a single long-lived `pw-dump --monitor` so lookups never fork.
+    Ports are keyed the way pw-link names them ("node.name:port.name"),
+    and additionally by owning process ("node.name@pid:port.name") so that
+    identically named clients (one scrcpy per phone) can be told apart.
+    """
+
+    def __init__(self):
+        self.objects = {}   # id -> pw-dump object
+        self.nodes = {}     # node.name -> id
+        self.ports = {}     # "node:port" / port.alias -> id
+        self.links = {}     # (output port id, input port id) -> link id
+        self.synced = False
+        self.generation = 0
+        self.cond = threading.Condition()
+        self.process = None
+        self.listeners = []
+
+    def start(self):
+        threading.Thread(target=self._monitor, daemon=True).start()
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+
+    def _monitor(self):
+        while running:
+            count_fork("pw-dump")
+            try:
+                self.process = subprocess.Popen(["pw-dump", "--monitor"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            except Exception as e:
+                error(":: [Graph] Failed to start pw-dump monitor: %s", e, reason=e)
+                time.sleep(5)
+                continue
+
+            log(":: [Graph] Monitoring PipeWire graph...")
+            decoder = json.JSONDecoder()
+            utf8 = codecs.getincrementaldecoder("utf-8")()
+            fd = self.process.stdout.fileno()
+            buf = ""
+            while True:
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    break
+                buf += utf8.decode(chunk)
+                # pw-dump emits one JSON array per batch of changes
+                while True:
+                    buf = buf.lstrip()
+                    if not buf:
+                        break
+                    try:
+                        batch, end = decoder.raw_decode(buf)
+                    except ValueError:
+                        break  # Incomplete batch, wait for more data
+                    buf = buf[end:]
+                    self._apply(batch)
+
+            self.process.wait()
+            with self.cond:
+                self.objects.clear()
+                self._reindex()
+                self.synced = False
+            if running:
+                error(":: [Graph] pw-dump monitor exited. Restarting...")
+                time.sleep(1)
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def _apply(self, batch):
+        with self.cond:
+            old_topology = (self.ports, self.links)
+            for obj in batch:
+                oid = obj.get("id")
+                if oid is None:
+                    continue
+                if "type" not in obj and obj.get("info", 0) is None:
+                    self.objects.pop(oid, None)
+                    continue
+                old = self.objects.get(oid)
+                if old and old.get("info") and obj.get("info"):
+                    # Updates may carry only the changed parts of info
+                    merged = dict(old["info"])
+                    merged.update(obj["info"])
+                    obj = dict(obj, info=merged)
+                if old and "metadata" in old and "metadata" in obj:
+                    entries = {(m.get("subject"), m.get("key")): m for m in old["metadata"]}
+                    entries.update({(m.get("subject"), m.get("key")): m for m in obj["metadata"]})
+                    obj = dict(obj, metadata=[m for m in entries.values() if m.get("value") is not None])
+                self.objects[oid] = obj
+            self._reindex()
+            self.synced = True
+            self.generation += 1
+            self.cond.notify_all()
+            changed = (self.ports, self.links) != old_topology
+
+        # Only topology changes matter to listeners, not property updates
+        if changed:
+            for callback in self.listeners:
+                callback()
+
+    def _reindex(self):
+        nodes, ports, links = {}, {}, {}
+        node_names, node_pids = {}, {}
+        for oid, obj in self.objects.items():
+            if obj.get("type") == PW_NODE:
+                props = obj.get("info", {}).get("props", {})
+                name = props.get("node.name")
+                if name:
+                    nodes.setdefault(name, oid)
+                    node_names[oid] = name
+                    if props.get("application.process.id"):
+                        node_pids[oid] = props["application.process.id"]
+        for oid, obj in self.objects.items():
+            otype = obj.get("type")
+            info = obj.get("info") or {}
+            if otype == PW_PORT:
+                props = info.get("props", {})
+                node_name = node_names.get(props.get("node.id"))
+                port_name = props.get("port.name")
+                if node_name and port_name:
+                    ports[f"{node_name}:{port_name}"] = oid
+                    pid = node_pids.get(props.get("node.id"))
+                    if pid:
+                        ports[f"{node_name}@{pid}:{port_name}"] = oid
+                if props.get("port.alias"):
+                    ports.setdefault(props["port.alias"], oid)
+            elif otype == PW_LINK:
+                links[(info.get("output-port-id"), info.get("input-port-id"))] = oid
+        self.nodes, self.ports, self.links = nodes, ports, links
+
+    # --- Queries (lock-free reads of the current snapshot) ---
+
+    def node_id(self, node_name):
+        oid = self.nodes.get(node_name)
+        return str(oid) if oid is not None else None
+
+    def port_id(self, port_spec):
+        return self.ports.get(port_spec)
+
+    def has_link(self, out_spec, in_spec):
+        out_id, in_id = self.ports.get(out_spec), self.ports.get(in_spec)
+        return out_id is not None and in_id is not None and (out_id, in_id) in self.links
+
+    def clock_settings(self):
+        """Returns (quantum, rate) of the graph clock from the settings metadata."""
+        values = {}
+        for obj in list(self.objects.values()):
+            if obj.get("type") == PW_METADATA and obj.get("props", {}).get("metadata.name") == "settings":
+                values = {m.get("key"): m.get("value") for m in obj.get("metadata", []) if m.get("subject") == 0}
+                break
+        quantum = values.get("clock.force-quantum") or values.get("clock.quantum") or 1024
+        rate = values.get("clock.force-rate") or values.get("clock.rate") or 48000
+        return int(quantum), int(rate)
+
+    def wait_synced(self, timeout):
+        with self.cond:
+            return self.cond.wait_for(lambda: self.synced, timeout)
+
+    def wait_nodes(self, names, timeout):
+        """Blocks until every named node is in the graph. Returns False on timeout."""
+        with self.cond:
+            return self.cond.wait_for(lambda: all(name in self.nodes for name in names), timeout)
+
+graph = GraphState()
+
+# --- Process Supervisor ---
+
+BACKOFF_MIN = 0.5
+BACKOFF_MAX = 30.0
+STABLE_UPTIME = 10.0
+FAST_RETRY_SEC = 0.25  # Expected early exits (camera still held by the previous instance)
+
+class Child:
+    def __init__(self, name, min_backoff):
+        self.name = name
+        self.proc = None
+        self.pidfd = None
+        self.alive = False
+        self.stopping = False
+        self.started_at = 0
+        self.ready_check = None
+        self.ready_pattern = None
+        self.ready = False
+        self.ready_at = 0
+        self.fast_retries = 0
+        self.min_backoff = min_backoff
+        self.backoff = min_backoff
+        self.next_start = 0
+        self.restarts = 0
+        self.stderr_tail = collections.deque(maxlen=20)
+        self.logged_stderr = None
+
+class Supervisor:
+    """
+    Owns every process the daemon spawns.
+    Exits are detected through pidfds in a single reaper thread, so
+    liveness checks are a flag lookup and never fork pgrep.
+    """
+
+    def __init__(self):
+        self.children = {}
+        self.lock = threading.Lock()
+        # epoll registrations take effect even while the reaper is blocked
+        self.poller = select.epoll()
+        self.by_fd = {}
+
+    def start_reaper(self):
+        threading.Thread(target=self._reap, daemon=True).start()
+
+    def spawn(self, name, argv, ready=None, min_backoff=BACKOFF_MIN, capture_stderr=False,
+              ready_pattern=None, fast_retries=None, **popen_args):
+        """
+        Starts (or restarts) the named child. Returns the Popen or None.
+        ready_pattern: the child is ready once this appears in its output
+        (stdout and stderr are merged and drained). fast_retries: this many
+        exits before readiness are retried after FAST_RETRY_SEC without
+        counting as crashes.
+        """
+        with self.lock:
+            child = self.children.get(name) or Child(name, min_backoff)
+            self.children[name] = child
+        if child.alive:
+            return child.proc
+        if fast_retries is not None:
+            child.fast_retries = fast_retries
+
+        stderr = subprocess.PIPE if capture_stderr else subprocess.DEVNULL
+        if ready_pattern:
+            stderr = subprocess.STDOUT
+            popen_args["stdout"] = subprocess.PIPE
+        popen_args.setdefault("stdout", subprocess.DEVNULL)
+        count_fork(argv[0])
+        try:
+            with span(f"spawn_{os.path.basename(argv[0])}"):
+                proc = subprocess.Popen(argv, stderr=stderr, **popen_args)
+        except Exception as e:
+            error(":: [Supervisor] Failed to spawn %s: %s", name, e, child=name, reason=e)
+            child.next_start = time.time() + child.backoff
+            return None
+
+        child.proc = proc
+        child.alive = True
+        child.stopping = False
+        child.ready = False
+        child.ready_check = ready
+        child.ready_pattern = ready_pattern
+        child.started_at = time.time()
+        child.stderr_tail.clear()
+        if capture_stderr or ready_pattern:
+            threading.Thread(target=self._drain, args=(child, proc), daemon=True).start()
+
+        try:
+            pidfd = os.pidfd_open(proc.pid)
+        except (AttributeError, OSError):
+            # Kernel < 5.3: fall back to a waiter thread for this child
+            threading.Thread(target=lambda: (proc.wait(), self._exited(child, proc)), daemon=True).start()
         else:
-            error(f":: [Daemon] ADB Connect Failed: {res.stdout.strip()}")
-            return False
-    except Exception as e:
-        error(f":: [Daemon] ADB Error: {e}")
-        return False
+            child.pidfd = pidfd
+            with self.lock:
+                self.by_fd[pidfd] = (child, proc)
+            self.poller.register(pidfd, select.EPOLLIN)
+        return proc
 
-def spawn_loopback_sink(node_name, description, target_node):
-    global virtual_sinks
+    def stop(self, name, timeout=2):
+        child = self.children.get(name)
+        if not child or not child.alive:
+            return
+        child.stopping = True
+        proc = child.proc
+        proc.terminate()
+        try:
+            proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+        # Don't wait for the reaper: a spawn() right after must start a new process
+        with self.lock:
+            if child.proc is proc:
+                child.alive = False
 
-    client_name = f"zbridge_loopback_{node_name}"
+    def rename(self, old, new):
+        """Moves a child to another name (a warmed-up standby taking over)."""
+        with self.lock:
+            child = self.children.pop(old)
+            child.name = new
+            self.children[new] = child
+
+    def stop_all(self):
+        for name in list(self.children):
+            self.stop(name, timeout=1)
+
+    # --- O(1) queries ---
+
+    def alive(self, name):
+        child = self.children.get(name)
+        return bool(child and child.alive)
+
+    def proc(self, name):
+        child = self.children.get(name)
+        return child.proc if child and child.alive else None
+
+    def ready(self, name):
+        child = self.children.get(name)
+        return bool(child and child.alive and child.ready)
 
-    if node_name in virtual_sinks:
-        proc = virtual_sinks[node_name]
-        if proc.poll() is None:
-            return 
+    def ready_ms(self, name):
+        """Time from spawn to readiness of the current instance."""
+        child = self.children.get(name)
+        if not child or not child.ready:
+            return None
+        return round((child.ready_at - child.started_at) * 1000)
+
+    def can_start(self, name):
+        child = self.children.get(name)
+        return not child or child.alive or time.time() >= child.next_start
+
+    def next_restart(self, names=None):
+        """Earliest pending restart deadline among crashed children (optionally only `names`)."""
+        now = time.time()
+        deadlines = [c.next_start for c in list(self.children.values())
+                     if (names is None or c.name in names)
+                     and not c.alive and not c.stopping and c.next_start > now]
+        return min(deadlines, default=now + 3600)
+
+    def check_ready(self):
+        """Evaluates pending readiness checks and logs time-to-ready."""
+        for child in list(self.children.values()):
+            if child.alive and not child.ready and child.ready_check:
+                if child.ready_check():
+                    child.ready = True
+                    child.ready_at = time.time()
+                    log(":: [Supervisor] %s ready after %.0f ms", child.name, (time.time() - child.started_at) * 1000, child=child.name)
+
+    # --- Reaper ---
+
+    def _drain(self, child, proc):
+        for line in proc.stderr or proc.stdout:
+            if isinstance(line, bytes):
+                line = line.decode(errors="replace")
+            child.stderr_tail.append(line.rstrip())
+            if child.ready_pattern and not child.ready and child.proc is proc and child.ready_pattern in line:
+                child.ready = True
+                child.ready_at = time.time()
+                child.fast_retries = 0
+                log(":: [Supervisor] %s ready after %.0f ms", child.name, (child.ready_at - child.started_at) * 1000, child=child.name)
+                post_child_event("child_ready", child.name)
+
+    def _reap(self):
+        while True:
+            for fd, _ in self.poller.poll():
+                with self.lock:
+                    child, proc = self.by_fd.pop(fd)
+                self.poller.unregister(fd)
+                os.close(fd)
+                proc.wait()
+                self._exited(child, proc)
+
+    def _exited(self, child, proc):
+        if child.proc is not proc:
+            return
+        child.alive = False
+        child.pidfd = None
+        rc = proc.returncode
+        uptime = time.time() - child.started_at
+        if rc is not None and rc < 0:
+            try: reason = f"killed by {signal.Signals(-rc).name}"
+            except ValueError: reason = f"killed by signal {-rc}"
         else:
-            log(f":: [Daemon] Virtual Sink {node_name} died unexpectedly. Respawning...")
-            del virtual_sinks[node_name]
+            reason = f"exit code {rc}"
 
-    if subprocess.run(["pgrep", "-f", f"pw-loopback.*--name {client_name}"], stdout=subprocess.DEVNULL).returncode == 0:
-        subprocess.run(["pkill", "-f", f"pw-loopback.*--name {client_name}"])
-        time.sleep(0.2)
+        if child.stopping or not running:
+            log(":: [Supervisor] %s stopped (%s)", child.name, reason, child=child.name, reason=reason)
+            child.backoff = child.min_backoff
+            child.next_start = 0
+        elif child.fast_retries and not child.ready:
+            child.fast_retries -= 1
+            child.next_start = time.time() + FAST_RETRY_SEC
+            log(":: [Supervisor] %s not ready yet (%s). Retrying in %ss", child.name, reason, FAST_RETRY_SEC,
+                child=child.name, reason=reason)
+        else:
+            # Crash loops back off exponentially, stable runs reset the delay
+            if uptime > STABLE_UPTIME:
+                child.backoff = child.min_backoff
+            child.restarts += 1
+            child.next_start = time.time() + child.backoff
+            error(":: [Supervisor] %s exited after %.1fs (%s). Restart in %.1fs", child.name, uptime, reason, child.backoff,
+                  child=child.name, reason=reason, uptime_s=uptime, backoff_s=child.backoff)
+            # A crash loop prints the same stderr every time: only log it when it changes
+            tail = " | ".join(child.stderr_tail)
+            if tail and tail != child.logged_stderr:
+                error(":: [Supervisor] %s stderr: %s", child.name, tail, child=child.name)
+                child.logged_stderr = tail
+            child.backoff = min(child.backoff * 2, BACKOFF_MAX)
+        post_child_event("child_exit", child.name)
+
+supervisor = Supervisor()
+
+def spawn_loopback_sink(node_name, description, target_node):
+    client_name = f"zbridge_loopback_{node_name}"
+
+    if supervisor.alive(client_name) or not supervisor.can_start(client_name):
+        return
 
-    log(f":: [Daemon] Spawning Virtual Sink: {node_name} -> {target_node}")
+    log(":: [Daemon] Spawning Virtual Sink: %s -> %s", node_name, target_node, child=client_name)
     
     capture_props = {
         "media.class": "Audio/Sink",
@@ -209,310 +1051,2083 @@ def spawn_loopback_sink(node_name, description, target_node):
         "--playback-props", json.dumps(playback_props)
     ]
     
-    virtual_sinks[node_name] = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    supervisor.spawn(client_name, cmd, ready=lambda: graph.node_id(node_name) is not None)
 
-def setup_audio_graph():
-    # 1. Create Internal VOID nodes
-    void_nodes = ["zbout_void", "zbin_void", "zmic"]
-    void_descs = ["ZBridge_Out_Internal", "ZBridge_In_Internal", "ZeroBridge_Microphone"]
-    void_types = ["Audio/Sink", "Audio/Sink", "Audio/Source/Virtual"]
-    
-    for i, node in enumerate(void_nodes):
-        if not get_node_id(node):
-            cmd = [
-                "pw-cli", "create-node", "adapter",
-                "factory.name=support.null-audio-sink",
-                f"node.name={node}",
-                f"media.class={void_types[i]}",
-                f"node.description={void_descs[i]}",
-                "object.linger=true"
-            ]
-            run_command(cmd)
-    
-    time.sleep(0.5)
+# --- GStreamer Pipelines ---
 
-    # 2. Spawn Loopback Sinks
-    spawn_loopback_sink("zbout", "ZeroBridge_To_Phone", "zbout_void")
-    spawn_loopback_sink("zbin", "ZeroBridge_Phone_Mic", "zbin_void")
+RTP_PORT = 5000
+WARM_KEEP_SEC = 30
+PIPELINE_RETRY_SEC = 1.0
+
+# Opus encoder settings a fresh sender starts with (tuned live per device)
+OPUS_DEFAULTS = {"bitrate": 96000, "frame-size": 10, "packet-loss-percentage": 10}
 
-    # 3. Enforce Routing (Reverted to Safe pw-link Logic)
+Gst = None
+GLib = None
+
+def init_gst():
+    """Loads the GStreamer bindings for --inprocess-gst. Returns False if unavailable."""
+    global Gst, GLib
     try:
-        # A. Link zbin_void -> zmic (Restored)
-        run_command(["pw-link", "zbin_void:monitor_FL", "zmic:input_FL"])
-        run_command(["pw-link", "zbin_void:monitor_FR", "zmic:input_FR"])
-
-        # B. Route Scrcpy/SDL to zbin
-        sources = ["SDL Application", "scrcpy"]
-        for src in sources:
-            run_command(["pw-link", f"{src}:output_FL", "zbin:playback_FL"])
-            run_command(["pw-link", f"{src}:output_FR", "zbin:playback_FR"])
-            
-            # Anti-Feedback
-            run_command(["pw-link", "-d", f"{src}:output_FL", "zbout:playback_FL"])
-            run_command(["pw-link", "-d", f"{src}:output_FR", "zbout:playback_FR"])
-
-        # C. Loopback Cleanups
-        run_command(["pw-link", "-d", "output.ZBridge_Monitor:output_FL", "zbout:playback_FL"])
-        run_command(["pw-link", "-d", "output.ZBridge_Monitor:output_FR", "zbout:playback_FR"])
-        
-        # Anti-Feedback for Desktop Capture
-        run_command(["pw-link", "-d", "zmic:capture_FL", "input.ZBridge_Desktop:input_FL"])
-        run_command(["pw-link", "-d", "zmic:capture_FR", "input.ZBridge_Desktop:input_FR"])
-    except:
-        pass
+        import gi
+        gi.require_version("Gst", "1.0")
+        from gi.repository import GLib as _GLib, Gst as _Gst
+        _Gst.init(None)
+    except (ImportError, ValueError) as e:
+        error(":: [Gst] PyGObject/GStreamer bindings unavailable (%s). Using gst-launch-1.0.", e, reason=e)
+        return False
+    Gst, GLib = _Gst, _GLib
+    return True
 
-def manage_loopback(name, active, source=None, sink=None):
-    is_running = subprocess.run(["pgrep", "-f", f"pw-loopback.*--name {name}"], stdout=subprocess.DEVNULL).returncode == 0
-    if active == "on" and not is_running:
-        log(f"Enabling Loopback: {name}")
-        cmd = ["pw-loopback", "--name", name]
-        if source and source != "0": cmd.append(f"--capture-props={{ \"node.target\": \"{source}\" }}")
-        if sink and sink != "0": cmd.append(f"--playback-props={{ \"node.target\": \"{sink}\" }}")
-        subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    elif active != "on" and is_running:
-        log(f"Disabling Loopback: {name}")
-        run_command(["pkill", "-f", f"pw-loopback.*--name {name}"])
+def sender_pipeline(node_id, host, gain, opus_settings):
+    return [
+        "pipewiresrc", f"path={node_id}", "do-timestamp=true", "!",
+        "audioconvert", "!",
+        "volume", "name=vol", f"volume={gain}", "!",
+        "opusenc", "name=enc", f"bitrate={opus_settings['bitrate']}", "audio-type=voice",
+        f"frame-size={opus_settings['frame-size']}", "inband-fec=true",
+        f"packet-loss-percentage={opus_settings['packet-loss-percentage']}", "!",
+        "rtpopuspay", "!",
+        "udpsink", "name=sink", f"host={host}", f"port={RTP_PORT}", "sync=false", "async=false"
+    ]
 
-def handle_reload(signum, frame):
-    log(":: [Daemon] Reload signal (SIGUSR1). Parsing config... ::")
-    if os.path.exists(CONFIG_PID_FILE):
-        try:
-            with open(CONFIG_PID_FILE, 'r') as f:
-                pid = int(f.read().strip())
-            os.kill(pid, signal.SIGUSR2)
-        except Exception as e:
-            error(f"Failed to ACK zb-config: {e}")
-        finally:
-            try: os.remove(CONFIG_PID_FILE)
-            except: pass
+def direct_mic_pipeline(input_node, node, description, gain):
+    """scrcpy's audio in, gain, and zmic out, all as streams of one client."""
+    return [
+        "pipewiresrc", "autoconnect=false", "do-timestamp=true",
+        f"stream-properties=props,node.name={input_node},node.description={description}_Input,media.class=Stream/Input/Audio", "!",
+        "audio/x-raw,channels=2", "!",
+        "audioconvert", "!",
+        "volume", "name=vol", f"volume={gain}", "!",
+        "pipewiresink", "name=sink", "mode=provide", "sync=false",
+        f"stream-properties=props,node.name={node},node.description={description},media.class=Audio/Source/Virtual"
+    ]
 
-# --- Threads ---
+def placeholder_pipeline(video_device):
+    icon_path = get_camera_icon_path()
+    desc = ["videotestsrc", "pattern=black", "!", "video/x-raw,width=1920,height=1080,framerate=30/1"]
+    if icon_path:
+        desc += ["!", "gdkpixbufoverlay", f"location={icon_path}", "overlay-height=300", "overlay-width=300"]
+    else:
+        desc += ["!", "textoverlay", "text=CAMERA DISABLED", "valignment=center", "halignment=center", "font-desc=Sans 40"]
+    desc += ["!", "v4l2sink", f"device={video_device}"]
+    return desc
 
-def network_listener():
-    global current_state, last_heartbeat, phone_ip, session_id
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 262144)
-    sock.bind(('0.0.0.0', UDP_PORT_LISTEN))
-    sock.settimeout(1.0)
-    
-    log(f"Listening on UDP {UDP_PORT_LISTEN}...")
-    
-    while running:
+def launch_string(tokens):
+    """Joins gst-launch argv tokens into a parse_launch description."""
+    parts = []
+    for token in tokens:
+        if " " in token and "=" in token:
+            key, value = token.split("=", 1)
+            token = f'{key}="{value}"'
+        parts.append(token)
+    return " ".join(parts)
+
+class GstPipeline:
+    """
+    A pipeline running inside the daemon. Errors and EOS are reported as
+    child_exit events, same as a crashed gst-launch process.
+    """
+
+    def __init__(self, name, description):
+        self.name = name
+        self.alive = False
+        self.died_at = 0
         try:
-            data, addr = sock.recvfrom(1024)
-            msg = data.decode('utf-8').strip()
-            if "READY" in msg:
-                with lock:
-                    last_heartbeat = time.time()
-                    if current_state != "CONNECTED":
-                        log(f"Handshake received from {addr[0]}. Connected.")
-                        current_state = "CONNECTED"
-                        with open(READY_FLAG, 'w') as f: f.write("1")
-                    
-                    ack_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-                    ack_msg = f"ACK:{session_id}"
-                    ack_sock.sendto(ack_msg.encode('utf-8'), (addr[0], UDP_PORT_SEND))
-        except socket.timeout: pass
-        except Exception as e:
-            error(f"Listener Error: {e}")
-            time.sleep(1)
+            self.pipeline = Gst.parse_launch(launch_string(description))
+        except GLib.Error as e:
+            # e.g. a missing plugin: fails like a crashed gst-launch, retried after PIPELINE_RETRY_SEC
+            error(":: [Gst] %s: cannot build pipeline: %s", self.name, e.message, child=self.name, reason=e.message)
+            self.pipeline = None
 
-def connection_manager():
-    global current_state, gst_process, scrcpy_process, placeholder_process, phone_ip, last_heartbeat 
-    global current_scrcpy_cmd, scrcpy_last_crash
-    global current_mic_gain, current_audio_gain
-    
-    start_time = time.time()
-    startup_notified = False
+    def start(self):
+        if self.pipeline is None:
+            self.died_at = time.time()
+            return False
+        if self.pipeline.set_state(Gst.State.PLAYING) == Gst.StateChangeReturn.FAILURE:
+            error(":: [Gst] %s failed to start", self.name, child=self.name)
+            self.pipeline.set_state(Gst.State.NULL)
+            self.died_at = time.time()
+            return False
+        self.alive = True
+        threading.Thread(target=self._watch, daemon=True).start()
+        return True
 
-    while running:
-        setup_audio_graph()
-        cfg = read_config()
-        
-        new_ip = cfg.get("PHONE_IP", "")
-        monitor = cfg.get("MONITOR", "off")
-        desktop = cfg.get("DESKTOP", "off")
-        cam_facing = cfg.get("CAM_FACING", "back")
-        cam_orient = cfg.get("CAM_ORIENT", "")
-        def_front = cfg.get("DEF_ORIENT_FRONT", "flip90")
-        def_back = cfg.get("DEF_ORIENT_BACK", "flip270")
-        
-        # Gain Updates
-        new_mic_gain = cfg.get("MIC_GAIN", "1.0")
-        new_audio_gain = cfg.get("AUDIO_GAIN", "1.0")
-        
-        # Apply Mic Gain via Pactl (Does not require graph restart)
-        if new_mic_gain != current_mic_gain:
-            log(f":: [Daemon] Mic Gain changing: {current_mic_gain} -> {new_mic_gain}")
-            current_mic_gain = new_mic_gain
-            set_pactl_volume("zbin_void", current_mic_gain)
-
-        # Apply Audio Gain (Requires Stream Restart)
-        if new_audio_gain != current_audio_gain:
-            log(f":: [Daemon] Audio Out Gain changing: {current_audio_gain} -> {new_audio_gain}")
-            current_audio_gain = new_audio_gain
-            if gst_process: 
-                gst_process.terminate()
-                gst_process = None
-
-        if new_ip != phone_ip:
-            log(f"Target IP Changed: {new_ip}")
-            phone_ip = new_ip
-            current_state = "DISCONNECTED"
-            if gst_process: gst_process.terminate(); gst_process = None
-            if scrcpy_process: scrcpy_process.terminate(); scrcpy_process = None
-            if placeholder_process: placeholder_process.terminate(); placeholder_process = None
-            if os.path.exists(READY_FLAG): os.remove(READY_FLAG)
-
-        manage_loopback("ZBridge_Monitor", monitor, "zmic", "0")
-        manage_loopback("ZBridge_Desktop", desktop, "0", "zbout")
-
-        target_ip_clean = phone_ip.split(':')[0]
-        if not target_ip_clean or target_ip_clean == "127.0.0.1":
-            time.sleep(1)
-            continue
+    def _watch(self):
+        bus = self.pipeline.get_bus()
+        mask = Gst.MessageType.ERROR | Gst.MessageType.EOS | Gst.MessageType.APPLICATION
+        msg = bus.timed_pop_filtered(Gst.CLOCK_TIME_NONE, mask)
+        if msg is None or msg.type == Gst.MessageType.APPLICATION:
+            return  # Stopped on purpose
+        if msg.type == Gst.MessageType.ERROR:
+            err, _ = msg.parse_error()
+            error(":: [Gst] %s error: %s", self.name, err.message, child=self.name, reason=err.message)
+        else:
+            error(":: [Gst] %s reached EOS", self.name, child=self.name, reason="eos")
+        self.alive = False
+        self.died_at = time.time()
+        self.pipeline.set_state(Gst.State.NULL)
+        post_child_event("child_exit", self.name)
 
-        if current_state == "CONNECTED" and (time.time() - last_heartbeat > 10):
-            log("Heartbeat timed out.")
-            current_state = "DISCONNECTED"
-            if os.path.exists(READY_FLAG): os.remove(READY_FLAG)
-            if gst_process: gst_process.terminate(); gst_process = None
-            if scrcpy_process: scrcpy_process.terminate(); scrcpy_process = None
-            if placeholder_process: placeholder_process.terminate(); placeholder_process = None
-
-        if current_state == "DISCONNECTED":
-            if args.debug_notify and not startup_notified and (time.time() - start_time > 5.0):
-                send_notification("ZeroBridge", "No response from phone. Run sv restart zreceiver in termux.")
-                startup_notified = True
-            
-            my_ip = get_local_ip_for_target(target_ip_clean)
-            if my_ip:
-                try:
-                    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-                    sock.sendto(f"SYNC:{my_ip}".encode('utf-8'), (target_ip_clean, UDP_PORT_SEND))
-                except: pass
-            time.sleep(1)
+    def set(self, element, prop, value):
+        self.pipeline.get_by_name(element).set_property(prop, value)
 
-        elif current_state == "CONNECTED":
-            startup_notified = True 
-            
-            # --- AUDIO STREAM (PC -> Phone) ---
-            if desktop == "on":
-                if gst_process is None or gst_process.poll() is not None:
-                    zbout_void_id = get_node_id("zbout_void")
-                    if zbout_void_id:
-                        log(f"Starting Stream -> {target_ip_clean}:5000 (Gain: {current_audio_gain})")
-                        cmd = [
-                            "gst-launch-1.0", "-q", 
-                            "pipewiresrc", f"path={zbout_void_id}", "do-timestamp=true", "!",
-                            "audioconvert", "!",
-                            "volume", f"volume={current_audio_gain}", "!",
-                            "opusenc", "bitrate=96000", "audio-type=voice", "frame-size=10",
-                            "inband-fec=true", "packet-loss-percentage=10", "!",
-                            "rtpopuspay", "!",
-                            "udpsink", f"host={target_ip_clean}", "port=5000", "sync=false", "async=false"
-                        ]
-                        gst_process = subprocess.Popen(cmd)
-            elif desktop == "off":
-                if gst_process:
-                    log(":: [Daemon] Stopping Audio Stream (Desktop disabled)...")
-                    gst_process.terminate()
-                    gst_process = None
-            
-            # --- VIDEO / PLACEHOLDER LOGIC ---
-            target_cmd = ["scrcpy", "--serial", phone_ip, "--no-window"]
-            
-            if monitor == "on":
-                target_cmd += ["--audio-source=mic", "--audio-codec=opus", "--audio-bit-rate=128K"]
-            else:
-                target_cmd += ["--no-audio"]
-            
-            if cam_facing == "none":
-                target_cmd += ["--no-video"]
-            else:
-                target_cmd.append("--camera-fps=30")
-                safe_cam = cam_facing if cam_facing in ["front", "back"] else "back"
-                final_orient = cam_orient if cam_orient else (def_front if safe_cam == "front" else def_back)
-                target_cmd += ["--video-source=camera", f"--camera-facing={safe_cam}", f"--capture-orientation={final_orient}"]
-                if os.path.exists("/dev/video9"):
-                    target_cmd += ["--v4l2-sink=/dev/video9"]
-            
-            if scrcpy_process and current_scrcpy_cmd and target_cmd != current_scrcpy_cmd:
-                log(":: [Daemon] Scrcpy config changed. Hot-swapping...")
-                scrcpy_process.terminate()
-                try: scrcpy_process.wait(timeout=2)
-                except: scrcpy_process.kill()
-                scrcpy_process = None
-                log(":: [Daemon] Safety Pause (1.0s) for Camera HAL...")
-                time.sleep(1.0) 
-
-            use_placeholder = (cam_facing == "none" and os.path.exists("/dev/video9"))
-            if use_placeholder:
-                if not placeholder_process or placeholder_process.poll() is not None:
-                    log(":: [Daemon] Starting Placeholder Stream...")
-                    icon_path = get_camera_icon_path()
-                    gst_cmd = ["gst-launch-1.0", "videotestsrc", "pattern=black", "!", "video/x-raw,width=1920,height=1080,framerate=30/1"]
-                    if icon_path:
-                        gst_cmd += ["!", "gdkpixbufoverlay", f"location={icon_path}", "overlay-height=300", "overlay-width=300"]
-                    else:
-                        gst_cmd += ["!", "textoverlay", "text=CAMERA DISABLED", "valignment=center", "halignment=center", "font-desc=Sans 40"]
-                    gst_cmd += ["!", "v4l2sink", "device=/dev/video9"]
-                    placeholder_process = subprocess.Popen(gst_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            else:
-                if placeholder_process:
-                    placeholder_process.terminate()
-                    try: placeholder_process.wait(timeout=1)
-                    except: placeholder_process.kill()
-                    placeholder_process = None
-
-            if scrcpy_process and scrcpy_process.poll() is not None:
-                scrcpy_last_crash = time.time()
-                _, err = scrcpy_process.communicate()
-                error(f"Scrcpy CRASHED. Stderr: {err}")
-                scrcpy_process = None
-
-            if scrcpy_process is None or scrcpy_process.poll() is not None:
-                if time.time() - scrcpy_last_crash < 3.0:
-                    pass 
-                else:
-                    if ensure_adb_connection(phone_ip):
-                        log(f"Starting Scrcpy ({cam_facing})...")
-                        env = os.environ.copy()
-                        scrcpy_process = subprocess.Popen(target_cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
-                        current_scrcpy_cmd = target_cmd
-            
-            # Initial Gain Set for fresh loops
-            if current_state == "CONNECTED" and time.time() % 5 < 0.6:
-                set_pactl_volume("zbin_void", current_mic_gain)
-
-        time.sleep(0.5)
+    def pause(self):
+        self.pipeline.set_state(Gst.State.PAUSED)
 
-def cleanup_handler(signum, frame):
-    global running
-    log("Shutting down...")
-    running = False
-    if gst_process: gst_process.terminate()
-    if scrcpy_process: scrcpy_process.terminate()
-    if placeholder_process: placeholder_process.terminate()
-    if os.path.exists(READY_FLAG): os.remove(READY_FLAG)
-    subprocess.run(["pkill", "-f", "pw-loopback.*--name ZBridge_"])
-    for name, proc in virtual_sinks.items():
-        if proc.poll() is None: proc.terminate()
-    subprocess.run(["pkill", "-f", "pw-loopback.*zbridge_loopback_"])
-    sys.exit(0)
+    def play(self):
+        self.pipeline.set_state(Gst.State.PLAYING)
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="ZeroBridge Daemon")
-    parser.add_argument("-d", "--debug-notify", action="store_true", help="Send desktop notification if no handshake in 5s")
-    args = parser.parse_args()
+    def stop(self):
+        if not self.alive:
+            return
+        self.alive = False
+        self.pipeline.get_bus().post(Gst.Message.new_application(None, Gst.Structure.new_empty("zbridge-stop")))
+        self.pipeline.set_state(Gst.State.NULL)
 
-    signal.signal(signal.SIGINT, cleanup_handler)
-    signal.signal(signal.SIGTERM, cleanup_handler)
-    signal.signal(signal.SIGUSR1, handle_reload)
-    
-    if not os.path.exists(CONFIG_DIR): os.makedirs(CONFIG_DIR)
-    
+class AudioSender:
+    """
+    PC -> phone Opus stream. Runs in-process when the Gst bindings are
+    available (gain and encoder settings change live, the pipeline stays
+    warm across short disconnects) and falls back to gst-launch-1.0.
+    """
+
+    def __init__(self, name="gst", inprocess=False):
+        self.name = name
+        self.inprocess = inprocess
+        self.pipeline = None
+        self.host = None
+        self.suspended_at = None
+        self.starts = 0
+        self.restart_times = collections.deque()
+        self.opus = dict(OPUS_DEFAULTS)
+
+    def alive(self):
+        if self.inprocess:
+            return bool(self.pipeline and self.pipeline.alive) and self.suspended_at is None
+        return supervisor.alive(self.name)
+
+    def suspended(self):
+        return self.suspended_at is not None and bool(self.pipeline and self.pipeline.alive)
+
+    def can_start(self):
+        if self.inprocess:
+            return not self.pipeline or time.time() >= self.pipeline.died_at + PIPELINE_RETRY_SEC
+        return supervisor.can_start(self.name)
+
+    def restarts_per_hour(self):
+        cutoff = time.time() - 3600
+        while self.restart_times and self.restart_times[0] < cutoff:
+            self.restart_times.popleft()
+        return len(self.restart_times)
+
+    def start(self, node_id, host, gain):
+        if self.starts:
+            self.restart_times.append(time.time())
+            log(":: [Gst] %s: sender pipeline restart (%d in the last hour)", self.name, self.restarts_per_hour(), child=self.name)
+        self.starts += 1
+        self.host = host
+        self.suspended_at = None
+        desc = sender_pipeline(node_id, host, gain, self.opus)
+        if self.inprocess:
+            self.pipeline = GstPipeline(self.name, desc)
+            self.pipeline.start()
+        else:
+            supervisor.spawn(self.name, ["gst-launch-1.0", "-q"] + desc, capture_stderr=True)
+
+    def set_gain(self, gain):
+        """Applies gain live. Returns False if the pipeline must be restarted instead."""
+        if self.inprocess and self.pipeline and self.pipeline.alive:
+            self.pipeline.set("vol", "volume", gain)
+            return True
+        return False
+
+    def set_encoder(self, **settings):
+        """Updates opusenc properties (live when in-process). Returns False if a restart is needed."""
+        self.opus.update(settings)
+        if self.inprocess and self.pipeline and self.pipeline.alive:
+            for prop, value in settings.items():
+                self.pipeline.set("enc", prop, value)
+            return True
+        return False
+
+    def suspend(self):
+        """
+        Heartbeat overdue: pause in-process pipelines. A gst-launch sender is
+        left running, as relaunching it on every false suspicion costs more
+        than a few packets sent to a silent phone.
+        """
+        if self.inprocess and self.pipeline and self.pipeline.alive and self.suspended_at is None:
+            self.pipeline.pause()
+            self.suspended_at = time.time()
+
+    def release(self):
+        """Phone gone: keep in-process pipelines warm (see deadline), stop gst-launch."""
+        if self.inprocess and self.pipeline and self.pipeline.alive:
+            self.suspend()
+        else:
+            self.stop()
+
+    def resume(self, host):
+        if not self.suspended():
+            return False
+        if host != self.host:
+            self.pipeline.set("sink", "host", host)
+            self.host = host
+        self.pipeline.play()
+        self.suspended_at = None
+        return True
+
+    def stop(self):
+        if self.inprocess:
+            if self.pipeline:
+                self.pipeline.stop()
+                self.pipeline = None
+        else:
+            supervisor.stop(self.name)
+        self.suspended_at = None
+
+    def deadline(self):
+        """
+        Next time the sender needs attention: a failed in-process pipeline
+        becoming retryable, or a warm pipeline expiring (torn down here).
+        """
+        if self.suspended_at is None:
+            if self.inprocess and self.pipeline and not self.pipeline.alive:
+                return self.pipeline.died_at + PIPELINE_RETRY_SEC
+            return time.time() + 3600
+        if time.time() - self.suspended_at > WARM_KEEP_SEC:
+            log(":: [Gst] Sender idle too long. Releasing pipeline.")
+            self.stop()
+            return time.time() + 3600
+        return self.suspended_at + WARM_KEEP_SEC
+
+class DirectMic:
+    """
+    MIC_MODE=direct: scrcpy's audio is linked straight into this pipeline,
+    which applies the gain and provides zmic itself, replacing the zbin
+    loopback -> zbin_void -> zmic chain and its pactl calls. In-process when
+    the Gst bindings are available (gain changes live), else gst-launch-1.0.
+    Unlike the lingering null source, this zmic only exists while audio
+    flows (pipewiresink connects once caps are known) and not across restarts.
+    """
+
+    def __init__(self, name, input_node, node, description, inprocess=False):
+        self.name = name
+        self.input_node = input_node
+        self.node = node
+        self.description = description
+        self.inprocess = inprocess
+        self.pipeline = None
+
+    def alive(self):
+        if self.inprocess:
+            return bool(self.pipeline and self.pipeline.alive)
+        return supervisor.alive(self.name)
+
+    def can_start(self):
+        if self.inprocess:
+            return not self.pipeline or time.time() >= self.pipeline.died_at + PIPELINE_RETRY_SEC
+        return supervisor.can_start(self.name)
+
+    def deadline(self):
+        """When a failed in-process pipeline may be restarted."""
+        if self.inprocess and self.pipeline and not self.pipeline.alive:
+            return self.pipeline.died_at + PIPELINE_RETRY_SEC
+        return time.time() + 3600
+
+    def start(self, gain):
+        desc = direct_mic_pipeline(self.input_node, self.node, self.description, gain)
+        if self.inprocess:
+            self.pipeline = GstPipeline(self.name, desc)
+            self.pipeline.start()
+        else:
+            supervisor.spawn(self.name, ["gst-launch-1.0", "-q"] + desc, capture_stderr=True,
+                             ready=lambda: graph.node_id(self.input_node) is not None)
+
+    def set_gain(self, gain):
+        """Applies gain live. Returns False if the pipeline must be restarted instead."""
+        if self.inprocess and self.pipeline and self.pipeline.alive:
+            self.pipeline.set("vol", "volume", gain)
+            return True
+        return False
+
+    def latency_ms(self):
+        """Latency the pipeline itself adds (in-process only), on top of the graph's quantum."""
+        if not (self.inprocess and self.pipeline and self.pipeline.alive):
+            return None
+        query = Gst.Query.new_latency()
+        if not self.pipeline.pipeline.query(query):
+            return None
+        _, min_latency, _ = query.parse_latency()
+        return min_latency / Gst.MSECOND
+
+    def stop(self):
+        if self.pipeline:
+            self.pipeline.stop()
+            self.pipeline = None
+        supervisor.stop(self.name)
+
+class PlaceholderStream:
+    """
+    The 'camera disabled' v4l2 stream. Written natively (V4l2Writer) unless
+    the device won't take our ioctls; then in-process or via gst-launch-1.0.
+    """
+
+    def __init__(self, name="placeholder", video_device="/dev/video9", inprocess=False):
+        self.name = name
+        self.video_device = video_device
+        self.inprocess = inprocess
+        self.pipeline = None
+        self.native = True
+        self.writer = None
+        self.retry_at = 0
+
+    def alive(self):
+        if self.native:
+            writer = self.writer
+            return bool(writer and writer.alive())
+        if self.inprocess:
+            return bool(self.pipeline and self.pipeline.alive)
+        return supervisor.alive(self.name)
+
+    def can_start(self):
+        if self.native:
+            return time.time() >= self.retry_at
+        if self.inprocess:
+            return not self.pipeline or time.time() >= self.pipeline.died_at + PIPELINE_RETRY_SEC
+        return supervisor.can_start(self.name)
+
+    def deadline(self):
+        """When a failed native writer or in-process pipeline may try again."""
+        if self.native and self.retry_at > time.time():
+            return self.retry_at
+        if not self.native and self.inprocess and self.pipeline and not self.pipeline.alive:
+            return self.pipeline.died_at + PIPELINE_RETRY_SEC
+        return time.time() + 3600
+
+    def start(self):
+        if self.native:
+            self.writer = V4l2Writer(self.name, self.video_device, self._writer_exited)
+            self.writer.start()
+        elif self.inprocess:
+            self.pipeline = GstPipeline(self.name, placeholder_pipeline(self.video_device))
+            self.pipeline.start()
+        else:
+            supervisor.spawn(self.name, ["gst-launch-1.0"] + placeholder_pipeline(self.video_device))
+
+    def _writer_exited(self, writer):
+        if writer.stopping.is_set() or writer is not self.writer:
+            return
+        if isinstance(writer.error, OSError) and writer.error.errno in (errno.ENOTTY, errno.EINVAL):
+            log(":: [Placeholder] %s can't be written natively. Using GStreamer.", self.video_device, child=self.name)
+            self.writer = None
+            self.native = False
+        else:
+            # e.g. EBUSY while another writer still holds the device
+            self.retry_at = time.time() + PLACEHOLDER_RETRY_SEC
+        post_child_event("child_exit", self.name)
+
+    def stop(self):
+        writer, self.writer = self.writer, None
+        if writer:
+            writer.stop()
+        if self.pipeline:
+            self.pipeline.stop()
+            self.pipeline = None
+        supervisor.stop(self.name, timeout=1)
+
+# Set from --inprocess-gst once the bindings have loaded
+inprocess_gst = False
+
+# --- V4L2 Placeholder ---
+
+# The placeholder frame never changes: render it once, then keep handing
+# the same mmap'd buffers back to v4l2loopback at a trickle.
+PLACEHOLDER_FPS = 5
+PLACEHOLDER_SIZE = (1920, 1080)   # When no consumer has negotiated a format yet
+PLACEHOLDER_RETRY_SEC = 2.0
+PLACEHOLDER_BUFFERS = 2
+
+V4L2_BUF_TYPE_VIDEO_OUTPUT = 2
+V4L2_MEMORY_MMAP = 1
+V4L2_FIELD_NONE = 1
+V4L2_CAP_VIDEO_OUTPUT = 0x00000002
+V4L2_CAP_READWRITE = 0x01000000
+V4L2_CAP_STREAMING = 0x04000000
+V4L2_CAP_DEVICE_CAPS = 0x80000000
+
+def fourcc(code):
+    return struct.unpack("<I", code.encode())[0]
+
+# fourcc -> (GStreamer format, bytes per frame for width, height)
+V4L2_FORMATS = {
+    fourcc("YUYV"): ("YUY2", lambda w, h: w * h * 2),
+    fourcc("UYVY"): ("UYVY", lambda w, h: w * h * 2),
+    fourcc("YU12"): ("I420", lambda w, h: w * h * 3 // 2),
+    fourcc("YV12"): ("YV12", lambda w, h: w * h * 3 // 2),
+    fourcc("NV12"): ("NV12", lambda w, h: w * h * 3 // 2),
+}
+
+class v4l2_capability(ctypes.Structure):
+    _fields_ = [("driver", ctypes.c_char * 16), ("card", ctypes.c_char * 32),
+                ("bus_info", ctypes.c_char * 32), ("version", ctypes.c_uint32),
+                ("capabilities", ctypes.c_uint32), ("device_caps", ctypes.c_uint32),
+                ("reserved", ctypes.c_uint32 * 3)]
+
+class v4l2_pix_format(ctypes.Structure):
+    _fields_ = [(name, ctypes.c_uint32) for name in
+                ("width", "height", "pixelformat", "field", "bytesperline", "sizeimage",
+                 "colorspace", "priv", "flags", "ycbcr_enc", "quantization", "xfer_func")]
+
+class v4l2_format_union(ctypes.Union):
+    # The kernel union also holds pointers (v4l2_window), hence the alignment member
+    _fields_ = [("pix", v4l2_pix_format), ("raw_data", ctypes.c_uint8 * 200), ("_align", ctypes.c_void_p)]
+
+class v4l2_format(ctypes.Structure):
+    _fields_ = [("type", ctypes.c_uint32), ("fmt", v4l2_format_union)]
+
+class v4l2_requestbuffers(ctypes.Structure):
+    _fields_ = [("count", ctypes.c_uint32), ("type", ctypes.c_uint32), ("memory", ctypes.c_uint32),
+                ("capabilities", ctypes.c_uint32), ("flags", ctypes.c_uint8), ("reserved", ctypes.c_uint8 * 3)]
+
+class timeval(ctypes.Structure):
+    _fields_ = [("tv_sec", ctypes.c_long), ("tv_usec", ctypes.c_long)]
+
+class v4l2_timecode(ctypes.Structure):
+    _fields_ = [("type", ctypes.c_uint32), ("flags", ctypes.c_uint32), ("frames", ctypes.c_uint8),
+                ("seconds", ctypes.c_uint8), ("minutes", ctypes.c_uint8), ("hours", ctypes.c_uint8),
+                ("userbits", ctypes.c_uint8 * 4)]
+
+class v4l2_buffer_m(ctypes.Union):
+    _fields_ = [("offset", ctypes.c_uint32), ("userptr", ctypes.c_ulong), ("fd", ctypes.c_int32)]
+
+class v4l2_buffer(ctypes.Structure):
+    _fields_ = [("index", ctypes.c_uint32), ("type", ctypes.c_uint32), ("bytesused", ctypes.c_uint32),
+                ("flags", ctypes.c_uint32), ("field", ctypes.c_uint32), ("timestamp", timeval),
+                ("timecode", v4l2_timecode), ("sequence", ctypes.c_uint32), ("memory", ctypes.c_uint32),
+                ("m", v4l2_buffer_m), ("length", ctypes.c_uint32), ("reserved2", ctypes.c_uint32),
+                ("request_fd", ctypes.c_int32)]
+
+def _ioc(direction, nr, struct_type):
+    # _IOC(dir, 'V', nr, size) from <asm-generic/ioctl.h>
+    return (direction << 30) | (ctypes.sizeof(struct_type) << 16) | (ord('V') << 8) | nr
+
+VIDIOC_QUERYCAP = _ioc(2, 0, v4l2_capability)
+VIDIOC_G_FMT = _ioc(3, 4, v4l2_format)
+VIDIOC_S_FMT = _ioc(3, 5, v4l2_format)
+VIDIOC_REQBUFS = _ioc(3, 8, v4l2_requestbuffers)
+VIDIOC_QUERYBUF = _ioc(3, 9, v4l2_buffer)
+VIDIOC_QBUF = _ioc(3, 15, v4l2_buffer)
+VIDIOC_DQBUF = _ioc(3, 17, v4l2_buffer)
+VIDIOC_STREAMON = _ioc(1, 18, ctypes.c_int)
+VIDIOC_STREAMOFF = _ioc(1, 19, ctypes.c_int)
+
+placeholder_frames = {}   # (width, height, fourcc) -> rendered frame
+
+def render_placeholder(width, height, pixelformat):
+    """
+    The "camera disabled" frame, rendered once per format. GStreamer draws
+    the same icon overlay the old pipeline did (one short gst-launch run);
+    without it we draw a plain crossed-out camera ourselves.
+    """
+    key = (width, height, pixelformat)
+    if key not in placeholder_frames:
+        gst_format, frame_size = V4L2_FORMATS[pixelformat]
+        frame = render_placeholder_gst(width, height, gst_format)
+        if frame is None or len(frame) != frame_size(width, height):
+            frame = render_placeholder_luma(width, height, pixelformat)
+        placeholder_frames[key] = frame
+    return placeholder_frames[key]
+
+def render_placeholder_gst(width, height, gst_format):
+    desc = ["videotestsrc", "num-buffers=1", "pattern=black", "!",
+            f"video/x-raw,format={gst_format},width={width},height={height}"]
+    icon_path = get_camera_icon_path()
+    size = min(300, width, height)
+    if icon_path:
+        desc += ["!", "gdkpixbufoverlay", f"location={icon_path}", f"overlay-height={size}", f"overlay-width={size}",
+                 f"offset-x={(width - size) // 2}", f"offset-y={(height - size) // 2}"]
+    else:
+        desc += ["!", "textoverlay", "text=CAMERA DISABLED", "valignment=center", "halignment=center", "font-desc=Sans 40"]
+    desc += ["!", "fdsink", "fd=1"]
+    try:
+        count_fork("gst-launch-1.0")
+        return subprocess.run(["gst-launch-1.0", "-q"] + desc, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, timeout=10).stdout
+    except Exception as e:
+        error(":: [Placeholder] Could not render with GStreamer: %s", e, reason=e)
+        return None
+
+def render_placeholder_luma(width, height, pixelformat):
+    """Black frame with a crossed-out camera outline, drawn on the luma plane."""
+    black, white = 16, 200
+    luma = bytearray([black]) * (width * height)
+    body_w, body_h, t = width // 6, width // 9, max(2, width // 240)
+    x0, y0 = (width - body_w) // 2, (height - body_h) // 2
+    for y in range(y0, y0 + body_h):
+        row = y * width
+        if y < y0 + t or y >= y0 + body_h - t:
+            luma[row + x0:row + x0 + body_w] = bytes([white]) * body_w
+        else:
+            luma[row + x0:row + x0 + t] = bytes([white]) * t
+            luma[row + x0 + body_w - t:row + x0 + body_w] = bytes([white]) * t
+    for i in range(body_h + 2 * t * 4):
+        y = y0 - 4 * t + i
+        x = x0 + (i * body_w) // (body_h + 8 * t)
+        if 0 <= y < height:
+            luma[y * width + x:y * width + x + 2 * t] = bytes([white]) * (2 * t)
+
+    chroma = bytes([128]) * (width * height // 2)
+    if pixelformat in (fourcc("YUYV"), fourcc("UYVY")):
+        frame = bytearray(width * height * 2)
+        luma_at = 0 if pixelformat == fourcc("YUYV") else 1
+        frame[luma_at::2] = luma
+        frame[1 - luma_at::2] = bytes([128]) * (width * height)
+        return bytes(frame)
+    return bytes(luma) + chroma
+
+class V4l2Writer:
+    """
+    Writes the placeholder frame into a v4l2loopback device from a thread.
+    Keeps whatever resolution and pixel format consumers already negotiated
+    (v4l2loopback remembers the last producer's, e.g. scrcpy's), fills the
+    mmap'd buffers once and then only re-queues them, so a frame costs two
+    ioctls and no copies. Devices without streaming I/O get write().
+    """
+
+    def __init__(self, name, video_device, on_exit):
+        self.name = name
+        self.video_device = video_device
+        self.on_exit = on_exit
+        self.stopping = threading.Event()
+        self.thread = None
+        self.error = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def alive(self):
+        return bool(self.thread and self.thread.is_alive())
+
+    def stop(self):
+        self.stopping.set()
+        # The device must be free before scrcpy opens it
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2)
+
+    def _run(self):
+        fd = None
+        buffers = []
+        try:
+            fd = os.open(self.video_device, os.O_RDWR | os.O_NONBLOCK)
+            caps = v4l2_capability()
+            fcntl.ioctl(fd, VIDIOC_QUERYCAP, caps)
+            device_caps = caps.device_caps if caps.capabilities & V4L2_CAP_DEVICE_CAPS else caps.capabilities
+            if not device_caps & V4L2_CAP_VIDEO_OUTPUT:
+                raise OSError(errno.ENOTTY, f"{self.video_device} is not a video output")
+
+            fmt = self._negotiate(fd)
+            pix = fmt.fmt.pix
+            frame = render_placeholder(pix.width, pix.height, pix.pixelformat)
+            log(":: [Placeholder] Writing %dx%d %s at %d fps to %s", pix.width, pix.height,
+                struct.pack('<I', pix.pixelformat).decode(), PLACEHOLDER_FPS, self.video_device, child=self.name)
+
+            if device_caps & V4L2_CAP_STREAMING:
+                buffers = self._map_buffers(fd, frame)
+                self._stream(fd, len(frame))
+            elif device_caps & V4L2_CAP_READWRITE:
+                while not self.stopping.wait(1 / PLACEHOLDER_FPS):
+                    os.write(fd, frame)
+            else:
+                raise OSError(errno.ENOTTY, f"{self.video_device} supports neither streaming nor write()")
+        except OSError as e:
+            self.error = e
+            error(":: [Placeholder] %s: %s", self.video_device, e, child=self.name, reason=e)
+        finally:
+            for mm in buffers:
+                mm.close()
+            if fd is not None:
+                os.close(fd)
+            self.on_exit(self)
+
+    def _negotiate(self, fd):
+        fmt = v4l2_format(type=V4L2_BUF_TYPE_VIDEO_OUTPUT)
+        try:
+            fcntl.ioctl(fd, VIDIOC_G_FMT, fmt)
+        except OSError:
+            pass
+        pix = fmt.fmt.pix
+        if not (pix.width and pix.height):
+            pix.width, pix.height = PLACEHOLDER_SIZE
+        if pix.pixelformat not in V4L2_FORMATS:
+            pix.pixelformat = fourcc("YUYV")
+        pix.field = V4L2_FIELD_NONE
+        pix.bytesperline = 0
+        pix.sizeimage = V4L2_FORMATS[pix.pixelformat][1](pix.width, pix.height)
+        fcntl.ioctl(fd, VIDIOC_S_FMT, fmt)
+        if pix.pixelformat not in V4L2_FORMATS:
+            raise OSError(errno.EINVAL, "device refused every pixel format we can render")
+        return fmt
+
+    def _map_buffers(self, fd, frame):
+        req = v4l2_requestbuffers(count=PLACEHOLDER_BUFFERS, type=V4L2_BUF_TYPE_VIDEO_OUTPUT, memory=V4L2_MEMORY_MMAP)
+        fcntl.ioctl(fd, VIDIOC_REQBUFS, req)
+        buffers = []
+        for index in range(req.count):
+            buf = v4l2_buffer(index=index, type=V4L2_BUF_TYPE_VIDEO_OUTPUT, memory=V4L2_MEMORY_MMAP)
+            fcntl.ioctl(fd, VIDIOC_QUERYBUF, buf)
+            if buf.length < len(frame):
+                raise OSError(errno.EINVAL, f"buffer of {buf.length} bytes for a {len(frame)} byte frame")
+            mm = mmap.mmap(fd, buf.length, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE, offset=buf.m.offset)
+            buffers.append(mm)
+            # The only copy of the frame we ever make
+            mm[:len(frame)] = frame
+        return buffers
+
+    def _stream(self, fd, frame_size):
+        def queue_buffer(index):
+            buf = v4l2_buffer(index=index, type=V4L2_BUF_TYPE_VIDEO_OUTPUT, memory=V4L2_MEMORY_MMAP,
+                              bytesused=frame_size, field=V4L2_FIELD_NONE)
+            now = time.time()
+            buf.timestamp.tv_sec, buf.timestamp.tv_usec = int(now), int(now % 1 * 1e6)
+            fcntl.ioctl(fd, VIDIOC_QBUF, buf)
+
+        for index in range(PLACEHOLDER_BUFFERS):
+            queue_buffer(index)
+        buf_type = ctypes.c_int(V4L2_BUF_TYPE_VIDEO_OUTPUT)
+        fcntl.ioctl(fd, VIDIOC_STREAMON, buf_type)
+        try:
+            while not self.stopping.wait(1 / PLACEHOLDER_FPS):
+                buf = v4l2_buffer(type=V4L2_BUF_TYPE_VIDEO_OUTPUT, memory=V4L2_MEMORY_MMAP)
+                try:
+                    fcntl.ioctl(fd, VIDIOC_DQBUF, buf)
+                except BlockingIOError:
+                    continue  # Nobody consumed the last frame yet: nothing to refresh
+                queue_buffer(buf.index)
+        finally:
+            try:
+                fcntl.ioctl(fd, VIDIOC_STREAMOFF, buf_type)
+            except OSError:
+                pass
+
+# --- Link Quality ---
+
+# (max smoothed loss, opusenc settings), cleanest link first
+OPUS_TIERS = [
+    (0.01, {"bitrate": 96000, "packet-loss-percentage": 10, "frame-size": 10}),
+    (0.05, {"bitrate": 80000, "packet-loss-percentage": 20, "frame-size": 20}),
+    (0.15, {"bitrate": 64000, "packet-loss-percentage": 35, "frame-size": 20}),
+    (1.01, {"bitrate": 48000, "packet-loss-percentage": 50, "frame-size": 40}),
+]
+HIGH_RTT_MS = 100
+UPGRADE_HOLD_SEC = 10
+
+def parse_stats(text):
+    """Parses heartbeat stats ("loss=0.01,jitter=3.2,rtt=20") into floats."""
+    stats = {}
+    for item in text.split(","):
+        key, sep, value = item.partition("=")
+        if not sep:
+            continue
+        try:
+            stats[key.strip()] = float(value)
+        except ValueError:
+            pass
+    return stats
+
+class LinkQuality:
+    """
+    Picks Opus bitrate/FEC/frame-size from the loss, jitter and RTT the phone
+    reports in its heartbeats. Degrades immediately, upgrades only after the
+    link has been better for UPGRADE_HOLD_SEC.
+    """
+
+    def __init__(self):
+        self.stats = {}
+        self.loss = 0.0
+        self.tier = 0
+        self.better_since = None
+
+    def update(self, stats):
+        """Feeds one report. Returns True if the encoder settings should change."""
+        self.stats = stats
+        if "loss" not in stats:
+            return False
+        self.loss = 0.7 * self.loss + 0.3 * stats["loss"]
+        target = next(i for i, (max_loss, _) in enumerate(OPUS_TIERS) if self.loss < max_loss)
+
+        if target > self.tier:
+            self.tier = target
+            self.better_since = None
+            return True
+        if target < self.tier:
+            if self.better_since is None:
+                self.better_since = time.time()
+            elif time.time() - self.better_since >= UPGRADE_HOLD_SEC:
+                self.tier = target
+                self.better_since = None
+                return True
+        else:
+            self.better_since = None
+        return False
+
+    def settings(self):
+        settings = dict(OPUS_TIERS[self.tier][1])
+        # Long round trips: fewer, larger packets
+        if self.stats.get("rtt", 0) > HIGH_RTT_MS:
+            settings["frame-size"] = max(settings["frame-size"], 20)
+        return settings
+
+
+# --- Failure Detection ---
+
+PHI_WINDOW = 100
+PHI_MIN_STD = 0.05        # Wi-Fi power save jitters heartbeats; don't trust tiny deviations
+PHI_MIN_GAP = 6           # Never suspect before this many mean intervals: loss comes in bursts
+PHI_BOOTSTRAP = (1.0, 0.25)  # (mean, std) until enough intervals are seen
+
+class FailureDetector:
+    """
+    Phi-accrual failure detector over heartbeat inter-arrival times.
+    phi is -log10 of the probability that a heartbeat would still arrive this
+    late, so a threshold of 8 means 1 in 10^8 false suspicions under the
+    observed distribution, however fast the phone is sending.
+    """
+
+    def __init__(self):
+        self.intervals = collections.deque(maxlen=PHI_WINDOW)
+        self.last = None
+
+    def heartbeat(self, now, sample=True):
+        """
+        Records a heartbeat. sample=False only restarts the clock: the gap
+        that ended a suspicion, and replies to resync bursts, are not
+        representative inter-arrival times.
+        """
+        if sample and self.last is not None:
+            self.intervals.append(now - self.last)
+        self.last = now
+
+    def distribution(self):
+        # Snapshot: the listener thread appends while the device loop and metrics read
+        intervals = tuple(self.intervals)
+        if len(intervals) < 3:
+            return NormalDist(*PHI_BOOTSTRAP)
+        mean = sum(intervals) / len(intervals)
+        var = sum((i - mean) ** 2 for i in intervals) / len(intervals)
+        return NormalDist(mean, max(PHI_MIN_STD, math.sqrt(var)))
+
+    def phi(self, now):
+        if self.last is None:
+            return 0.0
+        dist = self.distribution()
+        if now - self.last < PHI_MIN_GAP * dist.mean:
+            return 0.0
+        p_later = 1.0 - dist.cdf(now - self.last)
+        return -math.log10(max(p_later, 1e-16))
+
+    def suspect_at(self, threshold):
+        """Time at which phi will cross threshold if no heartbeat arrives."""
+        if self.last is None:
+            return time.time() + HEARTBEAT_TIMEOUT
+        dist = self.distribution()
+        return self.last + max(dist.inv_cdf(1.0 - 10 ** -threshold), PHI_MIN_GAP * dist.mean)
+
+
+# --- Metrics ---
+
+METRICS_SOCKET = os.path.join(os.environ.get("XDG_RUNTIME_DIR", "/tmp"), "zbridge", "metrics.sock")
+SCRCPY_AUDIO_BUFFER_MS = 50   # scrcpy --audio-buffer default
+SINK_LATENCY_MS = 20          # openslessink latency-time on the phone
+MIC_GRAPH_HOPS = 3            # zbin loopback -> zbin_void -> zmic
+MIC_DIRECT_HOPS = 1           # DirectMic's input stream -> zmic
+
+loop_wakeups = 0
+
+def latency_estimates(device):
+    """
+    Per-direction audio latency (ms) estimated from the heartbeat RTT, the
+    phone's jitter buffer, the Opus frame size and the PipeWire quantum.
+    """
+    stats = device.link_quality.stats
+    if "rtt" not in stats:
+        return {}
+    one_way = stats["rtt"] / 2
+    quantum, rate = graph.clock_settings()
+    quantum_ms = quantum * 1000 / rate
+    if device.mic_mode == "direct":
+        mic_path = MIC_DIRECT_HOPS * quantum_ms + (device.direct_mic.latency_ms() or 0)
+    else:
+        mic_path = MIC_GRAPH_HOPS * quantum_ms
+    return {
+        "pc_to_phone": one_way + device.audio_sender.opus["frame-size"] + stats.get("jb", 0) + SINK_LATENCY_MS,
+        "phone_to_pc": one_way + SCRCPY_AUDIO_BUFFER_MS + mic_path,
+    }
+
+def render_metrics():
+    """Prometheus text exposition of the daemon's live state."""
+    lines = []
+    now = time.time()
+
+    def metric(name, value, help_text, labels=None, kind="gauge"):
+        if value is None:
+            return
+        if not any(l.startswith(f"# HELP {name} ") for l in lines):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+        label_str = "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}" if labels else ""
+        lines.append(f"{name}{label_str} {value}")
+
+    # One family at a time, so each family's samples stay contiguous
+    sessions = list(devices.values())
+    def per_device(name, value_of, help_text, kind="gauge"):
+        for d in sessions:
+            metric(name, value_of(d), help_text, {"device": d.host}, kind)
+
+    per_device("zbridge_connected", lambda d: int(d.state == "CONNECTED"), "1 while the phone heartbeat is alive")
+    per_device("zbridge_heartbeat_age_seconds", lambda d: round(now - d.last_heartbeat, 3) if d.last_heartbeat else None, "Time since the last heartbeat")
+    per_device("zbridge_heartbeat_phi", lambda d: round(d.detector.phi(now), 3) if d.last_heartbeat else None, "Phi-accrual suspicion level of the phone")
+    per_device("zbridge_suspected", lambda d: int(d.state == "SUSPECTED"), "1 while heartbeats are overdue but the phone is not yet given up")
+    per_device("zbridge_rtt_ms", lambda d: d.link_quality.stats.get("rtt"), "Heartbeat round-trip time")
+    per_device("zbridge_clock_offset_ms", lambda d: d.link_quality.stats.get("offset"), "Phone clock offset relative to the PC")
+    per_device("zbridge_packet_loss_ratio", lambda d: d.link_quality.stats.get("loss"), "RTP loss reported by the phone (last interval)")
+    per_device("zbridge_packet_loss_smoothed_ratio", lambda d: round(d.link_quality.loss, 4), "Smoothed RTP loss driving the encoder")
+    per_device("zbridge_jitter_ms", lambda d: d.link_quality.stats.get("jitter"), "RTP interarrival jitter measured on the phone")
+    per_device("zbridge_jitter_buffer_ms", lambda d: d.link_quality.stats.get("jb"), "Phone jitter buffer latency")
+    for d in sessions:
+        for direction, value in latency_estimates(d).items():
+            metric("zbridge_audio_latency_estimate_ms", round(value, 1), "Estimated audio latency", {"device": d.host, "direction": direction})
+    per_device("zbridge_mic_direct", lambda d: int(d.mic_mode == "direct"), "1 while the mic runs through DirectMic instead of the loopback chain")
+    per_device("zbridge_mic_pipeline_latency_ms", lambda d: d.direct_mic.latency_ms() if d.mic_mode == "direct" else None, "Latency added by the in-process DirectMic pipeline")
+    per_device("zbridge_opus_bitrate", lambda d: d.audio_sender.opus["bitrate"], "Opus sender bitrate")
+    per_device("zbridge_opus_fec_percent", lambda d: d.audio_sender.opus["packet-loss-percentage"], "Opus FEC loss percentage")
+    per_device("zbridge_opus_frame_ms", lambda d: d.audio_sender.opus["frame-size"], "Opus frame size")
+    per_device("zbridge_sender_restarts_last_hour", lambda d: d.audio_sender.restarts_per_hour(), "PC->phone pipeline restarts in the last hour")
+    per_device("zbridge_scrcpy_first_frame_ms", lambda d: supervisor.ready_ms(d.child("scrcpy")), "Time from scrcpy spawn to its first frame (to connecting, without video)")
+    per_device("zbridge_time_to_ready_ms", lambda d: round(d.ready_ms) if d.ready_ms is not None else None, "Time from session start to the first handshake")
+    per_device("zbridge_scrcpy_swap_gap_ms", lambda d: d.swap_gap_ms, "Video gap of the last scrcpy reconfiguration")
+    per_device("zbridge_heartbeats_lost_total", lambda d: d.peer["lost"], "Heartbeats missing from the phone's sequence numbers", "counter")
+    per_device("zbridge_device_loop_wakeups_total", lambda d: d.wakeups, "DeviceSession event loop iterations", "counter")
+    per_device("zbridge_adb_online", lambda d: int(adb.online(d.serial)), "1 while the adb server reports the phone's transport as online")
+    children = list(supervisor.children.values())
+    for child in children:
+        metric("zbridge_child_up", int(child.alive), "Supervised child is running", {"child": child.name})
+    for child in children:
+        metric("zbridge_child_restarts_total", child.restarts, "Unexpected child exits", {"child": child.name}, "counter")
+    for cmd, count in sorted(fork_counts.items()):
+        metric("zbridge_forks_total", count, "Subprocesses forked by the daemon", {"cmd": cmd}, "counter")
+    metric("zbridge_adb_tracking", int(adb.synced), "1 while the host:track-devices stream is up")
+    metric("zbridge_adb_connects_total", adb.connects, "host:connect requests sent to the adb server", kind="counter")
+    metric("zbridge_loop_wakeups_total", loop_wakeups, "connection_manager iterations", kind="counter")
+    metric("zbridge_log_suppressed_total", rate_limit.suppressed, "Log records dropped by the rate limiter", kind="counter")
+    for (loop, phase), seconds in sorted(phase_seconds.items()):
+        metric("zbridge_phase_seconds_total", round(seconds, 6), "Time spent per loop phase (with --trace)", {"loop": loop, "phase": phase}, "counter")
+    return "\n".join(lines) + "\n"
+
+def metrics_server():
+    """Serves render_metrics() to anyone connecting to METRICS_SOCKET."""
+    try:
+        os.makedirs(os.path.dirname(METRICS_SOCKET), exist_ok=True)
+        if os.path.exists(METRICS_SOCKET):
+            os.remove(METRICS_SOCKET)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(METRICS_SOCKET)
+        server.listen(4)
+    except Exception as e:
+        error(":: [Metrics] Failed to open %s: %s", METRICS_SOCKET, e, reason=e)
+        return
+
+    while running:
+        conn, _ = server.accept()
+        try:
+            conn.sendall(render_metrics().encode())
+        except Exception as e:
+            error(":: [Metrics] Failed to serve metrics: %s", e, reason=e)
+        finally:
+            conn.close()
+
+# --- Control Socket ---
+#
+# JSON lines over a Unix socket, one request per line:
+#   {"cmd": "get"}                          -> {"ok": true, "config": {KEY: value}}
+#   {"cmd": "set", "values": {KEY: value}}  -> {"ok": true, "applied": bool}, once the change is live
+#   {"cmd": "status"}                       -> {"ok": true, "status": {...}}
+#   {"cmd": "subscribe"}                    -> {"event": "status", "status": {...}} now and on every change
+# Errors come back as {"ok": false, "error": "..."}.
+
+CONTROL_SOCKET = os.path.join(os.path.dirname(METRICS_SOCKET), "control.sock")
+CONTROL_APPLY_TIMEOUT = 5
+STATUS_MIN_INTERVAL = 0.1   # Bursts of changes reach subscribers as one update
+STATUS_IDLE_CHECK = 30      # How often an idle subscriber checks that its peer is still there
+
+status_cond = threading.Condition()
+status_generation = 0
+config_write_lock = threading.Lock()
+
+def notify_status():
+    """Wakes the subscribers; they only send if the rendered status changed."""
+    global status_generation
+    with status_cond:
+        status_generation += 1
+        status_cond.notify_all()
+
+def config_values(cfg):
+    """Config -> state.conf values (KEY -> string)."""
+    values = {}
+    for key, (field, _) in CONFIG_KEYS.items():
+        value = getattr(cfg, field)
+        values[key] = ",".join(value) if isinstance(value, tuple) else str(value)
+    return values
+
+def render_status():
+    """Config plus live state, as shown by zb-config and the GNOME extension."""
+    sessions = list(devices.values())
+
+    def device_status(d):
+        stats = d.link_quality.stats
+        return {
+            "ip": d.ip,
+            "state": d.state,
+            "adb": adb.online(d.serial),
+            "rtt_ms": stats.get("rtt"),
+            "loss": stats.get("loss"),
+            "jitter_ms": stats.get("jitter"),
+            "jitter_buffer_ms": stats.get("jb"),
+            "latency_ms": {k: round(v, 1) for k, v in latency_estimates(d).items()},
+        }
+
+    return {
+        "config": config_values(load_config()),
+        "monitor_active": any(supervisor.alive(d.node("ZBridge_Monitor")) for d in sessions),
+        "desktop_active": any(supervisor.alive(d.node("ZBridge_Desktop")) for d in sessions),
+        "devices": [device_status(d) for d in sessions],
+    }
+
+def validate_values(values):
+    """Checks a set request against CONFIG_KEYS. Returns {KEY: str} or raises ValueError."""
+    if not isinstance(values, dict) or not values:
+        raise ValueError("values must be a non-empty object")
+    clean = {}
+    for key, value in values.items():
+        if key not in CONFIG_KEYS:
+            raise ValueError(f"unknown key {key}")
+        value = str(value).strip()
+        _, validate = CONFIG_KEYS[key]
+        if '"' in value or "\n" in value or (value and validate(value) is None):
+            raise ValueError(f"invalid {key}={value!r}")
+        clean[key] = value
+    return clean
+
+def write_config_values(values):
+    """Rewrites the given KEY="value" lines of state.conf, keeping the others. Atomic."""
+    lines, seen = [], set()
+    if os.path.exists(CONFIG_FILE):
+        with open(CONFIG_FILE, 'r') as f:
+            for line in f:
+                key = line.split('=', 1)[0].strip() if '=' in line else None
+                if key in values:
+                    if key in seen:
+                        continue
+                    line = f'{key}="{values[key]}"'
+                    seen.add(key)
+                lines.append(line.rstrip("\n") + "\n")
+    lines += [f'{key}="{value}"\n' for key, value in values.items() if key not in seen]
+    tmp = CONFIG_FILE + ".tmp"
+    with open(tmp, 'w') as f:
+        f.writelines(lines)
+    os.replace(tmp, CONFIG_FILE)
+
+def apply_config_values(values):
+    """Writes state.conf and waits until connection_manager and the phones applied it."""
+    with config_write_lock:
+        write_config_values(values)
+    applied = threading.Event()
+    with config_waiters_lock:
+        config_waiters.append(applied)
+    post_event("reload")
+    return applied.wait(CONTROL_APPLY_TIMEOUT)
+
+def peer_closed(conn):
+    try:
+        return conn.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b""
+    except BlockingIOError:
+        return False
+    except OSError:
+        return True
+
+def stream_status(conn):
+    """Pushes the status to a subscriber whenever it changes, until it hangs up."""
+    generation, last = None, None
+    while running:
+        with status_cond:
+            status_cond.wait_for(lambda: status_generation != generation, timeout=STATUS_IDLE_CHECK)
+            woken = status_generation != generation
+            generation = status_generation
+        if not woken and peer_closed(conn):
+            return
+        status = render_status()
+        if status != last:
+            conn.sendall((json.dumps({"event": "status", "status": status}) + "\n").encode())
+            last = status
+        time.sleep(STATUS_MIN_INTERVAL)
+
+def handle_control_request(request):
+    cmd = request.get("cmd") if isinstance(request, dict) else None
+    if cmd == "get":
+        return {"ok": True, "config": config_values(load_config())}
+    if cmd == "set":
+        values = validate_values(request.get("values"))
+        log(":: [Control] Setting %s", ", ".join(f"{k}={v}" for k, v in values.items()))
+        return {"ok": True, "applied": apply_config_values(values)}
+    if cmd == "status":
+        return {"ok": True, "status": render_status()}
+    raise ValueError(f"unknown command {cmd!r}")
+
+def serve_control_client(conn):
+    try:
+        with conn, conn.makefile('r') as reader:
+            for line in reader:
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                    if isinstance(request, dict) and request.get("cmd") == "subscribe":
+                        stream_status(conn)
+                        return
+                    reply = handle_control_request(request)
+                except ValueError as e:  # Includes malformed JSON
+                    reply = {"ok": False, "error": str(e)}
+                conn.sendall((json.dumps(reply) + "\n").encode())
+    except OSError:
+        pass  # Client went away
+    except Exception as e:
+        error(":: [Control] Request failed: %s", e, reason=e)
+
+def control_server():
+    """Accepts control clients on CONTROL_SOCKET, one thread each (subscribers stay connected)."""
+    try:
+        os.makedirs(os.path.dirname(CONTROL_SOCKET), exist_ok=True)
+        if os.path.exists(CONTROL_SOCKET):
+            os.remove(CONTROL_SOCKET)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(CONTROL_SOCKET)
+        server.listen(8)
+    except Exception as e:
+        error(":: [Control] Failed to open %s: %s", CONTROL_SOCKET, e, reason=e)
+        return
+
+    while running:
+        conn, _ = server.accept()
+        threading.Thread(target=serve_control_client, args=(conn,), daemon=True).start()
+
+# --- Link Reconciler ---
+
+MIC_SOURCES = ["SDL Application", "scrcpy"]
+LINK_RETRY_SEC = 1.0
+
+link_lock = threading.Lock()
+pending_links = {}  # (out, in, wanted) -> time the pw-link call was issued
+
+def desired_links():
+    """
+    Declarative routing table: (output port, input port, should_exist).
+    One set of rules per phone, plus anti-feedback rules across phones.
+    """
+    table = []
+    sessions = list(devices.values())
+    zbouts = [d.node("zbout") for d in sessions]
+    for d in sessions:
+        zmic, zbin = d.node("zmic"), d.node("zbin")
+        # A. zbin_void -> zmic (direct mode: scrcpy feeds DirectMic, which is zmic)
+        if d.mic_mode == "direct":
+            mic_input = f"{d.direct_mic.input_node}:input_{{ch}}"
+        else:
+            mic_input = f"{zbin}:playback_{{ch}}"
+            for ch in ["FL", "FR"]:
+                table.append((f"{d.node('zbin_void')}:monitor_{ch}", f"{zmic}:input_{ch}", True))
+
+        # Every scrcpy names its nodes the same; tell them apart by process
+        for proc in filter(None, (supervisor.proc(d.child("scrcpy")), supervisor.proc(d.child("scrcpy_next")))):
+            for src in MIC_SOURCES:
+                for ch in ["FL", "FR"]:
+                    # B. Route Scrcpy/SDL to zbin
+                    table.append((f"{src}@{proc.pid}:output_{ch}", mic_input.format(ch=ch), True))
+                    # Anti-Feedback
+                    for zbout in zbouts:
+                        table.append((f"{src}@{proc.pid}:output_{ch}", f"{zbout}:playback_{ch}", False))
+
+        for ch in ["FL", "FR"]:
+            # C. Loopback Cleanups
+            for zbout in zbouts:
+                table.append((f"output.{d.node('ZBridge_Monitor')}:output_{ch}", f"{zbout}:playback_{ch}", False))
+            # Anti-Feedback for Desktop Capture
+            table.append((f"{zmic}:capture_{ch}", f"input.{d.node('ZBridge_Desktop')}:input_{ch}", False))
+    return table
+
+def reconcile_links():
+    """
+    Compares the desired table against the live graph and only creates or
+    destroys the links that differ. Returns a list of applied changes.
+    """
+    changes = []
+    with link_lock:
+        now = time.time()
+        for out_spec, in_spec, wanted in desired_links():
+            if graph.synced:
+                if graph.port_id(out_spec) is None or graph.port_id(in_spec) is None:
+                    continue
+                if graph.has_link(out_spec, in_spec) == wanted:
+                    pending_links.pop((out_spec, in_spec, wanted), None)
+                    continue
+                # Our own pw-link call may not have shown up in the graph yet
+                if now - pending_links.get((out_spec, in_spec, wanted), 0) < LINK_RETRY_SEC:
+                    continue
+                pending_links[(out_spec, in_spec, wanted)] = now
+                # By id: process-qualified specs are our own naming, not pw-link's
+                out_arg, in_arg = str(graph.port_id(out_spec)), str(graph.port_id(in_spec))
+            else:
+                out_arg, in_arg = out_spec, in_spec
+            if wanted:
+                run_command(["pw-link", out_arg, in_arg])
+            else:
+                run_command(["pw-link", "-d", out_arg, in_arg])
+            changes.append(f"{'+' if wanted else '-'} {out_spec} -> {in_spec}")
+
+    # Without a graph snapshot every rule is applied blindly, nothing to report
+    if changes and graph.synced:
+        log(":: [Graph] Links reconciled: %s", ", ".join(changes))
+    return changes
+
+def on_graph_change():
+    # Self-heal as soon as a link or port appears/disappears
+    try:
+        reconcile_links()
+    except Exception as e:
+        error(":: [Graph] Link reconcile failed: %s", e, reason=e)
+    post_event("graph")
+    # Straight to the phones: connection_manager may be busy bootstrapping the graph
+    for device in list(devices.values()):
+        device.post("graph")
+
+def on_adb_change():
+    for device in list(devices.values()):
+        device.post("adb")
+
+GRAPH_BOOTSTRAP_TIMEOUT = 2.0
+
+def setup_audio_graph():
+    # 1. Create Internal VOID nodes (one set per phone)
+    void_nodes = ["zbout_void", "zbin_void", "zmic"]
+    void_descs = ["ZBridge_Out_Internal", "ZBridge_In_Internal", "ZeroBridge_Microphone"]
+    void_types = ["Audio/Sink", "Audio/Sink", "Audio/Source/Virtual"]
+    
+    # All pw-cli calls run at once; then wait for the nodes themselves
+    created = {}
+    for device in list(devices.values()):
+        for i, base in enumerate(void_nodes):
+            # Direct mode: DirectMic provides zmic, there is no zbin_void
+            if device.mic_mode == "direct" and base != "zbout_void":
+                continue
+            node = device.node(base)
+            if not get_node_id(node):
+                cmd = [
+                    "pw-cli", "create-node", "adapter",
+                    "factory.name=support.null-audio-sink",
+                    f"node.name={node}",
+                    f"media.class={void_types[i]}",
+                    f"node.description={device.node(void_descs[i])}",
+                    "object.linger=true"
+                ]
+                created[node] = run_command(cmd, bg=True)
+    
+    if created:
+        started = time.time()
+        if graph.synced:
+            if not graph.wait_nodes(list(created), GRAPH_BOOTSTRAP_TIMEOUT):
+                error(":: [Graph] Nodes still missing after %.0fs: %s", GRAPH_BOOTSTRAP_TIMEOUT,
+                      ", ".join(n for n in created if not graph.node_id(n)))
+        for proc in filter(None, created.values()):
+            proc.wait()
+        if not graph.synced:
+            time.sleep(0.5)  # No graph mirror to watch: give PipeWire a moment
+        log(":: [Graph] Created %s in %.0f ms", ", ".join(created), (time.time() - started) * 1000)
+
+    # 2. Spawn Loopback Sinks
+    for device in list(devices.values()):
+        spawn_loopback_sink(device.node("zbout"), device.node("ZeroBridge_To_Phone"), device.node("zbout_void"))
+        if device.mic_mode != "direct":
+            spawn_loopback_sink(device.node("zbin"), device.node("ZeroBridge_Phone_Mic"), device.node("zbin_void"))
+
+    # 3. Enforce Routing
+    reconcile_links()
+
+def destroy_audio_graph(device):
+    """Removes a phone's loopbacks and (for extra phones) its lingering void nodes."""
+    for base in ["ZBridge_Monitor", "ZBridge_Desktop"]:
+        supervisor.stop(device.node(base))
+    for base in ["zbout", "zbin"]:
+        supervisor.stop(f"zbridge_loopback_{device.node(base)}")
+    device.direct_mic.stop()
+    # Device 0's nodes outlive the daemon so apps keep their selected mic
+    if device.index:
+        for base in ["zbout_void", "zbin_void", "zmic"]:
+            node_id = get_node_id(device.node(base))
+            if node_id:
+                run_command(["pw-cli", "destroy", node_id])
+
+def switch_mic_mode(device, mode):
+    """
+    Moves a phone's mic between the loopback chain and DirectMic. The old
+    path's nodes go first, so there is never more than one zmic.
+    """
+    log(":: [Daemon] [%s] Mic path: %s -> %s", device.host, device.mic_mode, mode, device=device.host)
+    if mode == "direct":
+        supervisor.stop(f"zbridge_loopback_{device.node('zbin')}")
+        for base in ["zbin_void", "zmic"]:
+            node_id = get_node_id(device.node(base))
+            if node_id:
+                run_command(["pw-cli", "destroy", node_id])
+        device.mic_gain_node = None
+    else:
+        device.direct_mic.stop()
+    device.mic_mode = mode
+
+def manage_loopback(name, active, source=None, sink=None):
+    is_running = supervisor.alive(name)
+    if active == "on" and not is_running and supervisor.can_start(name):
+        log("Enabling Loopback: %s", name, child=name)
+        cmd = ["pw-loopback", "--name", name]
+        if source and source != "0": cmd.append(f"--capture-props={{ \"node.target\": \"{source}\" }}")
+        if sink and sink != "0": cmd.append(f"--playback-props={{ \"node.target\": \"{sink}\" }}")
+        supervisor.spawn(name, cmd)
+    elif active != "on" and is_running:
+        log("Disabling Loopback: %s", name, child=name)
+        supervisor.stop(name)
+
+def sweep_stale_loopbacks():
+    """
+    Kills loopbacks left behind by a previous daemon instance.
+    Runs once at startup; afterwards every loopback is owned by the supervisor.
+    """
+    run_command(["pkill", "-f", "pw-loopback.*--name (ZBridge_|zbridge_loopback_)"])
+
+# --- Event Loop ---
+
+# SimpleQueue.put is reentrant, so signal handlers may post directly
+events = queue.SimpleQueue()
+
+def post_event(kind, data=None):
+    events.put((kind, data))
+
+def post_child_event(kind, name):
+    """Child events go straight to the phone owning the child, the rest to connection_manager."""
+    for device in list(devices.values()):
+        if name in device.children():
+            device.post(kind, name)
+            return
+    post_event(kind, name)
+
+def wait_for_events(timeout, source=events):
+    """
+    Blocks until at least one event arrives on `source` (the global queue
+    or a device's) or the timeout expires.
+    Returns the set of pending event kinds, coalesced.
+    """
+    kinds = set()
+    try:
+        kind, _ = source.get(timeout=max(0, timeout))
+        kinds.add(kind)
+    except queue.Empty:
+        return kinds
+    while True:
+        try:
+            kind, _ = source.get_nowait()
+            kinds.add(kind)
+        except queue.Empty:
+            return kinds
+
+def handle_reload(signum, frame):
+    post_event("reload")
+
+config_waiters = []  # Events of control clients waiting for their change to be applied
+config_waiters_lock = threading.Lock()
+
+def take_config_waiters():
+    """Claims the waiting control clients. Taken before state.conf is re-read, so their writes are in."""
+    with config_waiters_lock:
+        waiters = config_waiters[:]
+        config_waiters.clear()
+    return waiters
+
+def ack_config_client(waiters=()):
+    """Tells a waiting zb-config (SIGUSR2) and control clients that their change has been applied."""
+    for waiter in waiters:
+        waiter.set()
+    if os.path.exists(CONFIG_PID_FILE):
+        try:
+            with open(CONFIG_PID_FILE, 'r') as f:
+                pid = int(f.read().strip())
+            os.kill(pid, signal.SIGUSR2)
+        except Exception as e:
+            error("Failed to ACK zb-config: %s", e, reason=e)
+        finally:
+            try: os.remove(CONFIG_PID_FILE)
+            except: pass
+
+# --- Control Protocol ---
+#
+# Every datagram starts with magic "ZB", version, message type, capability
+# flags, sequence number, session id and the sender's monotonic clock (us),
+# followed by a type-specific payload. One socket per side, reused.
+
+PROTO_MAGIC = b"ZB"
+PROTO_VERSION = 1
+PROTO_HEADER = struct.Struct("!2sBBHIIQ")
+MSG_SYNC = 1    # PC -> phone, payload: PC IPv4
+MSG_READY = 2   # phone -> PC heartbeat, payload: receive stats (if CAP_STATS)
+MSG_ACK = 3     # PC -> phone, payload: echoed phone timestamp, PC receive timestamp
+SYNC_PAYLOAD = struct.Struct("!4s")
+# loss (1e-4), jitter (0.1 ms), rtt (0.1 ms), clock offset (0.1 ms, clamped to int32),
+# jitter buffer (ms), then the unclamped clock offset (us). The monotonic clocks'
+# difference follows both uptimes and overflows the first one after 59.6 h;
+# phones from before the second one only send the first five fields.
+READY_PAYLOAD = struct.Struct("!HHHiHq")
+READY_PAYLOAD_BASE = struct.Struct("!HHHiH")
+ACK_PAYLOAD = struct.Struct("!QQ")
+
+CAP_STATS = 0x1       # READY carries a fresh stats payload
+CAP_TIMESTAMPS = 0x2  # ACK carries echo/receive timestamps
+PROTO_CAPS = CAP_TIMESTAMPS
+
+control_sock = None
+tx_seq = itertools.count(1)
+
+def monotonic_us():
+    return time.monotonic_ns() // 1000
+
+def pack_message(msg_type, seq, session, payload=b"", flags=PROTO_CAPS):
+    header = PROTO_HEADER.pack(PROTO_MAGIC, PROTO_VERSION, msg_type, flags,
+                               seq & 0xFFFFFFFF, session & 0xFFFFFFFF, monotonic_us())
+    return header + payload
+
+def unpack_message(data):
+    """
+    Returns (type, flags, seq, session, timestamp_us, payload),
+    or None if data is not a protocol message of our version.
+    """
+    if len(data) < PROTO_HEADER.size or data[:2] != PROTO_MAGIC:
+        return None
+    _, version, msg_type, flags, seq, session, ts = PROTO_HEADER.unpack_from(data)
+    if version != PROTO_VERSION:
+        return None
+    return msg_type, flags, seq, session, ts, data[PROTO_HEADER.size:]
+
+def decode_stats(payload):
+    loss, jitter, rtt, offset, jb = READY_PAYLOAD_BASE.unpack_from(payload)
+    offset_ms = offset / 10
+    if len(payload) >= READY_PAYLOAD.size:
+        offset_ms = READY_PAYLOAD.unpack_from(payload)[5] / 1000
+    return {"loss": loss / 10000, "jitter": jitter / 10, "rtt": rtt / 10, "offset": offset_ms, "jb": jb}
+
+def open_control_socket():
+    global control_sock
+    control_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    control_sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 262144)
+    control_sock.bind(('0.0.0.0', UDP_PORT_LISTEN))
+
+def send_control(msg_type, payload, addr, session):
+    control_sock.sendto(pack_message(msg_type, next(tx_seq), session, payload), addr)
+
+# --- Session Cache ---
+#
+# The last-known-good session of each phone outlives the daemon, so after a
+# restart the phone keeps its session id (no GStreamer resync on its side)
+# and the encoder starts at the tier the link needed last time.
+
+SESSION_FILE = os.path.join(os.path.dirname(METRICS_SOCKET), "session.json")
+SESSION_MAX_AGE = 600
+
+session_lock = threading.Lock()
+saved_sessions = {}  # ip -> session entry left by the previous daemon instance
+
+def load_sessions():
+    """Session entries of the previous daemon instance, if it stopped recently."""
+    try:
+        with open(SESSION_FILE, 'r') as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(saved, dict) or time.time() - saved.get("saved_at", 0) > SESSION_MAX_AGE:
+        return {}
+    return saved.get("devices", {})
+
+def save_sessions():
+    """Writes the session of every phone that has spoken (or not yet, but was resumed)."""
+    entries = {}
+    for device in list(devices.values()):
+        if device.peer["legacy"] is not None:
+            entries[device.ip] = device.session_entry()
+        elif device.ip in saved_sessions:
+            entries[device.ip] = saved_sessions[device.ip]
+    try:
+        with session_lock:
+            os.makedirs(os.path.dirname(SESSION_FILE), exist_ok=True)
+            tmp = SESSION_FILE + ".tmp"
+            with open(tmp, 'w') as f:
+                json.dump({"saved_at": time.time(), "devices": entries}, f)
+            os.replace(tmp, SESSION_FILE)
+    except OSError as e:
+        error(":: [Session] Failed to save %s: %s", SESSION_FILE, e, reason=e)
+
+# --- Device Sessions ---
+
+SCRCPY_BASE_PORT = 27183
+V4L2_BASE_INDEX = 9
+# scrcpy log lines marking a usable instance: first frame written to the
+# v4l2 sink, or (without video) the device connection
+SCRCPY_VIDEO_READY = "v4l2 sink started"
+SCRCPY_READY = "Device: "
+SWAP_FAST_RETRIES = 8  # ~2s of quick retries while the camera HAL lets go
+
+devices = {}          # index -> DeviceSession (index 0 is PHONE_IP)
+devices_by_host = {}  # source IP -> DeviceSession, for the listener
+
+class DeviceSession:
+    """
+    One phone: its handshake state machine, streams, PipeWire nodes and ports.
+    Runs in its own thread, so a phone that is slow to come back (adb
+    timeouts, scrcpy restarts) never stalls the others. Device 0 keeps the
+    historical names (zmic, /dev/video9, ...); device n gets a _n suffix,
+    /dev/video(9+n) and scrcpy port 27183+n.
+    """
+
+    def __init__(self, index, ip):
+        self.index = index
+        self.ip = ip                  # As configured, may carry an adb port
+        self.host = ip.split(':')[0]
+        self.serial = adb_serial(ip)
+        self.suffix = f"_{index}" if index else ""
+        self.session_id = (session_id + index) & 0xFFFFFFFF
+        self.created_at = time.time()
+        self.ready_ms = None          # Time to the first handshake
+        self.video_device = f"/dev/video{V4L2_BASE_INDEX + index}"
+        self.state = "DISCONNECTED"
+        self.last_heartbeat = 0
+        self.detector = FailureDetector()
+        self.link_quality = LinkQuality()
+        self.peer = {"seq": None, "lost": 0, "legacy": None} # legacy: None until the phone has spoken
+        self.audio_sender = AudioSender(self.child("gst"), inprocess_gst)
+        self.placeholder = PlaceholderStream(self.child("placeholder"), self.video_device, inprocess_gst)
+        self.scrcpy_cmd = []
+        self.swap_cmd = None          # Command of a warming-up standby scrcpy
+        self.gap_since = None         # Video down since (in-place swap)
+        self.swap_gap_ms = None
+        self.mic_gain_node = None     # Owned by connection_manager
+        self.mic_mode = "loopback"    # Owned by connection_manager
+        self.direct_mic = DirectMic(self.child("mic"), self.node("zmic_in"), self.node("zmic"),
+                                    self.node("ZeroBridge_Microphone"), inprocess_gst)
+        self.cfg = Config()
+        self.changed = set()
+        self.acks = []
+        self.lock = threading.Lock()
+        self.events = queue.SimpleQueue()
+        self.wakeups = 0
+        self.active = True
+        self.thread = None
+        self.resumed = ip in saved_sessions and self.restore(saved_sessions[ip])
+
+    def session_entry(self):
+        return {
+            "session_id": self.session_id,
+            "legacy": self.peer["legacy"],
+            "tier": self.link_quality.tier,
+            "loss": round(self.link_quality.loss, 4),
+            "opus": dict(self.audio_sender.opus),
+        }
+
+    def restore(self, entry):
+        """Picks up a saved session. Returns False if the entry is unusable."""
+        try:
+            tier = int(entry["tier"])
+            if not 0 <= tier < len(OPUS_TIERS) or set(entry["opus"]) != set(OPUS_DEFAULTS) \
+                    or entry["legacy"] not in (True, False, None):
+                return False
+            self.session_id = int(entry["session_id"]) & 0xFFFFFFFF
+            self.peer["legacy"] = entry["legacy"]
+            self.link_quality.tier = tier
+            self.link_quality.loss = float(entry["loss"])
+            self.audio_sender.opus = {k: int(v) for k, v in entry["opus"].items()}
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return False
+        return True
+
+    def node(self, base):
+        return base + self.suffix
+
+    def child(self, base):
+        return base + self.suffix
+
+    def children(self):
+        return {self.child("scrcpy"), self.child("scrcpy_next"), self.child("gst"), self.child("placeholder")}
+
+    def post(self, kind, data=None):
+        self.events.put((kind, data))
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.active = False
+        self.post("stop")
+        if self.thread:
+            self.thread.join(timeout=5)
+        self.audio_sender.stop()
+        self.stop_scrcpy()
+        self.placeholder.stop()
+        with self.lock:
+            self.state = "DISCONNECTED"
+
+    def apply_config(self, cfg, changed):
+        """Hands a new Config to the device thread. The returned Event is set once it is applied."""
+        ack = threading.Event()
+        with self.lock:
+            self.cfg = cfg
+            self.changed |= changed
+            self.acks.append(ack)
+        self.post("config")
+        return ack
+
+    def send_control(self, msg_type, payload):
+        send_control(msg_type, payload, (self.host, UDP_PORT_SEND), self.session_id)
+
+    def mark_heartbeat(self):
+        handshake = False
+        with self.lock:
+            now = time.time()
+            self.detector.heartbeat(now, sample=self.state == "CONNECTED")
+            if self.state == "SUSPECTED":
+                log("[%s] Phone back after %.0f ms.", self.host, (now - self.last_heartbeat) * 1000, device=self.host)
+                self.state = "CONNECTED"
+                self.post("heartbeat")
+            elif self.state != "CONNECTED":
+                log("[%s] Handshake received. Connected.", self.host, device=self.host)
+                self.state = "CONNECTED"
+                adb.kick(self.serial)
+                self.post("heartbeat")
+                if self.ready_ms is None:
+                    self.ready_ms = (now - self.created_at) * 1000
+                    log(":: [Startup] [%s] Ready after %.0f ms (%s session %s)", self.host, self.ready_ms,
+                        "resumed" if self.resumed else "new", self.session_id, device=self.host)
+                handshake = True
+            self.last_heartbeat = now
+        # File I/O stays outside the lock the other phones' heartbeats queue on
+        if handshake:
+            update_ready_flag()
+            save_sessions()
+
+    def stop_streams(self):
+        self.audio_sender.release()
+        self.stop_scrcpy()
+        self.placeholder.stop()
+
+    def stop_scrcpy(self):
+        supervisor.stop(self.child("scrcpy_next"))
+        supervisor.stop(self.child("scrcpy"))
+        self.swap_cmd = self.gap_since = None
+
+    def spawn_scrcpy(self, name, cmd, fast_retries=None):
+        marker = SCRCPY_VIDEO_READY if uses_v4l2(cmd) else SCRCPY_READY
+        supervisor.spawn(name, cmd, min_backoff=SCRCPY_CRASH_BACKOFF, ready_pattern=marker,
+                         fast_retries=fast_retries, env=os.environ.copy(), text=True)
+
+    def hot_swap(self, target_cmd):
+        """
+        Reconfigures a running scrcpy without touching the adb transport.
+        If the old and new instance don't compete for the camera or mic, the
+        new one warms up next to the old and takes over once it delivers
+        (make-before-break). Otherwise the old one goes first and the new one
+        is retried quickly until the camera HAL has let go.
+        """
+        scrcpy, standby = self.child("scrcpy"), self.child("scrcpy_next")
+        if target_cmd == self.swap_cmd:
+            return # Already warming up
+        supervisor.stop(standby)
+        self.swap_cmd = None
+        if scrcpy_contended(self.scrcpy_cmd, target_cmd):
+            log(":: [%s] Scrcpy config changed. Restarting in place...", self.host, device=self.host)
+            supervisor.stop(scrcpy)
+            self.gap_since = time.time()
+            self.spawn_scrcpy(scrcpy, target_cmd, fast_retries=SWAP_FAST_RETRIES)
+            self.scrcpy_cmd = target_cmd
+        else:
+            log(":: [%s] Scrcpy config changed. Warming up replacement...", self.host, device=self.host)
+            self.spawn_scrcpy(standby, target_cmd)
+            self.swap_cmd = target_cmd
+
+    def finish_swap(self):
+        """Cuts over to a ready standby, or falls back to an in-place restart if it failed."""
+        scrcpy, standby = self.child("scrcpy"), self.child("scrcpy_next")
+        if self.swap_cmd:
+            if supervisor.ready(standby):
+                supervisor.stop(scrcpy)
+                supervisor.rename(standby, scrcpy)
+                self.scrcpy_cmd, self.swap_cmd = self.swap_cmd, None
+                self.swap_gap_ms = 0
+                log(":: [%s] Scrcpy cut over (%s ms to first frame, no gap)", self.host, supervisor.ready_ms(scrcpy), device=self.host)
+            elif not supervisor.alive(standby):
+                error(":: [%s] Scrcpy standby failed. Restarting in place...", self.host, device=self.host)
+                target_cmd, self.swap_cmd = self.swap_cmd, None
+                supervisor.stop(scrcpy)
+                self.gap_since = time.time()
+                self.spawn_scrcpy(scrcpy, target_cmd, fast_retries=SWAP_FAST_RETRIES)
+                self.scrcpy_cmd = target_cmd
+        elif self.gap_since and supervisor.ready(scrcpy):
+            self.swap_gap_ms = round((time.time() - self.gap_since) * 1000)
+            self.gap_since = None
+            log(":: [%s] Scrcpy back after %s ms", self.host, self.swap_gap_ms, device=self.host)
+
+    def scrcpy_command(self, cfg):
+        target_cmd = ["scrcpy", "--serial", self.serial, "--no-window"]
+        if self.index:
+            target_cmd.append(f"--port={SCRCPY_BASE_PORT + self.index}")
+        
+        if cfg.monitor == "on":
+            target_cmd += ["--audio-source=mic", "--audio-codec=opus", "--audio-bit-rate=128K"]
+        else:
+            target_cmd += ["--no-audio"]
+        
+        if cfg.cam_facing == "none":
+            target_cmd += ["--no-video"]
+        else:
+            target_cmd.append("--camera-fps=30")
+            safe_cam = cfg.cam_facing if cfg.cam_facing in ["front", "back"] else "back"
+            final_orient = cfg.cam_orient if cfg.cam_orient else (cfg.def_orient_front if safe_cam == "front" else cfg.def_orient_back)
+            target_cmd += ["--video-source=camera", f"--camera-facing={safe_cam}", f"--capture-orientation={final_orient}"]
+            if os.path.exists(self.video_device):
+                target_cmd += [f"--v4l2-sink={self.video_device}"]
+        return target_cmd
+
+    def run(self):
+        start_time = time.time()
+        startup_notified = False
+        next_sync = 0
+        pending = set()
+
+        while self.active:
+            self.wakeups += 1
+            trace_begin("device", device=self.host, events=",".join(sorted(pending)) or "timeout")
+            # Nothing is polled: sleep until an event arrives or a deadline is due
+            wake_at = time.time() + 60
+
+            with self.lock:
+                cfg, changed, acks = self.cfg, self.changed, self.acks
+                self.changed, self.acks = set(), []
+
+            # Apply Audio Gain (Requires Stream Restart unless in-process)
+            if "audio_gain" in changed:
+                log(":: [%s] Audio Out Gain changing -> %s", self.host, cfg.audio_gain, device=self.host)
+                with span("gain"):
+                    if not self.audio_sender.set_gain(cfg.audio_gain):
+                        self.audio_sender.stop()
+
+            # Fast path: pause the PC -> phone stream as soon as heartbeats are
+            # overdue, and only tear everything down after HEARTBEAT_TIMEOUT.
+            # The stops run outside the lock: mark_heartbeat (shared listener
+            # thread) must not wait for this phone's children to exit.
+            transition = None
+            with self.lock:
+                now = time.time()
+                if self.state == "CONNECTED" and self.detector.phi(now) >= cfg.suspect_phi:
+                    log("[%s] Heartbeat overdue (%.0f ms). Suspecting phone.", self.host, (now - self.last_heartbeat) * 1000,
+                        device=self.host)
+                    self.state = transition = "SUSPECTED"
+                    next_sync = 0 # Burst-resync right away
+                elif self.state == "SUSPECTED" and now - self.last_heartbeat > HEARTBEAT_TIMEOUT:
+                    log("[%s] Heartbeat timed out.", self.host, device=self.host)
+                    self.state = transition = "DISCONNECTED"
+            if transition == "SUSPECTED":
+                self.audio_sender.suspend()
+            elif transition == "DISCONNECTED":
+                update_ready_flag()
+                self.stop_streams()
+
+            # Adapt the encoder to the loss/RTT reported by the phone
+            if "quality" in pending:
+                with span("quality"):
+                    settings = self.link_quality.settings()
+                    if any(self.audio_sender.opus.get(k) != v for k, v in settings.items()):
+                        log(":: [%s] Link loss %.1f%%, rtt %.0f ms. Opus -> %s", self.host, self.link_quality.loss * 100,
+                            self.link_quality.stats.get('rtt', 0), settings, device=self.host)
+                        if not self.audio_sender.set_encoder(**settings) and self.audio_sender.alive():
+                            self.audio_sender.stop()
+                        save_sessions()
+
+            if self.state in ("DISCONNECTED", "SUSPECTED"):
+                if args.debug_notify and not startup_notified:
+                    if time.time() - start_time > 5.0:
+                        send_notification("ZeroBridge", f"No response from phone {self.host}. Run sv restart zreceiver in termux.")
+                        startup_notified = True
+                    else:
+                        wake_at = min(wake_at, start_time + 5.0)
+                
+                if time.time() >= next_sync:
+                    with span("sync"):
+                        my_ip = get_local_ip_for_target(self.host)
+                        if my_ip:
+                            try:
+                                # Until we know which protocol the phone speaks, poke it in both
+                                if self.peer["legacy"] is not True:
+                                    self.send_control(MSG_SYNC, SYNC_PAYLOAD.pack(socket.inet_aton(my_ip)))
+                                if self.peer["legacy"] is not False:
+                                    control_sock.sendto(f"SYNC:{my_ip}".encode('utf-8'), (self.host, UDP_PORT_SEND))
+                            except: pass
+                    next_sync = time.time() + (RESYNC_BURST_INTERVAL if self.state == "SUSPECTED" else SYNC_INTERVAL)
+                wake_at = min(wake_at, next_sync)
+                if self.state == "SUSPECTED":
+                    wake_at = min(wake_at, self.last_heartbeat + HEARTBEAT_TIMEOUT)
+
+            elif self.state == "CONNECTED":
+                startup_notified = True 
+                
+                # --- AUDIO STREAM (PC -> Phone) ---
+                with span("audio"):
+                    if cfg.desktop == "on":
+                        if self.audio_sender.suspended():
+                            log("Resuming warm Stream -> %s:%d", self.host, RTP_PORT, device=self.host)
+                            self.audio_sender.resume(self.host)
+                        elif not self.audio_sender.alive() and self.audio_sender.can_start():
+                            zbout_void_id = get_node_id(self.node("zbout_void"))
+                            if zbout_void_id:
+                                log("Starting Stream -> %s:%d (Gain: %s)", self.host, RTP_PORT, cfg.audio_gain, device=self.host)
+                                self.audio_sender.start(zbout_void_id, self.host, cfg.audio_gain)
+                    elif cfg.desktop == "off":
+                        if self.audio_sender.alive() or self.audio_sender.suspended():
+                            log(":: [%s] Stopping Audio Stream (Desktop disabled)...", self.host, device=self.host)
+                            self.audio_sender.stop()
+                
+                # --- VIDEO / PLACEHOLDER LOGIC ---
+                with span("video"):
+                    target_cmd = self.scrcpy_command(cfg)
+                    scrcpy = self.child("scrcpy")
+
+                    # The placeholder and scrcpy never write the v4l2 sink at the same time
+                    use_placeholder = (cfg.cam_facing == "none" and os.path.exists(self.video_device))
+                    if not use_placeholder:
+                        self.placeholder.stop()
+
+                    if supervisor.alive(scrcpy) and self.scrcpy_cmd and target_cmd != self.scrcpy_cmd:
+                        self.hot_swap(target_cmd)
+                    self.finish_swap()
+
+                    if use_placeholder and not (supervisor.alive(scrcpy) and uses_v4l2(self.scrcpy_cmd)):
+                        if not self.placeholder.alive() and self.placeholder.can_start():
+                            log(":: [%s] Starting Placeholder Stream...", self.host, device=self.host)
+                            self.placeholder.start()
+
+                    # The supervisor logs crashes (with stderr) and owns the restart backoff
+                    # Without an adb transport, the "adb" event wakes us once it is up
+                    if not supervisor.alive(scrcpy) and supervisor.can_start(scrcpy) and adb.online(self.serial):
+                        log("[%s] Starting Scrcpy (%s)...", self.host, cfg.cam_facing, device=self.host)
+                        self.spawn_scrcpy(scrcpy, target_cmd)
+                        self.scrcpy_cmd = target_cmd
+
+                # Suspicion is just another deadline
+                wake_at = min(wake_at, self.detector.suspect_at(cfg.suspect_phi))
+
+            # Crashed children come back once their backoff expires
+            wake_at = min(wake_at, supervisor.next_restart(self.children()), self.audio_sender.deadline(),
+                          self.placeholder.deadline())
+
+            for ack in acks:
+                ack.set()
+            notify_status()
+            trace_end()
+            pending = wait_for_events(wake_at - time.time(), self.events)
+
+def uses_v4l2(cmd):
+    return any(arg.startswith("--v4l2-sink") for arg in cmd)
+
+def scrcpy_contended(old_cmd, new_cmd):
+    """True if two scrcpy commands can't run side by side (both need the camera or the mic)."""
+    return any(arg in old_cmd and arg in new_cmd for arg in ["--video-source=camera", "--audio-source=mic"])
+
+def update_ready_flag():
+    """READY_FLAG exists while at least one phone is connected (or only suspected)."""
+    try:
+        if any(d.state != "DISCONNECTED" for d in list(devices.values())):
+            with open(READY_FLAG, 'w') as f: f.write("1")
+        elif os.path.exists(READY_FLAG):
+            os.remove(READY_FLAG)
+    except OSError:
+        pass
+
+def sync_devices(cfg):
+    """
+    Starts and stops DeviceSessions to match PHONE_IP + EXTRA_IPS.
+    Returns True if the set of devices changed.
+    """
+    def usable(ip):
+        return ip and ip.split(':')[0] != "127.0.0.1"
+
+    primary = cfg.phone_ip if usable(cfg.phone_ip) else None
+    extras = [ip for ip in cfg.extra_ips if usable(ip) and ip != primary]
+    changed = False
+
+    for index, device in list(devices.items()):
+        if device.ip == primary if index == 0 else device.ip in extras:
+            continue
+        log("Device %s removed.", device.ip, device=device.host)
+        adb.unwant(device.serial)
+        device.close()
+        destroy_audio_graph(device)
+        del devices[index]
+        changed = True
+
+    wanted = ([(0, primary)] if primary and 0 not in devices else []) + \
+             [(None, ip) for ip in extras if not any(d.ip == ip for d in devices.values())]
+    for index, ip in wanted:
+        if index is None:
+            index = next(i for i in range(1, MAX_DEVICES) if i not in devices)
+        if index == 0:
+            log("Target IP Changed: %s", ip)
+        else:
+            log("Extra device %s added (#%d).", ip, index)
+        device = DeviceSession(index, ip)
+        device.apply_config(cfg, set())
+        adb.want(device.serial)
+        devices[index] = device
+        device.start()
+        changed = True
+
+    if changed:
+        global devices_by_host
+        devices_by_host = {d.host: d for d in devices.values()}
+        update_ready_flag()
+    return changed
+
+# --- Threads ---
+
+def handle_legacy(device, data, recv_us):
+    """Text protocol of receivers deployed before the binary one (READY / ACK:<sid>)."""
+    msg = data.decode('utf-8', errors='replace').strip()
+    if msg != "READY" and not msg.startswith("READY:"):
+        return
+    device.peer["legacy"] = True
+    report = msg[len("READY:"):]
+    echo = next((item[2:] for item in report.split(",") if item.startswith("t=")), None)
+    if device.link_quality.update(parse_stats(report)):
+        device.post("quality")
+    device.mark_heartbeat()
+    ack_msg = f"ACK:{device.session_id}"
+    if echo:
+        ack_msg += f":{echo}:{recv_us // 1000}:{monotonic_us() // 1000}"
+    control_sock.sendto(ack_msg.encode('utf-8'), (device.host, UDP_PORT_SEND))
+
+def network_listener():
+    log("Listening on UDP %d...", UDP_PORT_LISTEN)
+    
+    while running:
+        try:
+            data, addr = control_sock.recvfrom(1024)
+            recv_us = monotonic_us()
+            # One socket for all phones: demultiplex by source address
+            device = devices_by_host.get(addr[0])
+            if device is None:
+                continue
+            msg = unpack_message(data)
+            if msg is None:
+                handle_legacy(device, data, recv_us)
+                continue
+
+            msg_type, flags, seq, _, sent_us, payload = msg
+            if msg_type != MSG_READY:
+                continue
+            peer = device.peer
+            peer["legacy"] = False
+
+            # Sequence gaps = lost heartbeats
+            if peer["seq"] is not None and 0 < seq - peer["seq"] < 1000:
+                peer["lost"] += seq - peer["seq"] - 1
+            peer["seq"] = seq
+
+            # Receive stats ride along only when the phone has a fresh interval
+            if flags & CAP_STATS and len(payload) >= READY_PAYLOAD_BASE.size:
+                if device.link_quality.update(decode_stats(payload)):
+                    device.post("quality")
+
+            device.mark_heartbeat()
+            # The phone gets t1 (its send time) and t2 (our receive time) back;
+            # t3 is the ACK's own header timestamp.
+            device.send_control(MSG_ACK, ACK_PAYLOAD.pack(sent_us, recv_us))
+        except Exception as e:
+            error("Listener Error: %s", e, reason=e)
+            time.sleep(1)
+
+def connection_manager():
+    """
+    Owns the config and everything shared between phones (PipeWire nodes,
+    loopbacks, links). Per-phone work happens in each DeviceSession's thread.
+    """
+    global loop_wakeups
+    
+    cfg = Config()
+    pending = {"config"}
+
+    while running:
+        loop_wakeups += 1
+        trace_begin("connection_manager", events=",".join(sorted(pending)) or "timeout")
+        # Nothing is polled: sleep until an event arrives or a deadline is due
+        wake_at = time.time() + 60
+
+        # Config is only re-parsed when inotify or SIGUSR1 says it changed
+        changed = set()
+        waiters = []
+        if "reload" in pending:
+            log(":: [Daemon] Reload requested. Parsing config... ::")
+            waiters = take_config_waiters()
+        if pending & {"config", "reload"}:
+            with span("config"):
+                new_cfg = load_config()
+                changed = config_diff(cfg, new_cfg)
+            if changed:
+                log(":: [Config] Changed: %s", ", ".join(sorted(changed)))
+            old_cfg, cfg = cfg, new_cfg
+
+        with span("devices"):
+            if changed & {"phone_ip", "extra_ips"}:
+                sync_devices(cfg)
+
+        with span("graph"):
+            for device in list(devices.values()):
+                if device.mic_mode != cfg.mic_mode:
+                    switch_mic_mode(device, cfg.mic_mode)
+
+            setup_audio_graph()
+
+        # Apply Mic Gain via Pactl (Does not require graph restart)
+        if "mic_gain" in changed:
+            log(":: [Daemon] Mic Gain changing: %s -> %s", old_cfg.mic_gain, cfg.mic_gain)
+        with span("mic"):
+            for device in list(devices.values()):
+                # Direct mode: the gain is a volume element, no pactl at all
+                mic = device.direct_mic
+                if device.mic_mode == "direct":
+                    if "mic_gain" in changed and mic.alive() and not mic.set_gain(cfg.mic_gain):
+                        mic.stop()
+                    if not mic.alive() and mic.can_start():
+                        log(":: [Daemon] [%s] Starting Direct Mic (Gain: %s)", device.host, cfg.mic_gain, device=device.host)
+                        mic.start(cfg.mic_gain)
+                    wake_at = min(wake_at, mic.deadline())
+                    continue
+
+                zbin_void = device.node("zbin_void")
+                if "mic_gain" in changed:
+                    set_pactl_volume(zbin_void, cfg.mic_gain)
+                    device.mic_gain_node = get_node_id(zbin_void)
+
+                # Initial Gain Set for fresh loops (once per zbin_void instance)
+                zbin_void_id = get_node_id(zbin_void)
+                if zbin_void_id and zbin_void_id != device.mic_gain_node:
+                    set_pactl_volume(zbin_void, cfg.mic_gain)
+                    device.mic_gain_node = zbin_void_id
+
+        # Every pass: a crashed loopback comes back on the wake its backoff deadline
+        # schedules, which carries no event (no-op while they run)
+        with span("loopbacks"):
+            for device in list(devices.values()):
+                manage_loopback(device.node("ZBridge_Monitor"), cfg.monitor, device.node("zmic"), "0")
+                manage_loopback(device.node("ZBridge_Desktop"), cfg.desktop, "0", device.node("zbout"))
+
+        # Hand the rest to the phones
+        acks = []
+        if changed or "reload" in pending:
+            acks = [device.apply_config(cfg, changed) for device in list(devices.values())]
+
+        supervisor.check_ready()
+
+        # zb-config is waiting for the change to land, not just for the signal
+        if "reload" in pending:
+            with span("ack_wait"):
+                deadline = time.time() + 3
+                for ack in acks:
+                    ack.wait(max(0, deadline - time.time()))
+                ack_config_client(waiters)
+
+        # Crashed loopbacks come back once their backoff expires
+        owned = set().union(*(device.children() for device in list(devices.values())))
+        shared = [name for name in list(supervisor.children) if name not in owned]
+        wake_at = min(wake_at, supervisor.next_restart(shared))
+        notify_status()
+        trace_end()
+        pending = wait_for_events(wake_at - time.time())
+
+def cleanup_handler(signum, frame):
+    """
+    Only flags the shutdown and wakes connection_manager: the teardown takes
+    locks (supervisor, sessions) the interrupted main thread may be holding.
+    """
+    global running
+    running = False
+    post_event("stop")
+
+def shutdown():
+    log("Shutting down...")
+    save_sessions()
+    # Stop the device loops first, or they restart what is being stopped
+    for device in list(devices.values()):
+        device.active = False
+    for device in list(devices.values()):
+        device.audio_sender.stop()
+        device.placeholder.stop()
+    supervisor.stop_all()
+    graph.stop()
+    if os.path.exists(READY_FLAG): os.remove(READY_FLAG)
+    if os.path.exists(METRICS_SOCKET): os.remove(METRICS_SOCKET)
+    if os.path.exists(CONTROL_SOCKET): os.remove(CONTROL_SOCKET)
+    sys.exit(0)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ZeroBridge Daemon")
+    parser.add_argument("-d", "--debug-notify", action="store_true", help="Send desktop notification if no handshake in 5s")
+    parser.add_argument("--inprocess-gst", action="store_true", help="Run GStreamer pipelines inside the daemon (requires PyGObject)")
+    parser.add_argument("--log-format", choices=["text", "json"], default="text", help="Log records as text with key=value fields, or as JSON lines")
+    parser.add_argument("--trace", action="store_true", help="Log per-phase timings of every event loop iteration")
+    args = parser.parse_args()
+    set_log_format(args.log_format)
+    trace_enabled = args.trace
+
+    signal.signal(signal.SIGINT, cleanup_handler)
+    signal.signal(signal.SIGTERM, cleanup_handler)
+    signal.signal(signal.SIGUSR1, handle_reload)
+    
+    if not os.path.exists(CONFIG_DIR): os.makedirs(CONFIG_DIR)
+    saved_sessions.update(load_sessions())
+    if saved_sessions:
+        log(":: [Session] Resuming sessions of %s", ", ".join(saved_sessions))
+
+    if args.inprocess_gst and init_gst():
+        log(":: [Gst] Running pipelines in-process.")
+        inprocess_gst = True
+    
+    supervisor.start_reaper()
+    sweep_stale_loopbacks()
+    graph.add_listener(on_graph_change)
+    graph.start()
+    adb.add_listener(on_adb_change)
+    adb.start()
+    # Avoid duplicating the void nodes before the first graph snapshot arrives
+    if not graph.wait_synced(timeout=5):
+        error(":: [Graph] No graph snapshot yet. Falling back to one-shot pw-dump.")
+
+    open_control_socket()
     t = threading.Thread(target=network_listener, daemon=True)
     t.start()
+    threading.Thread(target=config_watcher, daemon=True).start()
+    threading.Thread(target=metrics_server, daemon=True).start()
+    threading.Thread(target=control_server, daemon=True).start()
     
-    connection_manager()
\ No newline at end of file
+    connection_manager()
+    shutdown()
\ No newline at end of file
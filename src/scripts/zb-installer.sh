@@ -14,23 +14,124 @@ adb -s "$PHONE_IP" wait-for-device
 
 # --- 1. Generate Python Payload (Updated with Session ID Logic) ---
 cat << 'EOF' > zb_receiver.py
+import asyncio
+import itertools
+import os
+import shutil
+import signal
 import socket
+import struct
 import time
-import subprocess
-import os
-import sys
 
 # Constants
 CACHE_FILE = "/data/data/com.termux/files/usr/var/zbridge_last_ip"
 UDP_LISTEN = 5002
 UDP_SEND = 5001
 GST_PORT = 5000
+GST_LOCAL_PORT = 5004 # RTP is relayed here after being measured
+CLOCK_RATE = 48000
+STATS_INTERVAL = 1.0
+HEARTBEAT_INTERVAL = 0.25
+IDLE_HEARTBEAT_INTERVAL = 5.0 # Advertising only: the PC SYNCs us when it wants us
+SESSION_TIMEOUT = 10.0        # No ACK for this long: idle (same as the PC's heartbeat timeout)
+
+# GStreamer supervision
+GST_BACKOFF_MIN = 1.0
+GST_BACKOFF_MAX = 30.0
+GST_STABLE_SEC = 30.0   # Running this long resets the backoff
+GST_STARTUP_SEC = 3.0   # Grace period before a closed RTP port counts as a dead pipeline
+
+# Control protocol (see zb-daemon.py): magic, version, type, flags, seq, session, monotonic us
+PROTO_MAGIC = b"ZB"
+PROTO_VERSION = 1
+PROTO_HEADER = struct.Struct("!2sBBHIIQ")
+MSG_SYNC = 1
+MSG_READY = 2
+MSG_ACK = 3
+SYNC_PAYLOAD = struct.Struct("!4s")
+READY_PAYLOAD = struct.Struct("!HHHiHq")  # Last: the unclamped clock offset (us)
+ACK_PAYLOAD = struct.Struct("!QQ")
+CAP_STATS = 0x1
+CAP_TIMESTAMPS = 0x2
+
+# Jitter buffer sizing (ms)
+JB_MIN = 40
+JB_MAX = 200
+JB_DEFAULT = 100
+JB_STEP = 30        # Only resize for differences at least this large
+JB_HOLD = 30.0      # ...and not more often than this (resizing restarts GStreamer)
+
+class RtpStats:
+    """Loss and interarrival jitter (RFC 3550) of the incoming RTP stream."""
+
+    def __init__(self):
+        self.jitter = 0.0   # in RTP clock units
+        self.transit = None
+        self.max_seq = None
+        self.ssrc = None
+        self.received = 0
+        self.expected = 0
+        self.loss = 0.0
+
+    def packet(self, data):
+        if len(data) < 12:
+            return
+        seq, ts, ssrc = struct.unpack_from("!HII", data, 2)
+        if ssrc != self.ssrc:
+            # New sender (the PC restarts it on tier changes): new random
+            # timestamp base and sequence, so nothing carries over
+            self.ssrc = ssrc
+            self.jitter = 0.0
+            self.transit = None
+            self.max_seq = None
+            self.received = self.expected = 0
+        arrival = time.monotonic() * CLOCK_RATE
+        transit = arrival - ts
+        if self.transit is not None:
+            d = abs(transit - self.transit)
+            self.jitter += (d - self.jitter) / 16
+        self.transit = transit
+
+        if self.max_seq is None:
+            self.max_seq = seq
+            self.expected += 1
+        else:
+            delta = (seq - self.max_seq) & 0xFFFF
+            if delta == 0 or delta > 0xFFFF - 3000:
+                pass # Duplicate or late packet, already counted as expected
+            elif delta < 3000:
+                self.expected += delta
+                self.max_seq = seq
+            else:
+                # Sender restarted: start over
+                self.max_seq = seq
+                self.expected += 1
+        self.received += 1
+
+    def snapshot(self):
+        """Returns (loss, jitter_ms) for the interval and starts a new one."""
+        if self.expected:
+            self.loss = max(0.0, 1.0 - self.received / self.expected)
+        self.received = self.expected = 0
+        return self.loss, self.jitter * 1000 / CLOCK_RATE
+
+def monotonic_us():
+    return time.monotonic_ns() // 1000
+
+def pack_message(msg_type, seq, payload=b"", flags=0):
+    return PROTO_HEADER.pack(PROTO_MAGIC, PROTO_VERSION, msg_type, flags,
+                             seq & 0xFFFFFFFF, 0, monotonic_us()) + payload
+
+def unpack_message(data):
+    if len(data) < PROTO_HEADER.size or data[:2] != PROTO_MAGIC:
+        return None
+    _, version, msg_type, flags, seq, session, ts = PROTO_HEADER.unpack_from(data)
+    if version != PROTO_VERSION:
+        return None
+    return msg_type, flags, seq, session, ts, data[PROTO_HEADER.size:]
 
-# State
-pc_ip = None
-running = True
-gst_process = None
-current_session_id = None
+def clamp(value, low, high):
+    return int(min(high, max(low, value)))
 
 def load_cached_ip():
     if os.path.exists(CACHE_FILE):
@@ -46,103 +147,289 @@ def save_ip(ip):
             f.write(ip)
     except: pass
 
-def start_gst():
-    global gst_process
-    if gst_process and gst_process.poll() is None:
-        return # Already running
-    
-    print(":: [Recv] Starting GStreamer (Reliable Mode)...")
-    # OPTIMIZATION:
-    # 1. do-lost=true: Dropping late packets immediately
-    # 2. mode=slave: Slave jitterbuffer to sender clock (Fixes drift/robotic audio)
-    # 3. No Volume Plugin: Gain is controlled purely by PC Sender volume (zbout)
-    cmd = [
-        "gst-launch-1.0", "-q", "udpsrc", f"port={GST_PORT}", "!",
-        "application/x-rtp,media=audio,clock-rate=48000,encoding-name=OPUS,payload=96", "!",
-        "rtpjitterbuffer", "latency=100", "do-lost=true", "mode=slave", "!",
-        "rtpopusdepay", "!", 
-        "opusdec", "use-inband-fec=true", "plc=true", "!",
-        "openslessink", "buffer-time=100000", "latency-time=20000"
-    ]
-    gst_process = subprocess.Popen(cmd)
-
-def stop_gst():
-    global gst_process
-    if gst_process:
-        print(":: [Recv] Stopping GStreamer for Sync...")
-        gst_process.terminate()
+def udp_socket(port, rcvbuf):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    # Rebind at once when runit restarts us
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+    except: pass # Might fail on some Android kernels
+    sock.bind(('0.0.0.0', port))
+    sock.setblocking(False)
+    return sock
+
+class WakeLock:
+    """Holds termux-wake-lock only while a session is active, so idle doze can kick in."""
+
+    def __init__(self):
+        self.held = False
+        self.available = shutil.which("termux-wake-lock") is not None
+
+    async def set(self, held):
+        if held == self.held:
+            return
+        self.held = held
+        if self.available:
+            proc = await asyncio.create_subprocess_exec("termux-wake-lock" if held else "termux-wake-unlock")
+            await proc.wait()
+
+class GstSupervisor:
+    """
+    Runs the playback pipeline while wanted and restarts it with backoff when
+    it dies. restart() is an immediate, deliberate restart (new jitter buffer).
+    """
+
+    def __init__(self):
+        self.wanted = asyncio.Event()
+        self.proc = None
+        self.started_at = 0
+        self.restarting = False
+        self.backoff = GST_BACKOFF_MIN
+        self.jb_latency = JB_DEFAULT
+
+    def command(self):
+        # OPTIMIZATION:
+        # 1. do-lost=true: Dropping late packets immediately
+        # 2. mode=slave: Slave jitterbuffer to sender clock (Fixes drift/robotic audio)
+        # 3. No Volume Plugin: Gain is controlled purely by PC Sender volume (zbout)
+        # 4. latency: sized from the measured jitter
+        # rtpjitterbuffer resets itself on a new SSRC, so a new PC session needs no restart
+        return [
+            "gst-launch-1.0", "-q", "udpsrc", "address=127.0.0.1", f"port={GST_LOCAL_PORT}", "!",
+            "application/x-rtp,media=audio,clock-rate=48000,encoding-name=OPUS,payload=96", "!",
+            "rtpjitterbuffer", f"latency={self.jb_latency}", "do-lost=true", "mode=slave", "!",
+            "rtpopusdepay", "!",
+            "opusdec", "use-inband-fec=true", "plc=true", "!",
+            "openslessink", "buffer-time=100000", "latency-time=20000"
+        ]
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.wanted.wait()
+            print(f":: [Recv] Starting GStreamer (Reliable Mode, jitterbuffer {self.jb_latency}ms)...")
+            try:
+                self.proc = await asyncio.create_subprocess_exec(*self.command())
+            except OSError as e:
+                print(f":: [Error] GStreamer failed to start: {e}")
+                await self.sleep_backoff()
+                continue
+            self.started_at = loop.time()
+            code = await self.proc.wait()
+            self.proc = None
+            if not self.wanted.is_set() or self.restarting:
+                self.restarting = False
+                continue
+            if loop.time() - self.started_at > GST_STABLE_SEC:
+                self.backoff = GST_BACKOFF_MIN
+            print(f":: [Recv] GStreamer exited ({code}). Restarting in {self.backoff:.0f}s...")
+            await self.sleep_backoff()
+
+    async def sleep_backoff(self):
+        await asyncio.sleep(self.backoff)
+        self.backoff = min(self.backoff * 2, GST_BACKOFF_MAX)
+
+    def start(self):
+        self.wanted.set()
+
+    def stop(self):
+        if self.wanted.is_set():
+            print(":: [Recv] Stopping GStreamer.")
+        self.wanted.clear()
+        self.terminate()
+
+    async def shutdown(self):
+        proc = self.proc
+        self.stop()
+        if proc:
+            try:
+                await asyncio.wait_for(proc.wait(), 1)
+            except asyncio.TimeoutError:
+                proc.kill()
+
+    def restart(self, reason):
+        if self.proc:
+            print(f":: [Recv] Restarting GStreamer: {reason}")
+            self.restarting = True
+            self.terminate()
+
+    def terminate(self):
+        if self.proc and self.proc.returncode is None:
+            self.proc.terminate()
+            asyncio.get_running_loop().call_later(1, self.kill, self.proc)
+
+    def kill(self, proc):
+        if proc.returncode is None:
+            proc.kill()
+
+    def listening_overdue(self):
+        """Running past its startup grace period, yet nobody is bound to the RTP port."""
+        return self.proc is not None and not self.restarting and \
+            asyncio.get_running_loop().time() - self.started_at > GST_STARTUP_SEC
+
+class Receiver:
+    """
+    Event-driven receiver: sleeps in the event loop until a packet or a
+    timer is due. Active (fast heartbeats, stats, wake lock, GStreamer)
+    while the PC acknowledges us, quiet otherwise.
+    """
+
+    def __init__(self):
+        self.pc_ip = load_cached_ip()
+        self.session_id = None
+        self.last_ack = float("-inf")
+        self.active = False
+        self.stopping = False
+        self.tx_seq = itertools.count(1)
+        self.rtp_stats = RtpStats()
+        self.loss, self.jitter_ms, self.rtt_ms, self.offset_ms = 0.0, 0.0, 0.0, 0.0
+        self.stats_fresh = False
+        self.last_stats = 0
+        self.last_jb_change = 0
+        self.wake = asyncio.Event()
+        self.gst = GstSupervisor()
+        self.wake_lock = WakeLock()
+        self.sock = udp_socket(UDP_LISTEN, 131072)
+        # RTP relay: measure loss/jitter, then hand the packet to GStreamer over loopback.
+        # Connected, so a pipeline that stopped listening shows up as ECONNREFUSED.
+        self.rtp_sock = udp_socket(GST_PORT, 262144)
+        self.relay_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.relay_sock.setblocking(False)
+        self.relay_sock.connect(("127.0.0.1", GST_LOCAL_PORT))
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        loop.add_reader(self.sock.fileno(), self.on_control)
+        loop.add_reader(self.rtp_sock.fileno(), self.on_rtp)
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.shutdown)
+        gst_task = asyncio.create_task(self.gst.run())
+
+        if self.pc_ip:
+            print(f":: [Recv] Loaded cached PC IP: {self.pc_ip}. Advertising immediately.")
+        while not self.stopping:
+            await self.tick()
+            interval = HEARTBEAT_INTERVAL if self.active else IDLE_HEARTBEAT_INTERVAL
+            try:
+                await asyncio.wait_for(self.wake.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wake.clear()
+
+        await self.gst.shutdown()
+        await self.wake_lock.set(False)
+        gst_task.cancel()
+
+    def shutdown(self):
+        self.stopping = True
+        self.wake.set()
+
+    async def tick(self):
+        now = time.monotonic()
+        if self.active and now - self.last_ack > SESSION_TIMEOUT:
+            print(":: [Recv] PC gone quiet. Going idle.")
+            self.active = False
+            self.gst.stop()
+            await self.wake_lock.set(False)
+        elif not self.active and now - self.last_ack <= SESSION_TIMEOUT:
+            print(":: [Recv] Session active.")
+            self.active = True
+            await self.wake_lock.set(True)
+            self.gst.start()
+
+        if self.active and now - self.last_stats >= STATS_INTERVAL:
+            self.loss, self.jitter_ms = self.rtp_stats.snapshot()
+            self.last_stats = now
+            self.stats_fresh = True
+            self.resize_jitter_buffer()
+
+        # ADVERTISE / HEARTBEAT (receive stats ride along once per stats interval)
+        self.send_ready(with_stats=True)
+
+    def send_ready(self, with_stats=False):
+        if not self.pc_ip:
+            return
+        flags, payload = 0, b""
+        if with_stats and self.stats_fresh:
+            flags = CAP_STATS
+            payload = READY_PAYLOAD.pack(
+                clamp(self.loss * 10000, 0, 0xFFFF), clamp(self.jitter_ms * 10, 0, 0xFFFF),
+                clamp(self.rtt_ms * 10, 0, 0xFFFF), clamp(self.offset_ms * 10, -2**31, 2**31 - 1),
+                self.gst.jb_latency, int(self.offset_ms * 1000))
+            self.stats_fresh = False
         try:
-            gst_process.wait(timeout=1)
-        except:
-            gst_process.kill()
-        gst_process = None
-
-# --- Main Loop ---
-print(":: [Recv] ZBridge Receiver Started (Python/Reliable)")
-
-# 1. Load Cache
-pc_ip = load_cached_ip()
-if pc_ip:
-    print(f":: [Recv] Loaded cached PC IP: {pc_ip}. Advertising immediately.")
-
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-# Socket Buffer Optimization
-try:
-    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 131072)
-except: pass # Might fail on some Android kernels
-
-sock.bind(('0.0.0.0', UDP_LISTEN))
-sock.settimeout(1.0) # Non-blocking listen
-
-last_advert = 0
-
-while running:
-    current_time = time.time()
-    
-    # A. ADVERTISE / HEARTBEAT
-    if pc_ip:
-        if current_time - last_advert > 1.0: # Send every 1s
+            self.sock.sendto(pack_message(MSG_READY, next(self.tx_seq), payload, flags), (self.pc_ip, UDP_SEND))
+        except OSError as e:
+            print(f":: [Error] Send failed: {e}")
+
+    def resize_jitter_buffer(self):
+        if self.gst.proc is None:
+            return
+        target = int(min(JB_MAX, max(JB_MIN, self.jitter_ms * 4 + 20)))
+        now = time.monotonic()
+        if abs(target - self.gst.jb_latency) < JB_STEP or now - self.last_jb_change < JB_HOLD:
+            return
+        print(f":: [Recv] Jitter {self.jitter_ms:.1f}ms. Jitterbuffer {self.gst.jb_latency}ms -> {target}ms")
+        self.gst.jb_latency = target
+        self.last_jb_change = now
+        self.gst.restart("jitter buffer resized")
+
+    def on_rtp(self):
+        while True:
+            try:
+                packet = self.rtp_sock.recv(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            self.rtp_stats.packet(packet)
             try:
-                sock.sendto(b"READY", (pc_ip, UDP_SEND))
-                last_advert = current_time
-            except Exception as e:
-                print(f":: [Error] Send failed: {e}")
+                self.relay_sock.send(packet)
+            except ConnectionRefusedError:
+                # Watchdog: the pipeline is running but its udpsrc is gone
+                if self.gst.listening_overdue():
+                    self.gst.restart("no longer receiving RTP")
+            except OSError:
+                pass
 
-    # B. LISTEN
-    try:
-        data, addr = sock.recvfrom(1024)
-        msg = data.decode('utf-8').strip()
-        sender_ip = addr[0]
-
-        if "SYNC" in msg:
-            new_ip = msg.split(':')[1] if ':' in msg else sender_ip
-            if new_ip != pc_ip:
-                print(f":: [Recv] SYNC received. PC found at {new_ip}")
-                pc_ip = new_ip
-                save_ip(pc_ip)
-            sock.sendto(b"READY", (pc_ip, UDP_SEND))
-            
-        elif "ACK" in msg:
-            # Parse ACK:SessionID
-            parts = msg.split(':')
-            received_sid = parts[1] if len(parts) > 1 else "legacy"
-            
-            # If Session ID changed, RESTART GStreamer to resync clocks
-            if received_sid != "legacy" and received_sid != current_session_id:
-                print(f":: [Recv] New Session detected ({received_sid}). Resyncing...")
-                stop_gst()
-                current_session_id = received_sid
-            
-            start_gst()
-            
-    except socket.timeout:
-        pass
-    except Exception as e:
-        print(f":: [Error] Loop error: {e}")
-
-    # C. HEALTH CHECK / WATCHDOG
-    if pc_ip and (not gst_process or gst_process.poll() is not None):
-        pass 
+    def on_control(self):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(1024)
+            except (BlockingIOError, InterruptedError):
+                return
+            t4 = monotonic_us()
+            msg = unpack_message(data)
+            if msg is None:
+                continue
+            msg_type, flags, _, received_sid, t3, payload = msg
+
+            if msg_type == MSG_SYNC:
+                new_ip = socket.inet_ntoa(SYNC_PAYLOAD.unpack_from(payload)[0]) if len(payload) >= SYNC_PAYLOAD.size else addr[0]
+                if new_ip != self.pc_ip:
+                    print(f":: [Recv] SYNC received. PC found at {new_ip}")
+                    self.pc_ip = new_ip
+                    save_ip(new_ip)
+                self.send_ready()
+
+            elif msg_type == MSG_ACK:
+                # t1 = our READY send time echoed, t2 = PC receive time, t3 = PC send time (header)
+                if flags & CAP_TIMESTAMPS and len(payload) >= ACK_PAYLOAD.size:
+                    t1, t2 = ACK_PAYLOAD.unpack_from(payload)
+                    self.rtt_ms = ((t4 - t1) - (t3 - t2)) / 1000
+                    self.offset_ms = ((t2 - t1) + (t3 - t4)) / 2000
+
+                # New PC session: the pipeline follows the new stream on its own
+                # (rtpjitterbuffer resets on a new SSRC). Only the stats restart.
+                if received_sid != self.session_id:
+                    print(f":: [Recv] New Session detected ({received_sid}). Resetting stats...")
+                    self.session_id = received_sid
+                    self.rtp_stats = RtpStats()
+
+                self.last_ack = time.monotonic()
+                if not self.active:
+                    self.wake.set() # Leave idle right away
+
+print(":: [Recv] ZBridge Receiver Started (Python/asyncio)")
+asyncio.run(Receiver().run())
 EOF
 
 # --- 2. Generate Wrapper Script ---
@@ -166,7 +453,8 @@ mv /sdcard/Download/zb_receiver.py "$SERVICE_DIR/receiver.py"
 # Run Script
 cat << 'RUN' > "$SERVICE_DIR/run"
 #!/data/data/com.termux/files/usr/bin/sh
-termux-wake-lock
+# The receiver takes the wake lock itself, only while the PC is connected
+termux-wake-unlock
 exec 2>&1
 # Run the python script unbuffered
 exec python3 -u "$SVDIR/zreceiver/receiver.py"